@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Benchmarks for the hot paths in :mod:`django_wsgi`.
+
+They require `pyperf <https://pyperf.readthedocs.io/>`_. To run them and save
+the results::
+
+    python benchmarks/bench_django_wsgi.py -o results.json
+
+To compare the results from two revisions::
+
+    python -m pyperf compare_to before.json after.json
+
+"""
+from functools import partial
+import os
+import sys
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _PROJECT_DIR)
+
+import django
+from django.conf import settings
+from django.conf.urls import url
+from django.http import HttpResponse
+from django.test.utils import override_settings
+import pyperf
+from six import BytesIO
+
+settings.configure(
+    ROOT_URLCONF=__name__,
+    SECRET_KEY="secret",
+    ALLOWED_HOSTS=["example.org"],
+    MIDDLEWARE_CLASSES=(
+        __name__ + "._AnonymousUserMiddleware",
+        "django_wsgi.middleware.RoutingArgsMiddleware",
+        ),
+    )
+if hasattr(django, 'setup'):
+    django.setup()
+
+from django_wsgi.embedded_wsgi import call_wsgi_app
+from django_wsgi.embedded_wsgi import make_wsgi_view
+from django_wsgi.handler import DjangoApplication
+from django_wsgi.handler import DjangoWSGIRequest
+from django_wsgi.middleware import RoutingArgsMiddleware
+
+
+_BODY_SIZES = (0, 1024, 64 * 1024, 1024 * 1024)
+
+_HEADER_COUNTS = (1, 10, 50)
+
+_COOKIE_COUNTS = (1, 10, 50)
+
+
+#{ Mock WSGI application and Django project
+
+
+class _MockApp(object):
+
+    def __init__(self, header_count=1, cookie_count=0, body_size=4):
+        super(_MockApp, self).__init__()
+        self.headers = [("Content-Type", "text/plain")]
+        self.headers.extend(
+            ("X-Header-%s" % index, "value")
+            for index in range(header_count - 1)
+            )
+        self.headers.extend(
+            ("Set-Cookie", "cookie%s=value; Path=/; Max-Age=3600" % index)
+            for index in range(cookie_count)
+            )
+        self.body = [b"a" * body_size]
+
+    def __call__(self, environ, start_response):
+        environ['wsgi.input'].read()
+        start_response("200 OK", self.headers)
+        return self.body
+
+
+class _AnonymousUserMiddleware(object):
+    """Stub for Django's authentication middleware, without the database."""
+
+    @staticmethod
+    def process_request(request):
+        request.user = _ANONYMOUS_USER
+
+
+def _read_body(request):
+    return HttpResponse(str(len(request.body)))
+
+
+urlpatterns = [
+    url(r'^$', lambda request: HttpResponse()),
+    url(r'^body$', _read_body),
+    url(r'^embedded(/.*)$', make_wsgi_view(_MockApp())),
+    ]
+
+
+#{ Benchmarks
+
+
+def bench_application(application, environ_factory):
+    environ = environ_factory()
+    response = application(environ, _start_response)
+    for _ in response:
+        pass
+    response.close()
+
+
+def bench_request_construction(environ_factory):
+    DjangoWSGIRequest(environ_factory())
+
+
+def bench_call_wsgi_app(wsgi_app, environ_factory, **kwargs):
+    request = DjangoWSGIRequest(environ_factory())
+    request.user = _ANONYMOUS_USER
+    response = call_wsgi_app(wsgi_app, request, "/foo", **kwargs)
+    response.close()
+
+
+def bench_routing_args_middleware(middleware, request):
+    middleware.process_view(request, None, ("foo", ), {'bar': "baz"})
+
+
+def main():
+    runner = pyperf.Runner()
+    application = DjangoApplication()
+
+    # Making sure that the error pages aren't benchmarked instead:
+    _check_application(application, _EnvironFactory("/"))
+    _check_application(application, _EnvironFactory("/embedded/foo"))
+    _check_application(application, _EnvironFactory("/body", 1024))
+
+    runner.bench_func(
+        "application/get",
+        bench_application,
+        application,
+        _EnvironFactory("/"),
+        )
+    runner.bench_func(
+        "application/embedded",
+        bench_application,
+        application,
+        _EnvironFactory("/embedded/foo"),
+        )
+    for body_size in _BODY_SIZES:
+        runner.bench_func(
+            "application/post-%s" % body_size,
+            bench_application,
+            application,
+            _EnvironFactory("/body", body_size),
+            )
+
+    for body_size in _BODY_SIZES:
+        environ_factory = _EnvironFactory("/", body_size)
+        runner.bench_func(
+            "request/construction-%s" % body_size,
+            bench_request_construction,
+            environ_factory,
+            )
+        with override_settings(WSGI_LAZY_REQUEST_BODY=True):
+            runner.bench_func(
+                "request/construction-lazy-%s" % body_size,
+                bench_request_construction,
+                environ_factory,
+                )
+
+    for body_size in _BODY_SIZES:
+        runner.bench_func(
+            "call_wsgi_app/body-%s" % body_size,
+            bench_call_wsgi_app,
+            _MockApp(),
+            _EnvironFactory("/app/foo", body_size),
+            )
+    for header_count in _HEADER_COUNTS:
+        runner.bench_func(
+            "call_wsgi_app/headers-%s" % header_count,
+            bench_call_wsgi_app,
+            _MockApp(header_count=header_count),
+            _EnvironFactory("/app/foo"),
+            )
+    for cookie_count in _COOKIE_COUNTS:
+        wsgi_app = _MockApp(cookie_count=cookie_count)
+        runner.bench_func(
+            "call_wsgi_app/cookies-%s" % cookie_count,
+            bench_call_wsgi_app,
+            wsgi_app,
+            _EnvironFactory("/app/foo"),
+            )
+        runner.bench_func(
+            "call_wsgi_app/raw-cookies-%s" % cookie_count,
+            partial(bench_call_wsgi_app, raw_cookies=True),
+            wsgi_app,
+            _EnvironFactory("/app/foo"),
+            )
+    runner.bench_func(
+        "call_wsgi_app/streaming",
+        partial(bench_call_wsgi_app, streaming=True),
+        _MockApp(),
+        _EnvironFactory("/app/foo"),
+        )
+
+    runner.bench_func(
+        "routing_args_middleware",
+        bench_routing_args_middleware,
+        RoutingArgsMiddleware(),
+        DjangoWSGIRequest(_EnvironFactory("/")()),
+        )
+
+
+#{ Utilities
+
+
+class _EnvironFactory(object):
+
+    def __init__(self, path_info, body_size=0):
+        super(_EnvironFactory, self).__init__()
+        self.path_info = path_info
+        self.body = b"a" * body_size
+
+    def __call__(self):
+        environ = {
+            'REQUEST_METHOD': "POST" if self.body else "GET",
+            'SCRIPT_NAME': "",
+            'PATH_INFO': self.path_info,
+            'SERVER_NAME': "example.org",
+            'SERVER_PORT': "80",
+            'SERVER_PROTOCOL': "HTTP/1.1",
+            'HTTP_HOST': "example.org",
+            'wsgi.input': BytesIO(self.body),
+            'wsgi.url_scheme': "http",
+            }
+        if self.body:
+            environ['CONTENT_TYPE'] = "application/octet-stream"
+            environ['CONTENT_LENGTH'] = str(len(self.body))
+        return environ
+
+
+class _AnonymousUser(object):
+
+    username = ""
+
+    @staticmethod
+    def is_authenticated():
+        return False
+
+
+_ANONYMOUS_USER = _AnonymousUser()
+
+
+def _start_response(status, response_headers, exc_info=None):
+    return lambda data: None
+
+
+def _check_application(application, environ_factory):
+    environ = environ_factory()
+    statuses = []
+
+    def start_response(status, response_headers, exc_info=None):
+        statuses.append(status)
+        return lambda data: None
+
+    response = application(environ, start_response)
+    for _ in response:
+        pass
+    response.close()
+
+    if not statuses[-1].startswith("200 "):
+        raise RuntimeError(
+            "%s returned %s" % (environ['PATH_INFO'], statuses[-1]),
+            )
+
+
+#}
+
+
+if __name__ == "__main__":
+    main()
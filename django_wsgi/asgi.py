@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Django request/response handling a la ASGI.
+
+This module requires Python 3.5+.
+
+"""
+import asyncio
+import sys
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from webob import Request as WebobRequest
+
+from django_wsgi.exc import RequestBodyTooLargeError
+from django_wsgi.handler import DjangoApplication
+from django_wsgi.handler import _check_request_body_size
+from django_wsgi.handler import _get_content_length
+
+
+__all__ = ("DjangoASGIApplication", "ASGI_APPLICATION")
+
+
+class DjangoASGIApplication(object):
+    """
+    ASGI application which runs a WSGI application for Django, using our
+    enhanced request class by default.
+
+    The body of the request is buffered asynchronously, so a slow client does
+    not tie up a thread while it is uploading the body. Then the WSGI
+    application is called, and the body of its response is iterated over, in
+    an executor; a slow client does not tie up a thread while the response is
+    being sent either.
+
+    The body is buffered according to the settings
+    ``WSGI_REQUEST_BODY_MEMORY_LIMIT`` and ``WSGI_REQUEST_BODY_MAX_SIZE``.
+
+    :param wsgi_application: The WSGI application to be run, which defaults
+        to a :class:`~django_wsgi.handler.DjangoApplication`.
+    :param executor: The :class:`concurrent.futures.Executor` in which the
+        WSGI application is run, which defaults to the event loop's default
+        executor.
+
+    """
+
+    def __init__(self, wsgi_application=None, executor=None):
+        super(DjangoASGIApplication, self).__init__()
+        self.wsgi_application = wsgi_application or DjangoApplication()
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._handle_http_request(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._handle_lifespan(receive, send)
+        else:
+            raise ValueError("Unsupported scope type %r" % scope['type'])
+
+    async def _handle_http_request(self, scope, receive, send):
+        environ = _make_environ(scope)
+
+        try:
+            # Rejecting requests whose body is too large before reading it:
+            _check_request_body_size(_get_content_length(environ))
+            wsgi_input = await _buffer_body(receive)
+        except RequestBodyTooLargeError:
+            await _send_request_entity_too_large(send)
+            return
+
+        if wsgi_input is None:
+            # The client disconnected
+            return
+
+        environ['wsgi.input'] = wsgi_input
+        environ['webob.is_body_seekable'] = True
+        environ['CONTENT_LENGTH'] = str(wsgi_input.tell())
+        wsgi_input.seek(0)
+
+        try:
+            await self._call_wsgi_application(environ, send)
+        finally:
+            wsgi_input.close()
+
+    async def _call_wsgi_application(self, environ, send):
+        loop = asyncio.get_event_loop()
+
+        response_start = []
+        written_chunks = []
+        is_response_sent = False
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and is_response_sent:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start[:] = [status, headers]
+            return written_chunks.append
+
+        app_iter = await loop.run_in_executor(
+            self.executor,
+            self.wsgi_application,
+            environ,
+            start_response,
+            )
+        try:
+            chunks = iter(app_iter)
+            if not response_start:
+                # The response is only started upon the first iteration
+                first_chunk = await loop.run_in_executor(
+                    self.executor,
+                    next,
+                    chunks,
+                    b"",
+                    )
+                written_chunks.append(first_chunk)
+
+            (status, headers) = response_start
+            await send({
+                'type': 'http.response.start',
+                'status': int(status.split(" ", 1)[0]),
+                'headers': [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for (name, value) in headers
+                    ],
+                })
+            is_response_sent = True
+
+            for chunk in written_chunks:
+                await _send_body_chunk(send, chunk)
+            while True:
+                chunk = await loop.run_in_executor(
+                    self.executor,
+                    next,
+                    chunks,
+                    None,
+                    )
+                if chunk is None:
+                    break
+                await _send_body_chunk(send, chunk)
+
+            await send({'type': 'http.response.body', 'body': b""})
+        finally:
+            if hasattr(app_iter, 'close'):
+                await loop.run_in_executor(self.executor, app_iter.close)
+
+    @staticmethod
+    async def _handle_lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                break
+
+
+ASGI_APPLICATION = DjangoASGIApplication()
+"""ASGI application based on :class:`DjangoASGIApplication`."""
+
+
+def _make_environ(scope):
+    script_name = scope.get('root_path', "")
+    path = scope['path']
+    if script_name and path.startswith(script_name):
+        path = path[len(script_name):]
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _decode_path(script_name),
+        'PATH_INFO': _decode_path(path),
+        'QUERY_STRING': scope.get('query_string', b"").decode("latin-1"),
+        'SERVER_PROTOCOL': "HTTP/%s" % scope.get('http_version', "1.1"),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', "http"),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.input_terminated': True,
+        }
+
+    server = scope.get('server') or ("localhost", 80)
+    environ['SERVER_NAME'] = server[0]
+    environ['SERVER_PORT'] = str(server[1])
+
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+        environ['REMOTE_PORT'] = str(client[1])
+
+    for (raw_name, raw_value) in scope.get('headers', []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = raw_value.decode("latin-1")
+        if name in environ:
+            # Cookies may be sent in separate headers with HTTP/2 (RFC 7540,
+            # Section 8.1.2.5):
+            separator = "; " if name == "HTTP_COOKIE" else ","
+            value = environ[name] + separator + value
+        environ[name] = value
+
+    return environ
+
+
+def _decode_path(path):
+    # WSGI strings are bytes decoded as Latin-1 (PEP 3333):
+    return path.encode("utf-8").decode("latin-1")
+
+
+async def _buffer_body(receive):
+    """
+    Return the body of the request in a seekable file, or ``None`` if the
+    client disconnected.
+
+    """
+    memory_limit = getattr(settings, 'WSGI_REQUEST_BODY_MEMORY_LIMIT', None)
+    if memory_limit is None:
+        memory_limit = WebobRequest.request_body_tempfile_limit
+
+    body_file = SpooledTemporaryFile(max_size=memory_limit)
+    try:
+        body_size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body_file.close()
+                return None
+
+            chunk = message.get('body', b"")
+            body_size += len(chunk)
+            _check_request_body_size(body_size)
+
+            body_file.write(chunk)
+            more_body = message.get('more_body', False)
+    except Exception:
+        body_file.close()
+        raise
+
+    return body_file
+
+
+async def _send_body_chunk(send, chunk):
+    if chunk:
+        await send({
+            'type': 'http.response.body',
+            'body': chunk,
+            'more_body': True,
+            })
+
+
+async def _send_request_entity_too_large(send):
+    await send({
+        'type': 'http.response.start',
+        'status': 413,
+        'headers': [(b"content-type", b"text/plain")],
+        })
+    await send({
+        'type': 'http.response.body',
+        'body': b"Request Entity Too Large",
+        })
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Utilities to use WSGI applications from coroutines.
+
+The WSGI applications are run in an executor, so that they don't block the
+event loop. This module requires Python 3.5.3+.
+
+The coroutines here must be awaited on a running event loop, like that of an
+ASGI application or a framework with coroutine views. The versions of Django
+supported by this package can't call coroutine views, so the views made by
+:func:`make_wsgi_view` can't be routed to with Django's URLconf (and Django
+views served by :class:`~django_wsgi.asgi.DjangoASGIApplication` run in
+threads, where they can use :mod:`django_wsgi.embedded_wsgi` instead).
+
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django_wsgi import embedded_wsgi
+
+
+__all__ = ("call_wsgi_app", "make_wsgi_view", "iterate_response_body")
+
+
+async def call_wsgi_app(
+    wsgi_app,
+    request,
+    path_info,
+    *args,
+    executor=None,
+    **kwargs
+    ):
+    """
+    Call the ``wsgi_app`` with ``request`` in ``executor`` and return its
+    response.
+
+    This is the awaitable counterpart of
+    :func:`django_wsgi.embedded_wsgi.call_wsgi_app`, and it takes the same
+    arguments, plus ``executor`` (by keyword only).
+
+    The body of streamed responses must be iterated over with
+    :func:`iterate_response_body`, so that it's pulled from ``wsgi_app`` in
+    ``executor`` too; iterating over the response itself would block the
+    event loop.
+
+    :param executor: The executor in which ``wsgi_app`` is run, which defaults
+        to the event loop's default executor.
+    :type executor: :class:`concurrent.futures.Executor`
+    :return: The response from the WSGI application, turned into a Django
+        response.
+    :rtype: :class:`django.http.HttpResponse` or
+        :class:`django.http.StreamingHttpResponse` if ``streaming`` is set
+
+    """
+    loop = asyncio.get_event_loop()
+    django_response = await loop.run_in_executor(
+        executor,
+        partial(
+            embedded_wsgi.call_wsgi_app,
+            wsgi_app,
+            request,
+            path_info,
+            *args,
+            **kwargs
+            ),
+        )
+    return django_response
+
+
+def make_wsgi_view(wsgi_app, *args, max_workers=None, **kwargs):
+    """
+    Return a coroutine function with the signature of a Django view, powered
+    by the ``wsgi_app``.
+
+    This is the asynchronous counterpart of
+    :func:`django_wsgi.embedded_wsgi.make_wsgi_view`, and it takes the same
+    arguments, plus ``max_workers`` (by keyword only).
+
+    Each view gets its own pool of threads to run ``wsgi_app``, so a slow
+    application cannot take the threads used by other views. The pool is
+    available as the ``executor`` attribute of the view, to be passed on to
+    :func:`iterate_response_body`.
+
+    :param max_workers: The maximum number of threads running ``wsgi_app``
+        at the same time, which defaults to that of
+        :class:`concurrent.futures.ThreadPoolExecutor`.
+    :type max_workers: :class:`int`
+    :return: The view coroutine function.
+
+    """
+    executor = ThreadPoolExecutor(max_workers)
+    wsgi_view = embedded_wsgi.make_wsgi_view(wsgi_app, *args, **kwargs)
+
+    async def view(request, path_info):
+        loop = asyncio.get_event_loop()
+        django_response = await loop.run_in_executor(
+            executor,
+            wsgi_view,
+            request,
+            path_info,
+            )
+        return django_response
+
+    view.executor = executor
+    return view
+
+
+def iterate_response_body(django_response, executor=None):
+    """
+    Return an asynchronous iterator over the body of ``django_response``.
+
+    The chunks of streamed responses are pulled in ``executor``, where the
+    response is also closed once the body has been iterated over (or
+    :meth:`aclose` is awaited).
+
+    :param executor: The executor in which the body is pulled, which defaults
+        to the event loop's default executor.
+    :type executor: :class:`concurrent.futures.Executor`
+
+    """
+    return _AsyncBodyIterator(django_response, executor)
+
+
+class _AsyncBodyIterator(object):
+
+    def __init__(self, django_response, executor):
+        super(_AsyncBodyIterator, self).__init__()
+        self._django_response = django_response
+        self._executor = executor
+        self._chunks = None
+        self._is_closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._is_closed:
+            raise StopAsyncIteration
+
+        loop = asyncio.get_event_loop()
+        try:
+            if self._chunks is None:
+                self._chunks = await loop.run_in_executor(
+                    self._executor,
+                    iter,
+                    self._django_response,
+                    )
+            chunk = await loop.run_in_executor(
+                self._executor,
+                next,
+                self._chunks,
+                None,
+                )
+        except BaseException:
+            await self.aclose()
+            raise
+
+        if chunk is None:
+            await self.aclose()
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self):
+        if self._is_closed:
+            return
+        self._is_closed = True
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, self._django_response.close)
@@ -17,18 +17,58 @@
 Utilities to use WSGI applications within Django.
 
 """
+import re
+import zlib
+from collections import deque
+from functools import partial
+from io import BufferedReader
+from hashlib import md5
+from threading import Condition
+from timeit import default_timer
+from uuid import uuid4
 
+from django.conf import settings
+from django.http import FileResponse
 from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.http.response import REASON_PHRASES
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.http import parse_http_date_safe
+from django.utils.http import quote_etag
 from six import PY2
+from six import reraise
 from six import text_type
+from six.moves.http_cookies import CookieError
+from six.moves.http_cookies import Morsel
 from six.moves.http_cookies import SimpleCookie
+from webob.request import LimitedLengthFile
 
 from django_wsgi.exc import ApplicationCallError
+from django_wsgi.handler import _LazilyBufferedInput
+from django_wsgi.handler import _SeekableInputView
+from django_wsgi.handler import _SizeLimitedInput
+from django_wsgi.handler import _is_body_length_unknown
+from django_wsgi.signals import _PhaseTimer
 
-__all__ = ("call_wsgi_app", "make_wsgi_view")
+__all__ = ("call_wsgi_app", "make_wsgi_view", "ConcurrencyLimit")
 
 
-def call_wsgi_app(wsgi_app, request, path_info):
+def call_wsgi_app(
+    wsgi_app,
+    request,
+    path_info,
+    streaming=False,
+    raw_cookies=False,
+    server_timing=False,
+    single_flight=None,
+    conditional=False,
+    weak_etags=False,
+    ranges=False,
+    compression=False,
+    remote_user="eager",
+    unbuffered_input=False,
+    ):
     """
     Call the ``wsgi_app`` with ``request`` and return its response.
     
@@ -38,15 +78,118 @@ def call_wsgi_app(wsgi_app, request, path_info):
     :type request: :class:`django_wsgi.handler.DjangoWSGIRequest`
     :param path_info: The ``PATH_INFO`` to be used by the WSGI application.
     :type path: :class:`basestring`
+    :param streaming: Whether the body of the response should be pulled
+        lazily from the WSGI application as it is sent to the client, instead
+        of being read into memory beforehand.
+    :type streaming: :class:`bool`
+    :param raw_cookies: Whether the ``Set-Cookie`` headers from the WSGI
+        application should be passed on verbatim, instead of being parsed and
+        set again with :meth:`django.http.HttpResponse.set_cookie` (which
+        loses some attributes, like ``HttpOnly``).
+    :type raw_cookies: :class:`bool`
+    :param server_timing: Whether to add a ``Server-Timing`` header to the
+        response, with the time spent preparing the request for the WSGI
+        application (``prep``), running the application (``app``) and turning
+        its response into a Django response (``conversion``).
+    :type server_timing: :class:`bool`
+    :param single_flight: The coalescer through which identical, concurrent
+        requests share a single call to the WSGI application. It's not used
+        if ``streaming`` is set.
+    :type single_flight: :class:`django_wsgi.response_cache.SingleFlight`
+    :param conditional: Whether to answer conditional ``GET`` and ``HEAD``
+        requests (with ``If-None-Match`` or ``If-Modified-Since``) with a
+        "304 Not Modified" response when the ``ETag`` or ``Last-Modified``
+        headers from the WSGI application allow it, and to drop the body of
+        responses to ``HEAD`` requests. In either case, the body from the WSGI
+        application is closed without being read.
+    :type conditional: :class:`bool`
+    :param weak_etags: Whether to set a weak ``ETag`` header, computed from
+        the body, on the responses to ``GET`` requests which don't have one.
+        It's not used if ``streaming`` is set.
+    :type weak_etags: :class:`bool`
+    :param ranges: Whether to answer ``GET`` requests with a ``Range`` header
+        with "206 Partial Content" responses, when the length of the body from
+        the WSGI application is known. If the body is a seekable file, the
+        ranges are read from it directly. Overlapping or adjacent ranges are
+        coalesced, and requests for more than 100 ranges get the whole body.
+    :type ranges: :class:`bool`
+    :param compression: Whether to compress the body of the response with
+        ``gzip`` or ``deflate``, as negotiated with the ``Accept-Encoding``
+        header in ``request``. Streamed bodies are compressed chunk by chunk,
+        as they are pulled from the WSGI application. Bodies which are small
+        or of a type which is already compressed (e.g., images) are left
+        alone.
+    :type compression: :class:`bool`
+    :param remote_user: How the username of the user authenticated in Django
+        is passed on to the WSGI application in ``REMOTE_USER``: Either
+        ``"eager"``, to look the user up before the WSGI application is
+        called; ``"credentials"``, to look the user up only if ``request``
+        has a session cookie or an ``Authorization`` header; or ``None``, to
+        not pass it on.
+    :type remote_user: :class:`str`
+    :param unbuffered_input: Whether to pass the original body of the request
+        on to the WSGI application, limited to its ``Content-Length``, instead
+        of buffering it. This is only possible if it hasn't been buffered yet
+        (see the setting ``WSGI_LAZY_REQUEST_BODY``); otherwise, the WSGI
+        application gets the buffered body. Either way, Django can no longer
+        read the body afterwards.
+    :type unbuffered_input: :class:`bool`
     :raises django_wsgi.exc.ApplicationCallError: If ``path_info`` is not the
         last portion of the ``PATH_INFO`` in ``request``.
     :return: The response from the WSGI application, turned into a Django
         response.
-    :rtype: :class:`django.http.HttpResponse`
+    :rtype: :class:`django.http.HttpResponse` or
+        :class:`django.http.StreamingHttpResponse` if ``streaming`` is set
     
     """
+    call_wsgi_app = partial(
+        _call_wsgi_app,
+        wsgi_app,
+        request,
+        path_info,
+        streaming,
+        raw_cookies,
+        server_timing,
+        conditional,
+        weak_etags,
+        ranges,
+        compression,
+        remote_user,
+        unbuffered_input,
+        )
+    if single_flight is None or streaming:
+        django_response = call_wsgi_app()
+    else:
+        django_response = single_flight.get_response(
+            request,
+            path_info,
+            call_wsgi_app,
+            )
+    return django_response
+
+
+def _call_wsgi_app(
+    wsgi_app,
+    request,
+    path_info,
+    streaming,
+    raw_cookies,
+    server_timing,
+    conditional=False,
+    weak_etags=False,
+    ranges=False,
+    compression=False,
+    remote_user="eager",
+    unbuffered_input=False,
+    ):
+    """Call the ``wsgi_app`` like :func:`call_wsgi_app`."""
+    if remote_user not in _REMOTE_USER_MODES:
+        raise ValueError("Unknown REMOTE_USER mode %r" % remote_user)
+
+    timer = _PhaseTimer.start(wsgi_app, request, server_timing)
+
     webob_request = request.webob
-    new_request = webob_request.copy()
+    new_request = _clone_webob_request(webob_request, unbuffered_input)
     
     # Moving the portion of the path consumed by the current view, from the
     # PATH_INTO to the SCRIPT_NAME:
@@ -54,13 +197,16 @@ def call_wsgi_app(wsgi_app, request, path_info):
         raise ApplicationCallError("Path %s is not the last portion of the "
                                    "PATH_INFO in the original request (%s)"
                                    % (path_info, request.path_info))
-    consumed_path = request.path_info[:-len(path_info)]
+    consumed_path = request.path_info[:len(request.path_info) - len(path_info)]
     new_request.path_info = path_info
     new_request.script_name = webob_request.script_name + consumed_path
     
     # If the user has been authenticated in Django, log him in the WSGI app:
-    if request.user.is_authenticated():
-        new_request.remote_user = request.user.username
+    if remote_user == "eager" or (
+        remote_user == "credentials" and _has_credentials(request)
+        ):
+        if request.user.is_authenticated():
+            new_request.remote_user = request.user.username
     
     # Cleaning the routing_args, if any. The application should have its own
     # arguments, without relying on any arguments from a parent application:
@@ -70,53 +216,1229 @@ def call_wsgi_app(wsgi_app, request, path_info):
     if "webob.adhoc_attrs" in request.environ:
         del new_request.environ['webob.adhoc_attrs']
     
+    # Files are sent by Django, so the application can't use the server's
+    # file wrapper:
+    new_request.environ['wsgi.file_wrapper'] = _FileWrapper
+    
+    if timer is not None:
+        timer.end_phase('request_clone')
+    
     # Calling the WSGI application and getting its response:
-    (status_line, headers, body) = new_request.call_application(wsgi_app)
+    if streaming:
+        (status_line, headers, body) = \
+            _call_streaming_application(new_request, wsgi_app)
+    else:
+        (status_line, headers, body) = new_request.call_application(wsgi_app)
+    
+    if timer is not None:
+        timer.end_phase('application_call')
     
     status_code_raw = status_line.split(" ", 1)[0]
     status_code = int(status_code_raw)
     
+    is_not_modified = \
+        conditional and _is_not_modified(request, status_code, headers)
+    if is_not_modified:
+        status_code = 304
+    is_body_omitted = \
+        is_not_modified or (conditional and request.method == "HEAD")
+    if is_body_omitted:
+        if hasattr(body, 'close'):
+            body.close()
+        body = []
+    
     # Turning its response into a Django response:
-    cookies = SimpleCookie()
-    django_response = HttpResponse(body, status=status_code)
-    for (header, value) in headers:
-        if header.upper() == "SET-COOKIE":
-            if PY2 and isinstance(value, text_type):
-                # It can't be Unicode:
-                value = value.encode("us-ascii")
-            cookies.load(value)
-        else:
-            django_response[header] = value
+    filelike = _get_app_iter_file(body)
+    if filelike is not None:
+        # The file is streamed regardless, so that the server can send it
+        # with its own wsgi.file_wrapper:
+        django_response = FileResponse(filelike, status=status_code)
+        if isinstance(body, _FileWrapper):
+            django_response.block_size = body.block_size
+        if not hasattr(django_response, 'file_to_stream'):
+            # Django < 1.8
+            django_response.file_to_stream = filelike
+    elif streaming:
+        django_response = StreamingHttpResponse(
+            _AppIterator(body, timer),
+            status=status_code,
+            )
+    else:
+        django_response = HttpResponse(status=status_code)
+        django_response.content = body
+        if timer is not None:
+            timer.end_phase('body_collection')
+    cookie_header_values = _copy_headers(headers, django_response)
     
+    if weak_etags and not django_response.streaming and not is_body_omitted:
+        _set_weak_etag(request, django_response, conditional)
+    
+    if django_response.status_code == 304:
+        for header in ('Content-Type', 'Content-Length'):
+            if django_response.has_header(header):
+                del django_response[header]
+    
+    if ranges and not is_body_omitted:
+        _serve_ranges(request, django_response, filelike)
+
+    if compression and not is_body_omitted:
+        _compress_response(request, django_response)
+
     # Setting the cookies from Django:
-    for (cookie_name, cookie) in cookies.items():
-        cookie_attributes = {
-            'key': cookie_name,
-            'value': cookie.value,
-            'expires': cookie['expires'],
-            'path': cookie['path'],
-            'domain': cookie['domain'],
-            }
-        if cookie['max-age']:
-            # Starting in Django 1.3 it performs arithmetic operations
-            # with 'Max-Age'
-            cookie_attributes['max_age'] = int(cookie['max-age'])
-
-        django_response.set_cookie(**cookie_attributes)
+    if raw_cookies:
+        for cookie_header_value in cookie_header_values:
+            cookie = _RawCookie(cookie_header_value)
+            dict.__setitem__(django_response.cookies, cookie.name, cookie)
+    else:
+        cookies = SimpleCookie()
+        for cookie_header_value in cookie_header_values:
+            cookies.load(cookie_header_value)
+        for (cookie_name, cookie) in cookies.items():
+            cookie_attributes = {
+                'key': cookie_name,
+                'value': cookie.value,
+                'expires': cookie['expires'],
+                'path': cookie['path'],
+                'domain': cookie['domain'],
+                }
+            if cookie['max-age']:
+                # Starting in Django 1.3 it performs arithmetic operations
+                # with 'Max-Age'
+                cookie_attributes['max_age'] = int(cookie['max-age'])
+
+            django_response.set_cookie(**cookie_attributes)
+    
+    if timer is not None:
+        timer.end_phase('response_conversion')
+        if server_timing:
+            _add_server_timing(django_response, timer.durations)
     return django_response
 
 
-def make_wsgi_view(wsgi_app):
+def make_wsgi_view(
+    wsgi_app,
+    streaming=False,
+    raw_cookies=False,
+    server_timing=False,
+    concurrency_limit=None,
+    response_cache=None,
+    single_flight=None,
+    conditional=False,
+    weak_etags=False,
+    ranges=False,
+    compression=False,
+    remote_user="eager",
+    unbuffered_input=False,
+    ):
     """
     Return a callable which can be used as a Django view powered by the
     ``wsgi_app``.
     
     :param wsgi_app: The WSGI which will run the view.
+    :param streaming: Whether the responses from ``wsgi_app`` should be
+        streamed; see :func:`call_wsgi_app`.
+    :type streaming: :class:`bool`
+    :param raw_cookies: Whether the cookies set by ``wsgi_app`` should be
+        passed on verbatim; see :func:`call_wsgi_app`.
+    :type raw_cookies: :class:`bool`
+    :param server_timing: Whether to report the time spent in ``wsgi_app``
+        in the ``Server-Timing`` header; see :func:`call_wsgi_app`.
+    :type server_timing: :class:`bool`
+    :param concurrency_limit: The limit on the number of concurrent calls to
+        ``wsgi_app``, beyond which requests get a "503 Service Unavailable"
+        response.
+    :type concurrency_limit: :class:`ConcurrencyLimit`
+    :param response_cache: The cache for the responses from ``wsgi_app``.
+        Cached responses are served without calling ``wsgi_app``.
+    :type response_cache: :class:`django_wsgi.response_cache.ResponseCache`
+    :param single_flight: The coalescer of identical, concurrent requests to
+        ``wsgi_app``; see :func:`call_wsgi_app`.
+    :type single_flight: :class:`django_wsgi.response_cache.SingleFlight`
+    :param conditional: Whether to answer conditional requests with
+        "304 Not Modified" responses and drop the body of the responses to
+        ``HEAD`` requests; see :func:`call_wsgi_app`.
+    :type conditional: :class:`bool`
+    :param weak_etags: Whether to generate weak ``ETag`` headers from the
+        bodies of the responses; see :func:`call_wsgi_app`.
+    :type weak_etags: :class:`bool`
+    :param ranges: Whether to answer requests for ranges of the responses
+        with "206 Partial Content" responses; see :func:`call_wsgi_app`.
+    :type ranges: :class:`bool`
+    :param compression: Whether to compress the responses from ``wsgi_app``
+        with ``gzip`` or ``deflate``; see :func:`call_wsgi_app`.
+    :type compression: :class:`bool`
+    :param remote_user: How the user authenticated in Django is passed on to
+        ``wsgi_app``; see :func:`call_wsgi_app`.
+    :type remote_user: :class:`str`
+    :param unbuffered_input: Whether to pass the original body of the
+        requests on to ``wsgi_app`` without buffering it, if possible; see
+        :func:`call_wsgi_app`.
+    :type unbuffered_input: :class:`bool`
     :return: The view callable.
     
     """
     
     def view(request, path_info):
-        return call_wsgi_app(wsgi_app, request, path_info)
+        return call_wsgi_app(
+            wsgi_app,
+            request,
+            path_info,
+            streaming,
+            raw_cookies,
+            server_timing,
+            single_flight,
+            conditional,
+            weak_etags,
+            ranges,
+            compression,
+            remote_user,
+            unbuffered_input,
+            )
+    
+    if concurrency_limit is not None:
+        view = _limit_concurrency(view, concurrency_limit)
+    
+    if response_cache is not None:
+        view = _cache_responses(view, response_cache)
     
     return view
+
+
+class ConcurrencyLimit(object):
+    """
+    Limit on the number of concurrent calls to an embedded WSGI application.
+    
+    Once ``max_calls`` calls are in flight, up to ``max_queue_size`` requests
+    wait for one of them to finish (for up to ``queue_timeout`` seconds, if
+    set). Other requests are shed. Waiting requests get the calls which finish
+    in the order they arrived, before any new request.
+    
+    A call to an application whose response is streamed finishes when the
+    response is closed.
+    
+    .. attribute:: in_flight_call_count
+    
+        The number of calls in flight.
+    
+    .. attribute:: waiting_request_count
+    
+        The number of requests currently waiting for a call to finish.
+    
+    .. attribute:: queued_request_count
+    
+        The number of requests which have had to wait for a call to finish.
+    
+    .. attribute:: shed_request_count
+    
+        The number of requests shed, because the queue was full or they waited
+        for too long.
+    
+    """
+
+    def __init__(self, max_calls, max_queue_size=0, queue_timeout=None):
+        super(ConcurrencyLimit, self).__init__()
+        self.max_calls = max_calls
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+
+        self.in_flight_call_count = 0
+        self.waiting_request_count = 0
+        self.queued_request_count = 0
+        self.shed_request_count = 0
+
+        self._condition = Condition()
+        self._queue = deque()
+
+    def acquire(self):
+        """
+        Start a call, waiting for another one to finish if necessary.
+        
+        :return: Whether the call can go ahead; if not, the request was shed.
+        :rtype: :class:`bool`
+        
+        """
+        with self._condition:
+            if not self._queue and self.in_flight_call_count < self.max_calls:
+                self.in_flight_call_count += 1
+                return True
+
+            if self.max_queue_size <= self.waiting_request_count:
+                self.shed_request_count += 1
+                return False
+
+            queued_request = _QueuedRequest()
+            self._queue.append(queued_request)
+            self.waiting_request_count += 1
+            self.queued_request_count += 1
+            try:
+                self._wait_for_call_end(queued_request)
+            finally:
+                self.waiting_request_count -= 1
+                if not queued_request.is_call_started:
+                    self._queue.remove(queued_request)
+
+            if not queued_request.is_call_started:
+                self.shed_request_count += 1
+            return queued_request.is_call_started
+
+    def release(self):
+        """Finish a call started with :meth:`acquire`."""
+        with self._condition:
+            if self._queue:
+                # Handing the call over to the request which has waited the
+                # longest, so that new requests can't jump the queue:
+                self._queue.popleft().is_call_started = True
+                self._condition.notify_all()
+            else:
+                self.in_flight_call_count -= 1
+
+    def _wait_for_call_end(self, queued_request):
+        if self.queue_timeout is None:
+            deadline = None
+        else:
+            deadline = default_timer() + self.queue_timeout
+
+        while not queued_request.is_call_started:
+            if deadline is None:
+                self._condition.wait()
+            else:
+                remaining_time = deadline - default_timer()
+                if remaining_time <= 0:
+                    return
+                self._condition.wait(remaining_time)
+
+
+class _QueuedRequest(object):
+
+    def __init__(self):
+        super(_QueuedRequest, self).__init__()
+        self.is_call_started = False
+
+
+def _limit_concurrency(view, concurrency_limit):
+    
+    def limited_view(request, path_info):
+        if not concurrency_limit.acquire():
+            return HttpResponse(status=503)
+        
+        is_call_finished = True
+        try:
+            django_response = view(request, path_info)
+            if django_response.streaming:
+                # The call finishes when the response has been sent:
+                django_response._closable_objects.append(
+                    _ConcurrencyLimitRelease(concurrency_limit),
+                    )
+                is_call_finished = False
+        finally:
+            if is_call_finished:
+                concurrency_limit.release()
+        return django_response
+    
+    return limited_view
+
+
+def _cache_responses(view, response_cache):
+    
+    def caching_view(request, path_info):
+        django_response = response_cache.get_response(request, path_info)
+        if django_response is None:
+            django_response = view(request, path_info)
+            response_cache.store_response(request, path_info, django_response)
+        return django_response
+    
+    return caching_view
+
+
+class _ConcurrencyLimitRelease(object):
+    """
+    Closable object which releases a :class:`ConcurrencyLimit` at most once.
+    
+    """
+
+    def __init__(self, concurrency_limit):
+        super(_ConcurrencyLimitRelease, self).__init__()
+        self._concurrency_limit = concurrency_limit
+
+    def close(self):
+        if self._concurrency_limit is not None:
+            self._concurrency_limit.release()
+            self._concurrency_limit = None
+
+
+_COOKIE_HEADER = object()
+
+_HOP_BY_HOP_HEADER = object()
+
+_LIST_HEADER = object()
+
+_SPECIAL_HEADERS = {
+    'set-cookie': _COOKIE_HEADER,
+
+    # These only concern the connection between the embedded application and
+    # Django (see RFC 7230, Section 6.1):
+    'connection': _HOP_BY_HOP_HEADER,
+    'keep-alive': _HOP_BY_HOP_HEADER,
+    'proxy-authenticate': _HOP_BY_HOP_HEADER,
+    'proxy-authorization': _HOP_BY_HOP_HEADER,
+    'te': _HOP_BY_HOP_HEADER,
+    'trailer': _HOP_BY_HOP_HEADER,
+    'transfer-encoding': _HOP_BY_HOP_HEADER,
+    'upgrade': _HOP_BY_HOP_HEADER,
+
+    # These may be repeated, in which case their values are combined into a
+    # comma-separated list (see RFC 7230, Section 3.2.2):
+    'accept-patch': _LIST_HEADER,
+    'accept-ranges': _LIST_HEADER,
+    'access-control-allow-headers': _LIST_HEADER,
+    'access-control-allow-methods': _LIST_HEADER,
+    'access-control-expose-headers': _LIST_HEADER,
+    'allow': _LIST_HEADER,
+    'cache-control': _LIST_HEADER,
+    'content-encoding': _LIST_HEADER,
+    'content-language': _LIST_HEADER,
+    'link': _LIST_HEADER,
+    'pragma': _LIST_HEADER,
+    'server-timing': _LIST_HEADER,
+    'vary': _LIST_HEADER,
+    'via': _LIST_HEADER,
+    'warning': _LIST_HEADER,
+    'www-authenticate': _LIST_HEADER,
+    }
+
+
+def _copy_headers(headers, django_response):
+    """
+    Set the ``headers`` from a WSGI response on ``django_response``, except
+    for the cookies.
+    
+    :return: The values of the ``Set-Cookie`` headers.
+    
+    """
+    cookie_header_values = []
+    django_headers = {}
+    convert_to_charset = django_response._convert_to_charset
+    for (header, value) in headers:
+        header_key = header.lower()
+        header_type = _SPECIAL_HEADERS.get(header_key)
+
+        if header_type is _COOKIE_HEADER:
+            if PY2 and isinstance(value, text_type):
+                # It can't be Unicode:
+                value = value.encode("us-ascii")
+            cookie_header_values.append(value)
+            continue
+
+        if header_type is _HOP_BY_HOP_HEADER:
+            continue
+
+        value = convert_to_charset(value, 'latin-1', mime_encode=True)
+        if header_type is _LIST_HEADER and header_key in django_headers:
+            header, previous_value = django_headers[header_key]
+            value = previous_value + ", " + value
+        else:
+            header = convert_to_charset(header, 'ascii')
+        django_headers[header_key] = (header, value)
+
+    django_response._headers.update(django_headers)
+    return cookie_header_values
+
+
+def _is_not_modified(request, status_code, headers):
+    """
+    Report whether the response from a WSGI application, with the
+    ``status_code`` and ``headers``, hasn't changed since the version cached
+    by the client.
+    
+    """
+    if request.method not in ("GET", "HEAD") or status_code != 200:
+        return False
+    
+    etag = None
+    last_modified = None
+    for (header, value) in headers:
+        header_key = header.lower()
+        if header_key == "etag":
+            etag = value
+        elif header_key == "last-modified":
+            last_modified = value
+    
+    return _is_cached_version_current(request, etag, last_modified)
+
+
+def _is_cached_version_current(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # ETags are compared with the weak comparison function (RFC 7232,
+        # Section 3.2):
+        if etag is None:
+            is_current = False
+        else:
+            client_etags = parse_etags(if_none_match)
+            is_current = "*" in client_etags or \
+                parse_etags(etag)[0] in client_etags
+        return is_current
+    
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and last_modified:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        last_modified = parse_http_date_safe(last_modified)
+        is_current = if_modified_since is not None and \
+            last_modified is not None and \
+            last_modified <= if_modified_since
+    else:
+        is_current = False
+    return is_current
+
+
+def _set_weak_etag(request, django_response, conditional):
+    is_etag_settable = request.method == "GET" and \
+        django_response.status_code == 200 and \
+        not django_response.has_header('ETag')
+    if not is_etag_settable:
+        return
+    
+    etag = "W/" + quote_etag(md5(django_response.content).hexdigest())
+    django_response['ETag'] = etag
+    
+    if conditional and _is_cached_version_current(request, etag, None):
+        _set_status_code(django_response, 304)
+        django_response.content = b""
+
+
+def _serve_ranges(request, django_response, filelike):
+    """
+    Turn ``django_response`` into a partial response if ``request`` asks for
+    ranges of it (RFC 7233).
+
+    """
+    if django_response.status_code != 200:
+        return
+
+    body_reader = _get_body_reader(django_response, filelike)
+    if body_reader is None:
+        return
+
+    range_header = request.META.get('HTTP_RANGE')
+    if request.method != "GET" or not range_header:
+        byte_ranges = None
+    elif not _is_if_range_satisfied(request, django_response):
+        byte_ranges = None
+    else:
+        byte_ranges = _parse_byte_ranges(range_header, body_reader.length)
+
+    if byte_ranges is not None and not body_reader.is_seekable and \
+            not _are_ranges_sequential(byte_ranges):
+        # These ranges can't be served from this body, so the whole body is
+        # sent without claiming support for ranges:
+        return
+    django_response['Accept-Ranges'] = "bytes"
+    if byte_ranges is None:
+        return
+
+    if not byte_ranges:
+        _set_status_code(django_response, 416)
+        django_response['Content-Range'] = "bytes */%s" % body_reader.length
+        body_parts = []
+    elif len(byte_ranges) == 1:
+        _set_status_code(django_response, 206)
+        ((first_byte, last_byte), ) = byte_ranges
+        django_response['Content-Range'] = \
+            _format_content_range(first_byte, last_byte, body_reader.length)
+        body_parts = [body_reader.read_range(first_byte, last_byte)]
+    else:
+        _set_status_code(django_response, 206)
+        boundary = uuid4().hex
+        body_parts = _get_multipart_body_parts(
+            byte_ranges,
+            body_reader,
+            boundary,
+            django_response.get('Content-Type'),
+            )
+        django_response['Content-Type'] = \
+            "multipart/byteranges; boundary=" + boundary
+
+    content_length = sum(
+        _get_body_part_length(body_part) for body_part in body_parts
+        )
+    django_response['Content-Length'] = str(content_length)
+
+    body = _iter_body_parts(body_parts)
+    if django_response.streaming:
+        # The original body, if any, is still closed with the response:
+        django_response.streaming_content = body
+        django_response.file_to_stream = None
+    else:
+        django_response.content = b"".join(body)
+
+
+def _is_if_range_satisfied(request, django_response):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Weak ETags never match (RFC 7233, Section 3.2):
+        etag = django_response.get('ETag')
+        is_satisfied = not if_range.startswith("W/") and etag == if_range
+    else:
+        if_range_date = parse_http_date_safe(if_range)
+        last_modified = django_response.get('Last-Modified')
+        is_satisfied = if_range_date is not None and \
+            last_modified is not None and \
+            if_range_date == parse_http_date_safe(last_modified)
+    return is_satisfied
+
+
+# Requests for more ranges than this are served in full, as they could be
+# used to make the response much larger than the body (RFC 7233, Section 6.1):
+_MAX_BYTE_RANGE_COUNT = 100
+
+# Only ASCII digits, unlike str.isdigit() and int():
+_BYTE_POSITION_RE = re.compile(r"^[0-9]+$")
+
+
+def _parse_byte_ranges(range_header, length):
+    """
+    Return the satisfiable ranges of bytes in ``range_header``, as
+    ``(first_byte, last_byte)`` tuples, or ``None`` if it's invalid or asks
+    for too many ranges.
+
+    Overlapping or adjacent ranges are coalesced.
+
+    """
+    (range_unit, _, range_specs) = range_header.partition("=")
+    if range_unit.strip().lower() != "bytes":
+        return None
+
+    range_specs = [
+        range_spec.strip() for range_spec in range_specs.split(",")
+        if range_spec.strip()
+        ]
+    if not range_specs or _MAX_BYTE_RANGE_COUNT < len(range_specs):
+        return None
+
+    byte_ranges = []
+    for range_spec in range_specs:
+        (first_byte, separator, last_byte) = range_spec.partition("-")
+        if not separator:
+            return None
+        if first_byte:
+            if not _BYTE_POSITION_RE.match(first_byte):
+                return None
+            first_byte = int(first_byte)
+            if last_byte:
+                if not _BYTE_POSITION_RE.match(last_byte):
+                    return None
+                last_byte = int(last_byte)
+                if last_byte < first_byte:
+                    return None
+            else:
+                last_byte = length - 1
+        else:
+            if not _BYTE_POSITION_RE.match(last_byte):
+                return None
+            suffix_length = int(last_byte)
+            first_byte = max(length - suffix_length, 0)
+            last_byte = length - 1
+
+        if first_byte < length and first_byte <= last_byte:
+            byte_ranges.append((first_byte, min(last_byte, length - 1)))
+
+    return _coalesce_byte_ranges(byte_ranges)
+
+
+def _coalesce_byte_ranges(byte_ranges):
+    """
+    Merge the overlapping or adjacent ``byte_ranges``, in the position of the
+    first of them; the other ranges keep their order.
+
+    """
+    coalesced_byte_ranges = []
+    for (first_byte, last_byte) in byte_ranges:
+        position = len(coalesced_byte_ranges)
+        index = 0
+        while index < len(coalesced_byte_ranges):
+            (other_first_byte, other_last_byte) = coalesced_byte_ranges[index]
+            if other_first_byte <= last_byte + 1 and \
+                    first_byte <= other_last_byte + 1:
+                first_byte = min(first_byte, other_first_byte)
+                last_byte = max(last_byte, other_last_byte)
+                del coalesced_byte_ranges[index]
+                position = min(position, index)
+            else:
+                index += 1
+        coalesced_byte_ranges.insert(position, (first_byte, last_byte))
+    return coalesced_byte_ranges
+
+
+def _are_ranges_sequential(byte_ranges):
+    previous_last_byte = -1
+    for (first_byte, last_byte) in byte_ranges:
+        if first_byte <= previous_last_byte:
+            return False
+        previous_last_byte = last_byte
+    return True
+
+
+def _format_content_range(first_byte, last_byte, length):
+    return "bytes %s-%s/%s" % (first_byte, last_byte, length)
+
+
+def _get_multipart_body_parts(byte_ranges, body_reader, boundary, mime_type):
+    body_parts = []
+    for (first_byte, last_byte) in byte_ranges:
+        part_headers = "--%s\r\n" % boundary
+        if mime_type:
+            part_headers += "Content-Type: %s\r\n" % mime_type
+        content_range = _format_content_range(
+            first_byte,
+            last_byte,
+            body_reader.length,
+            )
+        part_headers += "Content-Range: %s\r\n\r\n" % content_range
+        body_parts.append(part_headers.encode("latin-1"))
+        body_parts.append(body_reader.read_range(first_byte, last_byte))
+        body_parts.append(b"\r\n")
+    body_parts.append(("--%s--\r\n" % boundary).encode("ascii"))
+    return body_parts
+
+
+def _get_body_part_length(body_part):
+    if isinstance(body_part, _BodyRange):
+        body_part_length = body_part.length
+    else:
+        body_part_length = len(body_part)
+    return body_part_length
+
+
+def _iter_body_parts(body_parts):
+    for body_part in body_parts:
+        if isinstance(body_part, _BodyRange):
+            for chunk in body_part:
+                yield chunk
+        else:
+            yield body_part
+
+
+def _get_body_reader(django_response, filelike):
+    """
+    Return a reader for ranges of the body of ``django_response``, or
+    ``None`` if its length is unknown.
+
+    """
+    if not django_response.streaming:
+        return _ContentReader(django_response.content)
+
+    content_length = django_response.get('Content-Length')
+    try:
+        length = int(content_length)
+    except (TypeError, ValueError):
+        length = None
+
+    if filelike is not None and _is_file_seekable(filelike):
+        body_reader = _SeekableFileReader(filelike, length)
+    elif length is not None:
+        body_reader = _StreamReader(django_response.streaming_content, length)
+    else:
+        body_reader = None
+    return body_reader
+
+
+def _is_file_seekable(filelike):
+    if hasattr(filelike, 'seekable'):
+        try:
+            is_seekable = filelike.seekable()
+        except Exception:
+            is_seekable = False
+    else:
+        is_seekable = hasattr(filelike, 'seek') and hasattr(filelike, 'tell')
+    return is_seekable
+
+
+class _BodyRange(object):
+    """Lazy iterable over the bytes in a range of a body."""
+
+    def __init__(self, iter_range, first_byte, last_byte):
+        super(_BodyRange, self).__init__()
+        self._iter_range = iter_range
+        self._first_byte = first_byte
+        self._last_byte = last_byte
+        self.length = last_byte - first_byte + 1
+
+    def __iter__(self):
+        return self._iter_range(self._first_byte, self._last_byte)
+
+
+class _ContentReader(object):
+
+    is_seekable = True
+
+    def __init__(self, content):
+        super(_ContentReader, self).__init__()
+        self._content = content
+        self.length = len(content)
+
+    def read_range(self, first_byte, last_byte):
+        return self._content[first_byte:last_byte + 1]
+
+
+class _SeekableFileReader(object):
+
+    is_seekable = True
+
+    _BLOCK_SIZE = 8192
+
+    def __init__(self, filelike, length=None):
+        super(_SeekableFileReader, self).__init__()
+        self._filelike = filelike
+        # The body starts at the current position in the file:
+        self._offset = filelike.tell()
+        if length is None:
+            filelike.seek(0, 2)
+            length = filelike.tell() - self._offset
+            filelike.seek(self._offset)
+        self.length = length
+
+    def read_range(self, first_byte, last_byte):
+        return _BodyRange(self._iter_range, first_byte, last_byte)
+
+    def _iter_range(self, first_byte, last_byte):
+        self._filelike.seek(self._offset + first_byte)
+        remaining_length = last_byte - first_byte + 1
+        while remaining_length:
+            chunk_size = min(self._BLOCK_SIZE, remaining_length)
+            chunk = self._filelike.read(chunk_size)
+            if not chunk:
+                break
+            remaining_length -= len(chunk)
+            yield chunk
+
+
+class _StreamReader(object):
+    """
+    Reader for sequential ranges of a body which can only be read once.
+
+    """
+
+    is_seekable = False
+
+    def __init__(self, chunks, length):
+        super(_StreamReader, self).__init__()
+        self._chunks = iter(chunks)
+        self._position = 0
+        self._pending_chunk = b""
+        self.length = length
+
+    def read_range(self, first_byte, last_byte):
+        return _BodyRange(self._iter_range, first_byte, last_byte)
+
+    def _iter_range(self, first_byte, last_byte):
+        end_position = last_byte + 1
+        while self._position < end_position:
+            chunk = self._get_next_chunk()
+            if chunk is None:
+                break
+            chunk_start_position = self._position
+            chunk_end_position = chunk_start_position + len(chunk)
+
+            # Skipping the bytes before the range and keeping those after it
+            # for the next range:
+            range_chunk = chunk[
+                max(first_byte - chunk_start_position, 0):
+                end_position - chunk_start_position
+                ]
+            self._position = min(chunk_end_position, end_position)
+            if end_position < chunk_end_position:
+                self._pending_chunk = \
+                    chunk[end_position - chunk_start_position:]
+            if range_chunk:
+                yield range_chunk
+
+    def _get_next_chunk(self):
+        if self._pending_chunk:
+            chunk = self._pending_chunk
+            self._pending_chunk = b""
+        else:
+            chunk = next(self._chunks, None)
+        return chunk
+
+
+# Bodies shorter than this grow when compressed:
+_COMPRESSION_MIN_LENGTH = 200
+
+_COMPRESSION_WBITS_BY_CONTENT_CODING = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+    }
+
+_UNCOMPRESSIBLE_STATUS_CODES = frozenset((204, 206, 304))
+
+_COMPRESSED_MIME_TYPE_PREFIXES = ("image/", "audio/", "video/")
+
+_COMPRESSIBLE_MIME_TYPES = frozenset(("image/svg+xml", "image/x-icon"))
+
+_COMPRESSED_MIME_TYPES = frozenset((
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/font-woff",
+    "font/woff",
+    "font/woff2",
+    ))
+
+
+def _compress_response(request, django_response):
+    """
+    Compress the body of ``django_response`` with the content-coding
+    preferred by ``request``, if any.
+
+    """
+    status_code = django_response.status_code
+    if status_code < 200 or status_code in _UNCOMPRESSIBLE_STATUS_CODES:
+        return
+    if django_response.has_header('Content-Encoding'):
+        return
+    if not _is_mime_type_compressible(django_response.get('Content-Type')):
+        return
+
+    patch_vary_headers(django_response, ("Accept-Encoding", ))
+
+    if django_response.streaming:
+        content_length = django_response.get('Content-Length')
+        if content_length is not None and content_length.isdigit():
+            content_length = int(content_length)
+        else:
+            content_length = None
+    else:
+        content_length = len(django_response.content)
+    if content_length is not None and \
+            content_length < _COMPRESSION_MIN_LENGTH:
+        return
+
+    content_coding = _get_content_coding(request)
+    if content_coding is None:
+        return
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION,
+        zlib.DEFLATED,
+        _COMPRESSION_WBITS_BY_CONTENT_CODING[content_coding],
+        )
+
+    if django_response.streaming:
+        # The original body, if any, is still closed with the response:
+        django_response.streaming_content = _compress_chunks(
+            django_response.streaming_content,
+            compressor,
+            )
+        django_response.file_to_stream = None
+        if django_response.has_header('Content-Length'):
+            del django_response['Content-Length']
+    else:
+        django_response.content = \
+            compressor.compress(django_response.content) + compressor.flush()
+        django_response['Content-Length'] = str(len(django_response.content))
+
+    django_response['Content-Encoding'] = content_coding
+    # The compressed body is a different representation, so strong ETags
+    # from the WSGI application no longer apply:
+    etag = django_response.get('ETag')
+    if etag and not etag.startswith("W/"):
+        django_response['ETag'] = "W/" + etag
+
+
+def _is_mime_type_compressible(content_type):
+    if not content_type:
+        return True
+
+    mime_type = content_type.split(";", 1)[0].strip().lower()
+    if mime_type in _COMPRESSIBLE_MIME_TYPES:
+        return True
+    return mime_type not in _COMPRESSED_MIME_TYPES and \
+        not mime_type.startswith(_COMPRESSED_MIME_TYPE_PREFIXES)
+
+
+def _get_content_coding(request):
+    if not request.META.get('HTTP_ACCEPT_ENCODING'):
+        # Not assuming that any content-coding is acceptable, unlike RFC 7231:
+        return None
+
+    return request.webob.accept_encoding.best_match(("gzip", "deflate"))
+
+
+def _compress_chunks(chunks, compressor):
+    for chunk in chunks:
+        if not chunk:
+            continue
+        # Flushing after each chunk, so that it reaches the client as soon as
+        # it would if it weren't compressed:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _set_status_code(django_response, status_code):
+    django_response.status_code = status_code
+    django_response.reason_phrase = REASON_PHRASES.get(
+        status_code,
+        "UNKNOWN STATUS CODE",
+        )
+
+
+_SERVER_TIMING_METRICS = (
+    ('prep', ('request_clone', )),
+    ('app', ('application_call', 'body_collection')),
+    ('conversion', ('response_conversion', )),
+    )
+
+
+def _add_server_timing(django_response, phase_durations):
+    metrics = []
+    for (metric_name, phases) in _SERVER_TIMING_METRICS:
+        duration = sum(phase_durations.get(phase, 0) for phase in phases)
+        metrics.append("%s;dur=%.3f" % (metric_name, duration * 1000))
+    server_timing = ", ".join(metrics)
+
+    if django_response.has_header('Server-Timing'):
+        # Keeping the metrics from the WSGI application:
+        server_timing = django_response['Server-Timing'] + ", " + server_timing
+    django_response['Server-Timing'] = server_timing
+
+
+_REMOTE_USER_MODES = frozenset(("eager", "credentials", None))
+
+
+def _has_credentials(request):
+    return 'HTTP_AUTHORIZATION' in request.META or \
+        settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+def _clone_webob_request(webob_request, unbuffered_input=False):
+    """
+    Return a copy of ``webob_request`` which shares its body.
+    
+    Unlike :meth:`webob.Request.copy`, the body is not copied: The new request
+    gets a read-only view over the (seekable) body of ``webob_request``
+    instead.
+
+    If ``unbuffered_input`` is set and the body hasn't been buffered yet, the
+    new request gets the original body (limited to its length) instead, and
+    ``webob_request`` can no longer read it. If its length is unknown, it's
+    still limited to ``WSGI_REQUEST_BODY_MAX_SIZE``.
+    
+    """
+    original_input = None
+    wsgi_input = webob_request.environ.get('wsgi.input')
+    if unbuffered_input and isinstance(wsgi_input, _LazilyBufferedInput):
+        original_input = wsgi_input.detach_original_input()
+
+    if original_input is None:
+        webob_request.make_body_seekable()
+
+    # Copying the environment once the body has been buffered, which may set
+    # its CONTENT_LENGTH:
+    new_environ = dict(webob_request.environ)
+    if original_input is None:
+        new_environ['wsgi.input'] = _SeekableInputView(
+            webob_request.body_file_raw,
+            webob_request.content_length,
+            )
+        new_environ['webob.is_body_seekable'] = True
+    elif _is_body_length_unknown(new_environ):
+        # The server terminates the input:
+        new_environ['wsgi.input'] = _SizeLimitedInput(original_input)
+        del new_environ['webob.is_body_seekable']
+    else:
+        content_length = webob_request.content_length or 0
+        new_environ['wsgi.input'] = BufferedReader(
+            LimitedLengthFile(original_input, content_length),
+            )
+        del new_environ['webob.is_body_seekable']
+
+    new_request = webob_request.__class__(new_environ)
+    return new_request
+
+
+def _call_streaming_application(webob_request, wsgi_app):
+    """
+    Call ``wsgi_app`` with ``webob_request`` and return its status line,
+    headers and body, without reading the body beforehand.
+
+    Unlike :meth:`webob.Request.call_application`, which reads the whole body
+    if the response is only started upon the first iteration (e.g., if
+    ``wsgi_app`` is a generator function), only the first chunk is read then.
+
+    """
+    if webob_request.is_body_seekable:
+        webob_request.body_file_raw.seek(0)
+
+    response_start = []
+    written_chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info is not None:
+            reraise(*exc_info)
+        response_start[:] = [status, headers]
+        return written_chunks.append
+
+    app_iter = wsgi_app(webob_request.environ, start_response)
+    try:
+        chunks = iter(app_iter)
+        if not response_start:
+            # The response is only started upon the first iteration
+            first_chunk = next(chunks, None)
+            if first_chunk is not None:
+                written_chunks.append(first_chunk)
+        if not response_start:
+            raise ApplicationCallError(
+                "The WSGI application did not start the response",
+                )
+    except Exception:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+        raise
+
+    (status_line, headers) = response_start
+    if written_chunks:
+        body = _PrefixedAppIter(written_chunks, chunks, app_iter)
+    else:
+        # Keeping the original body, in case it's backed by a file:
+        body = app_iter
+    return (status_line, headers, body)
+
+
+class _PrefixedAppIter(object):
+    """
+    Iterable over the body of a WSGI response, whose first ``chunks`` have
+    already been pulled from (or written outside) ``app_iter``.
+
+    """
+
+    def __init__(self, chunks, remaining_chunks, app_iter):
+        super(_PrefixedAppIter, self).__init__()
+        self._chunks = chunks
+        self._remaining_chunks = remaining_chunks
+        if hasattr(app_iter, 'close'):
+            self.close = app_iter.close
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield chunk
+        for chunk in self._remaining_chunks:
+            yield chunk
+
+
+class _RawCookie(Morsel):
+    """
+    Cookie whose ``Set-Cookie`` header value is output verbatim, unless it is
+    set again.
+    
+    """
+
+    def __init__(self, header_value):
+        super(_RawCookie, self).__init__()
+
+        self.name, _, cookie_string = header_value.partition("=")
+        self.name = self.name.strip()
+        value = cookie_string.split(";", 1)[0].strip()
+        try:
+            self.set(self.name, value, value)
+        except CookieError:
+            # The cookie is still passed on, but Django won't be able to read
+            # its value
+            pass
+
+        self._header_value = header_value
+
+    def set(self, *args, **kwargs):
+        self._header_value = None
+        super(_RawCookie, self).set(*args, **kwargs)
+
+    def OutputString(self, attrs=None):
+        if self._header_value is None:
+            output_string = super(_RawCookie, self).OutputString(attrs)
+        else:
+            output_string = self._header_value
+        return output_string
+
+
+class _FileWrapper(object):
+    """
+    Implementation of ``wsgi.file_wrapper`` for embedded WSGI applications.
+    
+    """
+
+    def __init__(self, filelike, block_size=8192):
+        super(_FileWrapper, self).__init__()
+        self.filelike = filelike
+        self.block_size = block_size
+        if hasattr(filelike, 'close'):
+            self.close = filelike.close
+
+    def __iter__(self):
+        return iter(lambda: self.filelike.read(self.block_size), b"")
+
+
+def _get_app_iter_file(app_iter):
+    """
+    Return the file behind ``app_iter``, or ``None`` if it's not file-backed.
+    
+    """
+    if isinstance(app_iter, _FileWrapper):
+        filelike = app_iter.filelike
+    elif hasattr(app_iter, 'read'):
+        filelike = app_iter
+    else:
+        filelike = None
+    return filelike
+
+
+class _AppIterator(object):
+    """
+    Iterable over the body of a WSGI response whose ``close()`` method (if
+    any) is called at most once, however many times it is closed.
+    
+    If a ``timer`` is passed, the time spent iterating over the body is
+    reported as the phase ``body_collection`` when it is closed.
+    
+    """
+
+    def __init__(self, app_iter, timer=None):
+        super(_AppIterator, self).__init__()
+        self._app_iter = app_iter
+        self._is_closed = False
+        self._timer = timer
+        self._iteration_duration = 0
+
+    def __iter__(self):
+        if self._timer is None:
+            app_iter = iter(self._app_iter)
+        else:
+            app_iter = self._time_iteration()
+        return app_iter
+
+    def close(self):
+        if self._is_closed:
+            return
+        self._is_closed = True
+
+        if hasattr(self._app_iter, 'close'):
+            self._app_iter.close()
+
+        if self._timer is not None:
+            self._timer.end_phase('body_collection', self._iteration_duration)
+
+    def _time_iteration(self):
+        app_iter = iter(self._app_iter)
+        while True:
+            chunk_start_time = default_timer()
+            try:
+                chunk = next(app_iter)
+            except StopIteration:
+                break
+            finally:
+                self._iteration_duration += default_timer() - chunk_start_time
+            yield chunk
@@ -18,7 +18,11 @@ Exceptions raised by :mod:`django_wsgi.`
 
 """
 
-__all__ = ("DjangoWSGIException", "ApplicationCallError")
+__all__ = (
+    "DjangoWSGIException",
+    "ApplicationCallError",
+    "RequestBodyTooLargeError",
+    )
 
 
 class DjangoWSGIException(Exception):
@@ -32,3 +36,12 @@ class ApplicationCallError(DjangoWSGIException):
     
     """
     pass
+
+
+class RequestBodyTooLargeError(DjangoWSGIException):
+    """
+    Exception raised when the body of a request exceeds the size set in
+    ``WSGI_REQUEST_BODY_MAX_SIZE``.
+    
+    """
+    pass
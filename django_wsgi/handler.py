@@ -16,12 +16,33 @@
 Django request/response handling a la WSGI.
 
 """
+import codecs
+import re
+import weakref
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.core.handlers.wsgi import WSGIHandler as DjangoWSGIHandler
 from django.core.handlers.wsgi import WSGIRequest as DjangoRequest
+from django.http import HttpResponse
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from django.utils.functional import cached_property
+from six import PY2
 from webob import Request as WebobRequest
+from webob.compat import cgi_FieldStorage
+from webob.exc import HTTPRequestEntityTooLarge
+from webob.multidict import MultiDict
+from webob.request import DisconnectionError
+from webob.request import http_method_probably_has_body
+
+from django_wsgi.exc import RequestBodyTooLargeError
+from django_wsgi.signals import _PhaseTimer
 
 
-__all__ = ("DjangoWSGIRequest", "DjangoApplication")
+__all__ = ("DjangoWSGIRequest", "DjangoApplication", "Mount")
 
 
 class DjangoWSGIRequest(DjangoRequest):
@@ -33,34 +54,751 @@ class DjangoWSGIRequest(DjangoRequest):
 
         :class:`webob.Request` instance for the WSGI environment behind the
         current Django request.
+
+        It is created the first time it is accessed, unless the setting
+        ``WSGI_EAGER_WEBOB_REQUEST`` is set to ``True``.
+
+    The body of the request is made seekable so that it can be read by both
+    Django and WebOb. By default, this happens when the request is
+    constructed, but if the setting ``WSGI_LAZY_REQUEST_BODY`` is set to
+    ``True``, the body will only be buffered the first time it is read.
+
+    Django reads the body through its own view over the buffer, so it can read
+    it incrementally (e.g., with ``read(size)``, ``readline()`` or by
+    iterating over the request) without getting in WebOb's way, and vice
+    versa.
+
+    Form submissions (URL-encoded or multipart) in UTF-8 are only parsed once:
+    Whichever of Django's ``POST``/``FILES`` or WebOb's ``POST`` is accessed
+    first parses the body, and the other one gets the same fields and
+    uploaded files.
+
+    Bodies larger than ``WSGI_REQUEST_BODY_MEMORY_LIMIT`` bytes are buffered
+    in a temporary file, and those larger than ``WSGI_REQUEST_BODY_MAX_SIZE``
+    bytes are rejected with
+    :class:`~django_wsgi.exc.RequestBodyTooLargeError`.
+
+    Bodies without a ``Content-Length`` (e.g., sent with chunked
+    ``Transfer-Encoding``) are buffered chunk by chunk if the setting
+    ``WSGI_CHUNKED_REQUEST_BODY`` is set to ``True`` and the server
+    terminates the input (``wsgi.input_terminated``), and they are rejected
+    as soon as they exceed ``WSGI_REQUEST_BODY_MAX_SIZE`` bytes. Otherwise,
+    they are treated as empty by both Django and WebOb.
     
     """
 
     def __init__(self, environ):
-        webob_request = WebobRequest(environ)
-        webob_request.make_body_seekable()
-        super(DjangoWSGIRequest, self).__init__(webob_request.environ)
-        self.webob = webob_request
+        timer = _PhaseTimer.start(self.__class__, self)
+
+        if getattr(settings, 'WSGI_LAZY_REQUEST_BODY', False):
+            _LazilyBufferedInput.install(environ, self)
+        else:
+            _make_body_seekable(environ, self)
+
+        super(DjangoWSGIRequest, self).__init__(environ)
+
+        if _is_body_length_unknown(environ):
+            # Reading up to the end of the body, once it's been buffered:
+            body_length = None
+        else:
+            body_length = _get_content_length(environ) or 0
+        self._stream = _SeekableInputView(environ['wsgi.input'], body_length)
+
+        if getattr(settings, 'WSGI_EAGER_WEBOB_REQUEST', False):
+            self.webob = WebobRequest(environ)
+
+        if timer is not None:
+            timer.end_phase('request_construction')
+
+    @cached_property
+    def webob(self):
+        return WebobRequest(self.environ)
+
+    def _load_post_and_files(self):
+        wsgi_input = self.environ['wsgi.input']
+        if isinstance(wsgi_input, _LazilyBufferedInput) and \
+                _is_body_length_unknown(self.environ):
+            # Django's multipart parser needs the Content-Length, which is
+            # only known once the body has been buffered:
+            wsgi_input.buffer()
+
+        if not self._is_form_shareable():
+            super(DjangoWSGIRequest, self)._load_post_and_files()
+            return
+
+        webob_post = self._get_webob_post()
+        if webob_post is None:
+            super(DjangoWSGIRequest, self)._load_post_and_files()
+            if not self._post_parse_error:
+                # The input may have been replaced while being buffered:
+                self.environ['webob._parsed_post_vars'] = (
+                    _convert_django_post(self._post, self._files),
+                    self.environ['wsgi.input'],
+                    )
+        else:
+            (self._post, self._files) = \
+                _convert_webob_post(webob_post, self._encoding)
+
+    def _is_form_shareable(self):
+        if self.method != "POST":
+            return False
+
+        content_type = self.META.get('CONTENT_TYPE', "")
+        mime_type = content_type.split(";", 1)[0].strip().lower()
+        if mime_type not in _FORM_MIME_TYPES:
+            return False
+
+        # WebOb only parses UTF-8 forms:
+        encoding = self._encoding or settings.DEFAULT_CHARSET
+        return _is_utf8(encoding)
+
+    def _get_webob_post(self):
+        environ = self.environ
+        if 'webob._parsed_post_vars' not in environ:
+            return None
+
+        (webob_post, body_file) = environ['webob._parsed_post_vars']
+        if body_file is not environ['wsgi.input']:
+            return None
+        return webob_post
+
+
+_FORM_MIME_TYPES = frozenset(
+    ("application/x-www-form-urlencoded", "multipart/form-data"),
+    )
+
+
+def _is_utf8(encoding):
+    try:
+        codec_name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    return codec_name == "utf-8"
+
+
+def _convert_django_post(post, files):
+    """Return the WebOb equivalent of Django's ``POST`` and ``FILES``."""
+    webob_post = MultiDict()
+    for (field_name, values) in post.lists():
+        field_name = _get_native_field_name(field_name)
+        for value in values:
+            webob_post.add(field_name, value)
+    for (field_name, uploaded_files) in files.lists():
+        field_name = _get_native_field_name(field_name)
+        for uploaded_file in uploaded_files:
+            webob_post.add(
+                field_name,
+                _UploadedFileField(field_name, uploaded_file),
+                )
+    return webob_post
+
+
+def _convert_webob_post(webob_post, encoding):
+    """Return the Django equivalent of WebOb's ``POST``."""
+    post = QueryDict("", mutable=True, encoding=encoding)
+    files = MultiValueDict()
+    for (field_name, value) in webob_post.items():
+        if PY2:
+            field_name = field_name.decode("utf-8")
+        if isinstance(value, cgi_FieldStorage):
+            files.appendlist(field_name, _make_uploaded_file(value))
+        else:
+            post.appendlist(field_name, value)
+    post._mutable = False
+    return (post, files)
+
+
+def _get_native_field_name(field_name):
+    # WebOb (or rather, the cgi module) uses native strings for field names:
+    if PY2:
+        field_name = field_name.encode("utf-8")
+    return field_name
+
+
+def _make_uploaded_file(field):
+    field.file.seek(0, 2)
+    size = field.file.tell()
+    field.file.seek(0)
+
+    uploaded_file = UploadedFile(
+        field.file,
+        field.filename,
+        field.type,
+        size,
+        field.type_options.get('charset'),
+        )
+    return uploaded_file
+
+
+class _UploadedFileField(cgi_FieldStorage):
+    """
+    Field for a file uploaded in a form parsed by Django, like those in the
+    forms parsed by WebOb.
+
+    The file is shared with Django.
+
+    """
+
+    def __init__(self, name, uploaded_file):
+        # Not calling the constructor, which would parse a request
+        self.name = name
+        self.filename = uploaded_file.name
+        self.file = uploaded_file.file
+        self.list = None
+        self.type = uploaded_file.content_type or "application/octet-stream"
+        self.type_options = {}
+        if uploaded_file.charset:
+            self.type_options['charset'] = uploaded_file.charset
+        self.disposition = "form-data"
+        self.disposition_options = {'name': name, 'filename': self.filename}
+        self.headers = {'content-type': self.type}
+
+    def __del__(self):
+        # The file is closed by Django, along with the request
+        pass
+
+
+class _LazilyBufferedInput(object):
+    """
+    Seekable replacement for ``wsgi.input`` which buffers the original input
+    the first time it is used.
+    
+    WebOb is told that the input is seekable, so that it does not copy it
+    again. Once the input has been buffered, it also replaces this object in
+    the WSGI environment.
+    
+    """
+
+    def __init__(self, environ, request):
+        super(_LazilyBufferedInput, self).__init__()
+        self._environ = environ
+        self._original_input = environ['wsgi.input']
+        self._buffered_input = None
+        self._is_original_input_detached = False
+        # Avoiding a reference cycle, as the request references the environ:
+        self._request_ref = weakref.ref(request)
+
+    @classmethod
+    def install(cls, environ, request):
+        if environ.get('webob.is_body_seekable'):
+            return
+
+        environ['wsgi.input'] = cls(environ, request)
+        environ['webob.is_body_seekable'] = True
 
     def read(self, *args, **kwargs):
-        # Make environ['wsgi.input'] readable by Django, if WebOb read it
-        self._stream.stream.seek(0)
+        return self._get_buffered_input().read(*args, **kwargs)
+
+    def readline(self, *args, **kwargs):
+        return self._get_buffered_input().readline(*args, **kwargs)
+
+    def readlines(self, *args, **kwargs):
+        return self._get_buffered_input().readlines(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._get_buffered_input())
+
+    def seek(self, *args, **kwargs):
+        return self._get_buffered_input().seek(*args, **kwargs)
+
+    def tell(self):
+        return self._get_buffered_input().tell()
+
+    def detach_original_input(self):
+        """
+        Return the original input so that it can be read directly, unless it
+        has already been buffered.
+
+        The input can no longer be buffered afterwards.
+
+        :return: The original input or ``None``.
+
+        """
+        if self._buffered_input is not None or \
+                self._is_original_input_detached:
+            return None
+
+        self._is_original_input_detached = True
+        return self._original_input
+
+    def buffer(self):
+        """Buffer the original input, if it hasn't been buffered yet."""
+        self._get_buffered_input()
+
+    def _get_buffered_input(self):
+        if self._buffered_input is None:
+            self._buffered_input = self._buffer_input()
+        return self._buffered_input
+
+    def _buffer_input(self):
+        if self._is_original_input_detached:
+            raise IOError(
+                "The request body was passed on to an embedded WSGI "
+                "application without being buffered",
+                )
+
+        environ = self._environ
+        # The original input must be buffered in an environment which still
+        # says that it is not seekable:
+        buffering_environ = dict(environ)
+        buffering_environ['wsgi.input'] = self._original_input
+        del buffering_environ['webob.is_body_seekable']
+        _make_body_seekable(buffering_environ, self._request_ref())
+
+        buffered_input = buffering_environ['wsgi.input']
+        if environ.get('wsgi.input') is self:
+            environ['wsgi.input'] = buffered_input
+            if 'CONTENT_LENGTH' in buffering_environ:
+                environ['CONTENT_LENGTH'] = buffering_environ['CONTENT_LENGTH']
+            else:
+                environ.pop('CONTENT_LENGTH', None)
+        return buffered_input
+
+
+def _make_body_seekable(environ, request):
+    """
+    Buffer the body of the request in ``environ`` according to the settings
+    ``WSGI_REQUEST_BODY_MAX_SIZE`` and ``WSGI_REQUEST_BODY_MEMORY_LIMIT``.
+    
+    Like :meth:`webob.Request.make_body_seekable`, ``wsgi.input`` and
+    ``CONTENT_LENGTH`` are replaced with the buffered body and its length, so
+    WebOb won't copy the body again.
+    
+    :param request: The Django request whose body is buffered, if it still
+        exists.
+    :raises django_wsgi.exc.RequestBodyTooLargeError: If the body is larger
+        than ``WSGI_REQUEST_BODY_MAX_SIZE``, in which case it is not read (or
+        not read any further if its length is unknown).
+    
+    """
+    content_length = _get_content_length(environ)
+    _check_request_body_size(content_length)
+
+    if environ.get('webob.is_body_seekable'):
+        environ['wsgi.input'].seek(0)
+        return
+
+    request_class = DjangoWSGIRequest if request is None else request.__class__
+    timer = _PhaseTimer.start(request_class, request)
+
+    if _is_body_readable(environ, content_length):
+        memory_limit = getattr(
+            settings,
+            'WSGI_REQUEST_BODY_MEMORY_LIMIT',
+            WebobRequest.request_body_tempfile_limit,
+            )
+        (body_file, body_size) = _copy_body(
+            environ['wsgi.input'],
+            content_length,
+            memory_limit,
+            )
+        environ['wsgi.input'] = body_file
+        environ['CONTENT_LENGTH'] = str(body_size)
+        environ['webob.is_body_seekable'] = True
+    else:
+        environ['wsgi.input'] = BytesIO()
+        environ.pop('CONTENT_LENGTH', None)
+
+    if timer is not None:
+        timer.end_phase('body_buffering')
+
+
+def _is_body_readable(environ, content_length):
+    if content_length is not None:
+        return True
+
+    # Unlike webob.Request.is_body_readable, bodies of unknown length are only
+    # read with WSGI_CHUNKED_REQUEST_BODY and if the server terminates them:
+    if not _is_body_length_unknown(environ):
+        return False
+    method = environ.get('REQUEST_METHOD', "GET")
+    return http_method_probably_has_body.get(method) or \
+        environ.get('webob.is_body_readable', False)
+
+
+_BODY_CHUNK_SIZE = 64 * 1024
+
 
+def _copy_body(original_input, body_length, memory_limit):
+    """
+    Copy the body in ``original_input`` to a seekable file, chunk by chunk.
+    
+    :param body_length: The length of the body, or ``None`` to read it up to
+        the end of ``original_input``.
+    :param memory_limit: The size beyond which the body is copied to a
+        temporary file instead of memory; if it's ``0``, it's always copied to
+        memory.
+    :return: The file, at its start, and the size of the body.
+    :raises django_wsgi.exc.RequestBodyTooLargeError: As soon as the body
+        exceeds ``WSGI_REQUEST_BODY_MAX_SIZE``.
+    :raises webob.request.DisconnectionError: If the body is shorter than
+        ``body_length``.
+    
+    """
+    if body_length is not None and \
+            (not memory_limit or body_length <= memory_limit):
+        body_file = BytesIO()
+    else:
+        body_file = SpooledTemporaryFile(max_size=memory_limit)
+    try:
+        body_size = 0
+        while body_length is None or body_size < body_length:
+            chunk_size = _BODY_CHUNK_SIZE
+            if body_length is not None:
+                chunk_size = min(chunk_size, body_length - body_size)
+            chunk = original_input.read(chunk_size)
+            if not chunk:
+                break
+            body_size += len(chunk)
+            _check_request_body_size(body_size)
+            body_file.write(chunk)
+
+        if body_length is not None and body_size < body_length:
+            raise DisconnectionError(
+                "Client disconnected (%s more bytes were expected)"
+                % (body_length - body_size)
+                )
+    except Exception:
+        body_file.close()
+        raise
+    body_file.seek(0)
+    return (body_file, body_size)
+
+
+def _is_body_length_unknown(environ):
+    return 'CONTENT_LENGTH' not in environ and \
+        environ.get('wsgi.input_terminated', False) and \
+        getattr(settings, 'WSGI_CHUNKED_REQUEST_BODY', False)
+
+
+def _check_request_body_size(body_size):
+    max_body_size = getattr(settings, 'WSGI_REQUEST_BODY_MAX_SIZE', None)
+    if None not in (body_size, max_body_size) and max_body_size < body_size:
+        raise RequestBodyTooLargeError(
+            "Request body of %s bytes exceeds the maximum of %s bytes"
+            % (body_size, max_body_size)
+            )
+
+
+def _get_content_length(environ):
+    try:
+        content_length = int(environ.get('CONTENT_LENGTH'))
+    except (TypeError, ValueError):
+        content_length = None
+    return content_length
+
+
+class _SeekableInputView(object):
+    """
+    Read-only view over a seekable input stream, with its own position.
+    
+    This allows different consumers to share the same buffered body without
+    copying it, or getting in each other's way: The position of the
+    underlying stream is restored after each read.
+    
+    """
+
+    def __init__(self, stream, length=None):
+        super(_SeekableInputView, self).__init__()
+        self._stream = stream
+        self._length = length
+        self._position = 0
+
+    def read(self, size=-1):
+        return self._read_at_position(self._stream.read, size)
+
+    def readline(self, size=-1):
+        return self._read_at_position(self._stream.readline, size)
+
+    def readlines(self, hint=-1):
+        lines = []
+        total_size = 0
+        for line in self:
+            lines.append(line)
+            total_size += len(line)
+            if 0 < hint <= total_size:
+                break
+        return lines
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            yield line
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._position
+        elif whence == 2:
+            if self._length is None:
+                self._stream.seek(0, 2)
+                end_position = self._stream.tell()
+            else:
+                end_position = self._length
+            offset += end_position
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        # The underlying stream is not ours to close
+        pass
+
+    def _read_at_position(self, read, size):
+        size = self._get_readable_size(size)
+        if size == 0:
+            return b""
+
+        stream_position = self._stream.tell()
+        self._stream.seek(self._position)
         try:
-            return super(DjangoWSGIRequest, self).read()
+            data = read() if size is None else read(size)
         finally:
-            # Make environ['wsgi.input'] readable by WebOb
-            self._stream.stream.seek(0)
+            self._stream.seek(stream_position)
+        self._position += len(data)
+        return data
+
+    def _get_readable_size(self, size):
+        if size is not None and size < 0:
+            size = None
+
+        if self._length is not None:
+            remaining_size = max(self._length - self._position, 0)
+            if size is None or remaining_size < size:
+                size = remaining_size
+        return size
+
+
+class _SizeLimitedInput(object):
+    """
+    Input stream of unknown length, which is rejected as soon as more than
+    ``WSGI_REQUEST_BODY_MAX_SIZE`` bytes have been read from it.
+
+    """
+
+    def __init__(self, stream):
+        super(_SizeLimitedInput, self).__init__()
+        self._stream = stream
+        self._size = 0
+
+    def read(self, size=-1):
+        return self._count(self._stream.read(size))
+
+    def readline(self, size=-1):
+        return self._count(self._stream.readline(size))
+
+    def readlines(self, hint=-1):
+        lines = []
+        total_size = 0
+        for line in self:
+            lines.append(line)
+            total_size += len(line)
+            if 0 < hint <= total_size:
+                break
+        return lines
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            yield line
+
+    def close(self):
+        # The underlying stream is not ours to close
+        pass
+
+    def _count(self, data):
+        self._size += len(data)
+        _check_request_body_size(self._size)
+        return data
+
+
+class Mount(object):
+    """
+    WSGI application mounted on a path prefix in :class:`DjangoApplication`.
+
+    :param wsgi_app: The WSGI application.
+    :param propagate_auth: Whether the requests to ``wsgi_app`` should go
+        through Django, so that the user authenticated in Django is passed on
+        to it in ``REMOTE_USER``. Otherwise, Django is bypassed altogether.
+    :type propagate_auth: :class:`bool`
+
+    """
+
+    def __init__(self, wsgi_app, propagate_auth=False):
+        super(Mount, self).__init__()
+        self.wsgi_app = wsgi_app
+        self.propagate_auth = propagate_auth
+
+
+class _MountURLConf(object):
+    """
+    URLconf which routes the requests under ``prefix`` to ``wsgi_app``, and
+    includes ``ROOT_URLCONF`` so that URLs can still be reversed.
+
+    """
+
+    def __init__(self, prefix, wsgi_app):
+        super(_MountURLConf, self).__init__()
+
+        # Imported here to avoid circular imports, and because Django < 1.8
+        # reads the settings when the URL resolvers are imported:
+        from django.conf.urls import include
+        from django.conf.urls import url
+        from django_wsgi.embedded_wsgi import make_wsgi_view
+
+        wsgi_view = make_wsgi_view(wsgi_app)
+        if prefix:
+            mount_regex = \
+                r"^%s(?P<path_info>(?:/.*)?)$" % re.escape(prefix.lstrip("/"))
+            mount_view = wsgi_view
+        else:
+            # The resolver has already consumed the leading slash of the path,
+            # which belongs to the application on a root mount:
+            mount_regex = r"^(?P<path_info>.*)$"
+
+            def mount_view(request, path_info):
+                return wsgi_view(request, "/" + path_info)
+
+        self.urlpatterns = [
+            url(mount_regex, mount_view),
+            url(r"", include(settings.ROOT_URLCONF)),
+            ]
+
+
+class _ResponseFile(object):
+    """
+    File sent by a Django response, whose closing closes the response (and
+    with it the file).
+
+    Servers only close what their ``wsgi.file_wrapper`` returns, so this
+    keeps the objects closed along with the response (e.g., the signal
+    ``request_finished``) from being skipped.
+
+    """
+
+    def __init__(self, filelike, response):
+        super(_ResponseFile, self).__init__()
+        self._filelike = filelike
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._filelike, name)
+
+    def read(self, *args, **kwargs):
+        return self._filelike.read(*args, **kwargs)
+
+    def close(self):
+        self._response.close()
 
 
 class DjangoApplication(DjangoWSGIHandler):
     """
     Django request handler which uses our enhanced WSGI request class.
+
+    :param mounts: The WSGI applications to which the requests under some
+        path prefixes are routed before they reach Django, as a mapping from
+        the prefixes (e.g., ``"/static"``) to the applications or
+        :class:`Mount` instances. Requests are routed to the application with
+        the longest prefix which matches whole segments of their
+        ``PATH_INFO``, with the prefix moved to ``SCRIPT_NAME``.
     
     """
 
     request_class = DjangoWSGIRequest
 
+    def __init__(self, mounts=None):
+        super(DjangoApplication, self).__init__()
+
+        self.mounts = {}
+        self._mount_urlconfs = {}
+        for (prefix, mount) in (mounts or {}).items():
+            if not isinstance(mount, Mount):
+                mount = Mount(mount)
+            self.mounts[prefix.rstrip("/")] = mount
+
+    def __call__(self, environ, start_response):
+        # Rejecting requests whose body is too large before anything reads it:
+        try:
+            _check_request_body_size(_get_content_length(environ))
+        except RequestBodyTooLargeError:
+            error_app = HTTPRequestEntityTooLarge()
+            return error_app(environ, start_response)
+
+        (prefix, mount) = self._get_mount(environ.get('PATH_INFO', ""))
+        if mount is not None and not mount.propagate_auth:
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', "") + prefix
+            environ['PATH_INFO'] = environ['PATH_INFO'][len(prefix):]
+            return mount.wsgi_app(environ, start_response)
+
+        try:
+            response = super(DjangoApplication, self).__call__(
+                environ,
+                start_response,
+                )
+        except RequestBodyTooLargeError:
+            # A body of unknown length was buffered with the request
+            error_app = HTTPRequestEntityTooLarge()
+            return error_app(environ, start_response)
+
+        # Django < 1.8 doesn't pass files on to the server, so that it can
+        # send them efficiently:
+        file_to_stream = getattr(response, 'file_to_stream', None)
+        if file_to_stream is not None and environ.get('wsgi.file_wrapper'):
+            response = environ['wsgi.file_wrapper'](file_to_stream)
+        return response
+
+    def handle_uncaught_exception(self, request, resolver, exc_info):
+        # Bodies of unknown length may be found to be too large when they are
+        # read by a view:
+        if isinstance(exc_info[1], RequestBodyTooLargeError):
+            return HttpResponse(status=413)
+        return super(DjangoApplication, self).handle_uncaught_exception(
+            request,
+            resolver,
+            exc_info,
+            )
+
+    def get_response(self, request):
+        (prefix, mount) = self._get_mount(request.environ.get('PATH_INFO', ""))
+        if mount is not None:
+            # Skipping the URL resolution in ROOT_URLCONF:
+            urlconf = self._mount_urlconfs.get(prefix)
+            if urlconf is None:
+                urlconf = _MountURLConf(prefix, mount.wsgi_app)
+                self._mount_urlconfs[prefix] = urlconf
+            request.urlconf = urlconf
+        response = super(DjangoApplication, self).get_response(request)
+
+        # Django >= 1.8 passes this file on to the server before we get the
+        # response back, so it must be wrapped here:
+        file_to_stream = getattr(response, 'file_to_stream', None)
+        if file_to_stream is not None:
+            response.file_to_stream = _ResponseFile(file_to_stream, response)
+        return response
+
+    def _get_mount(self, path_info):
+        """
+        Return the prefix and the mount with the longest prefix matching
+        ``path_info``, or ``(None, None)`` if there's none.
+
+        """
+        if not self.mounts:
+            return (None, None)
+
+        prefix = path_info.rstrip("/")
+        while True:
+            mount = self.mounts.get(prefix)
+            if mount is not None:
+                return (prefix, mount)
+            if not prefix:
+                return (None, None)
+            prefix = prefix.rsplit("/", 1)[0]
+
 
 APPLICATION = DjangoApplication()
 """WSGI application based on :class:`DjangoApplication`."""
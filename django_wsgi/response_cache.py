@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Caching and sharing of the responses from embedded WSGI applications.
+
+"""
+from collections import OrderedDict
+from hashlib import md5
+from threading import Event
+from threading import Lock
+from timeit import default_timer
+
+from django.http import HttpResponse
+from six import text_type
+
+
+__all__ = (
+    "ResponseCache",
+    "LRUCacheBackend",
+    "DjangoCacheBackend",
+    "SingleFlight",
+    )
+
+
+_CACHEABLE_REQUEST_METHODS = frozenset(("GET", "HEAD"))
+
+_UNCACHEABLE_RESPONSE_DIRECTIVES = frozenset(
+    ("no-cache", "no-store", "private"),
+    )
+
+
+class ResponseCache(object):
+    """
+    Cache for the responses to ``GET`` and ``HEAD`` requests from an embedded
+    WSGI application.
+
+    Responses are cached by ``SCRIPT_NAME``, ``PATH_INFO``, query string and
+    the request headers listed in their ``Vary`` header. They are kept for as
+    long as their ``Cache-Control`` header allows (``s-maxage`` or
+    ``max-age``), or ``default_ttl`` seconds if it doesn't say and
+    ``default_ttl`` is set.
+
+    The following are never cached: Requests from authenticated users,
+    streamed responses, responses other than "200 OK", responses which set
+    cookies and responses whose ``Cache-Control`` header contains
+    ``no-cache``, ``no-store`` or ``private``. Requests with an
+    ``Authorization`` header only get and store responses whose
+    ``Cache-Control`` header contains ``public`` or ``s-maxage`` (RFC 7234,
+    Section 3.2).
+
+    :param backend: Where the responses are stored, like a
+        :class:`LRUCacheBackend` or a :class:`DjangoCacheBackend`.
+    :param default_ttl: The number of seconds for which responses are cached
+        when their ``Cache-Control`` header doesn't set it, or ``None`` to
+        not cache them.
+    :type default_ttl: :class:`int`
+
+    """
+
+    def __init__(self, backend, default_ttl=None):
+        super(ResponseCache, self).__init__()
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    def get_response(self, request, path_info):
+        """
+        Return the cached response to ``request``, or ``None`` if there's
+        none.
+
+        """
+        if not _is_request_cacheable(request):
+            return None
+
+        resource_key = _get_resource_key(request, path_info)
+        vary_header_names = self.backend.get(resource_key)
+        if vary_header_names is None:
+            return None
+
+        response_key = _get_response_key(
+            resource_key,
+            request,
+            vary_header_names,
+            )
+        cached_response = self.backend.get(response_key)
+        if cached_response is None:
+            return None
+
+        django_response = _thaw_response(cached_response)
+        if _has_authorization(request) and \
+                not _is_response_cacheable_with_authorization(django_response):
+            return None
+        return django_response
+
+    def store_response(self, request, path_info, django_response):
+        """Cache ``django_response`` to ``request``, if possible."""
+        if not _is_request_cacheable(request):
+            return
+
+        if _has_authorization(request) and \
+                not _is_response_cacheable_with_authorization(django_response):
+            return
+
+        ttl = self._get_response_ttl(django_response)
+        if ttl is None or ttl <= 0:
+            return
+
+        vary_header_names = _get_vary_header_names(django_response)
+        if vary_header_names is None:
+            return
+
+        resource_key = _get_resource_key(request, path_info)
+        response_key = _get_response_key(
+            resource_key,
+            request,
+            vary_header_names,
+            )
+        cached_response = _freeze_response(django_response)
+        self.backend.set(response_key, cached_response, ttl)
+        self.backend.set(resource_key, vary_header_names, ttl)
+
+    def _get_response_ttl(self, django_response):
+        if django_response.status_code != 200:
+            return None
+
+        if not _is_response_shareable(django_response):
+            return None
+
+        cache_directives = _parse_cache_control(
+            django_response.get('Cache-Control', ""),
+            )
+        if _UNCACHEABLE_RESPONSE_DIRECTIVES.intersection(cache_directives):
+            return None
+
+        max_age = cache_directives.get('s-maxage') or \
+            cache_directives.get('max-age')
+        if max_age is None:
+            ttl = self.default_ttl
+        else:
+            try:
+                ttl = int(max_age)
+            except ValueError:
+                ttl = None
+        return ttl
+
+
+class LRUCacheBackend(object):
+    """
+    Cache backend which keeps the most recently used responses in memory.
+
+    :param max_entries: The maximum number of entries kept, beyond which the
+        least recently used ones are evicted.
+    :type max_entries: :class:`int`
+    :param max_ttl: The maximum number of seconds for which entries are kept,
+        regardless of the time-to-live requested for them.
+    :type max_ttl: :class:`int`
+
+    """
+
+    def __init__(self, max_entries=1000, max_ttl=None):
+        super(LRUCacheBackend, self).__init__()
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """Return the value for ``key``, or ``None`` if there's none."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+
+            (expiry_time, value) = entry
+            if expiry_time <= default_timer():
+                return None
+
+            # Marking it as the most recently used:
+            self._entries[key] = entry
+        return value
+
+    def set(self, key, value, ttl):
+        """Store ``value`` for ``key`` for ``ttl`` seconds."""
+        if self.max_ttl is not None:
+            ttl = min(ttl, self.max_ttl)
+        expiry_time = default_timer() + ttl
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expiry_time, value)
+            while self.max_entries < len(self._entries):
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend(object):
+    """
+    Cache backend which stores the responses in a cache from Django's cache
+    framework.
+
+    :param cache_alias: The name of the cache in the ``CACHES`` setting.
+    :type cache_alias: :class:`str`
+
+    """
+
+    def __init__(self, cache_alias="default"):
+        super(DjangoCacheBackend, self).__init__()
+        self.cache_alias = cache_alias
+
+    def get(self, key):
+        """Return the value for ``key``, or ``None`` if there's none."""
+        return self._get_cache().get(key)
+
+    def set(self, key, value, ttl):
+        """Store ``value`` for ``key`` for ``ttl`` seconds."""
+        self._get_cache().set(key, value, ttl)
+
+    def _get_cache(self):
+        # Imported here because Django < 1.8 reads the settings when it's
+        # imported:
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+
+class SingleFlight(object):
+    """
+    Coalescer of identical, concurrent requests to an embedded WSGI
+    application.
+
+    While the application is handling a ``GET`` or ``HEAD`` request from an
+    anonymous user, identical requests wait for its response instead of
+    calling the application themselves. Requests are identical if they have
+    the same method, ``SCRIPT_NAME``, ``PATH_INFO``, query string and values
+    for the ``vary_headers``.
+
+    Responses which are streamed or set cookies are not shared, so the
+    requests waiting for them call the application after all.
+
+    :param vary_headers: The names of the request headers which may change
+        the response.
+
+    .. attribute:: coalesced_request_count
+
+        The number of requests which have waited for the response to an
+        identical request.
+
+    """
+
+    def __init__(
+        self,
+        vary_headers=(
+            "Accept",
+            "Accept-Encoding",
+            "Accept-Language",
+            "Authorization",
+            "Cookie",
+            ),
+        ):
+        super(SingleFlight, self).__init__()
+        self.vary_headers = vary_headers
+        self.coalesced_request_count = 0
+        self._flights = {}
+        self._lock = Lock()
+
+    def get_response(self, request, path_info, get_response):
+        """
+        Return the response to ``request``, from the identical request in
+        flight if there's one or from ``get_response()`` otherwise.
+
+        """
+        if not _is_request_cacheable(request):
+            return get_response()
+
+        flight_key = _get_response_key(
+            _get_resource_key(request, path_info),
+            request,
+            self.vary_headers,
+            )
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            is_flight_leader = flight is None
+            if is_flight_leader:
+                flight = _Flight()
+                self._flights[flight_key] = flight
+            else:
+                self.coalesced_request_count += 1
+
+        if is_flight_leader:
+            try:
+                django_response = get_response()
+                if _is_response_shareable(django_response):
+                    flight.response = _freeze_response(django_response)
+            finally:
+                with self._lock:
+                    del self._flights[flight_key]
+                flight.landing_event.set()
+            return django_response
+
+        flight.landing_event.wait()
+        if flight.response is None:
+            django_response = get_response()
+        else:
+            django_response = _thaw_response(flight.response)
+        return django_response
+
+
+class _Flight(object):
+
+    def __init__(self):
+        super(_Flight, self).__init__()
+        self.landing_event = Event()
+        self.response = None
+
+
+_REQUEST_SPECIFIC_STATUS_CODES = frozenset((206, 304, 416))
+
+
+def _is_response_shareable(django_response):
+    # Some responses depend on the conditional or range headers in the
+    # request:
+    return not django_response.streaming and \
+        not django_response.cookies and \
+        django_response.status_code not in _REQUEST_SPECIFIC_STATUS_CODES
+
+
+def _freeze_response(django_response):
+    headers = dict(django_response._headers)
+    # The timings only apply to the call which produced the response:
+    headers.pop('server-timing', None)
+    return (django_response.status_code, headers, django_response.content)
+
+
+def _thaw_response(frozen_response):
+    (status_code, headers, content) = frozen_response
+    django_response = HttpResponse(content, status=status_code)
+    django_response._headers = dict(headers)
+    return django_response
+
+
+def _is_request_cacheable(request):
+    return request.method in _CACHEABLE_REQUEST_METHODS and \
+        not request.user.is_authenticated()
+
+
+def _has_authorization(request):
+    return 'HTTP_AUTHORIZATION' in request.environ
+
+
+def _is_response_cacheable_with_authorization(django_response):
+    # RFC 7234, Section 3.2:
+    cache_directives = _parse_cache_control(
+        django_response.get('Cache-Control', ""),
+        )
+    return 'public' in cache_directives or 's-maxage' in cache_directives
+
+
+def _get_resource_key(request, path_info):
+    environ = request.environ
+    resource_hash = _hash_strings((
+        request.method,
+        environ.get('SCRIPT_NAME', ""),
+        environ.get('PATH_INFO', ""),
+        path_info,
+        environ.get('QUERY_STRING', ""),
+        ))
+    return "django_wsgi.response_cache." + resource_hash
+
+
+def _get_response_key(resource_key, request, vary_header_names):
+    environ = request.environ
+    vary_header_values = []
+    for header_name in vary_header_names:
+        environ_key = "HTTP_" + header_name.upper().replace("-", "_")
+        vary_header_values.append(environ.get(environ_key, ""))
+    return resource_key + "." + _hash_strings(vary_header_values)
+
+
+def _get_vary_header_names(django_response):
+    """
+    Return the names of the headers listed in the ``Vary`` header of
+    ``django_response``, or ``None`` if it varies on anything (``*``).
+
+    """
+    vary_header_names = []
+    for header_name in django_response.get('Vary', "").split(","):
+        header_name = header_name.strip().lower()
+        if header_name == "*":
+            return None
+        if header_name and header_name not in vary_header_names:
+            vary_header_names.append(header_name)
+    return sorted(vary_header_names)
+
+
+def _parse_cache_control(cache_control):
+    cache_directives = {}
+    for directive in cache_control.split(","):
+        (name, _, value) = directive.partition("=")
+        name = name.strip().lower()
+        if name:
+            cache_directives[name] = value.strip().strip('"') or None
+    return cache_directives
+
+
+def _hash_strings(strings):
+    strings_hash = md5()
+    for string in strings:
+        if isinstance(string, text_type):
+            string = string.encode("utf-8")
+        strings_hash.update(string)
+        strings_hash.update(b"\n")
+    return strings_hash.hexdigest()
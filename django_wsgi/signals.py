@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Signals sent by :mod:`django_wsgi`.
+
+"""
+from timeit import default_timer
+
+from django.dispatch import Signal
+
+
+__all__ = ("phase_timed", )
+
+
+phase_timed = Signal(providing_args=["phase", "duration", "request"])
+"""
+Signal sent with the time taken by each phase in the processing of a request.
+
+The sender is the class of the request for the phases ``request_construction``
+and ``body_buffering``, and the embedded WSGI application for the phases
+``request_clone``, ``application_call``, ``body_collection`` and
+``response_conversion``. The arguments are:
+
+- ``phase``: The name of the phase.
+- ``duration``: The time taken, in seconds, as a :class:`float`.
+- ``request``: The :class:`~django_wsgi.handler.DjangoWSGIRequest` being
+  processed.
+
+The phase ``body_buffering`` happens during ``request_construction``, unless
+the body of the request is buffered lazily. The phase ``body_collection``
+happens after ``response_conversion`` when the response is streamed.
+
+Phases are only timed when there are receivers for this signal.
+
+"""
+
+
+class _PhaseTimer(object):
+    """
+    Timer for consecutive phases in the processing of a request.
+
+    .. attribute:: durations
+
+        The durations of the phases ended so far, by phase name.
+
+    """
+
+    def __init__(self, sender, request, is_signal_sent):
+        super(_PhaseTimer, self).__init__()
+        self._sender = sender
+        self._request = request
+        self._is_signal_sent = is_signal_sent
+        self.durations = {}
+        self._phase_start_time = default_timer()
+
+    @classmethod
+    def start(cls, sender, request, is_forced=False):
+        """
+        Return a timer for the phases starting now, or ``None`` if nobody is
+        interested in them (unless ``is_forced``).
+
+        """
+        is_signal_sent = bool(phase_timed.receivers)
+        if is_signal_sent or is_forced:
+            timer = cls(sender, request, is_signal_sent)
+        else:
+            timer = None
+        return timer
+
+    def end_phase(self, phase, duration=None):
+        """
+        Report the ``phase`` which has just ended, and start the next one.
+
+        """
+        if duration is None:
+            duration = default_timer() - self._phase_start_time
+        self.durations[phase] = duration
+        if self._is_signal_sent:
+            phase_timed.send(
+                self._sender,
+                phase=phase,
+                duration=duration,
+                request=self._request,
+                )
+        self._phase_start_time = default_timer()
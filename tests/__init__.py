@@ -18,10 +18,12 @@ Test suite for :mod:`django_wsgi`.
 
 """
 import os
+import sys
 
-from six import StringIO
 from django import conf
 from django.conf import LazySettings
+from nose import SkipTest
+from six import StringIO
 
 
 _DJANGO_SETTINGS_MODULE = "tests.dummy_django_project.settings"
@@ -42,6 +44,21 @@ class BaseDjangoTestCase(object):
         conf.settings = LazySettings()
 
 
+class BaseAsyncioTestCase(BaseDjangoTestCase):
+    """Base test case for the modules which require Python 3.5+."""
+
+    def setup(self):
+        if sys.version_info < (3, 5):
+            raise SkipTest("Python 3.5+ is required")
+        super(BaseAsyncioTestCase, self).setup()
+
+
+def run_coroutine(coroutine):
+    """Run ``coroutine`` until it completes and return its result."""
+    import asyncio
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
 #{ Mock WSGI apps
 
 
@@ -111,9 +128,28 @@ class ClosingAppIter(list):
     def __init__(self, *args, **kwargs):
         super(ClosingAppIter, self).__init__(*args, **kwargs)
         self.closed = False
+        self.close_count = 0
 
     def close(self):
         self.closed = True
+        self.close_count += 1
+
+
+class PhaseTimingRecorder(object):
+    """
+    Receiver for :data:`django_wsgi.signals.phase_timed` which keeps the
+    phases reported.
+    
+    """
+
+    def __init__(self):
+        self.phases = []
+
+    def __call__(self, sender, phase, duration, request, **kwargs):
+        self.phases.append((sender, phase, duration, request))
+
+    def get_phase_names(self):
+        return [phase for (_, phase, _, _) in self.phases]
 
 
 def complete_environ(**environ):
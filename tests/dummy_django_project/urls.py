@@ -4,5 +4,5 @@ from django.http import HttpResponse
 
 urlpatterns = patterns(
     '',
-    ('^$', lambda request: HttpResponse()),
+    ('^$', lambda request: HttpResponse(), {}, 'home'),
     )
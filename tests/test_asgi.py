@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Tests for the ASGI application.
+
+"""
+import sys
+
+from django.http import HttpResponse
+from django.test.utils import override_settings
+from nose.tools import eq_, ok_, assert_is_instance, assert_raises
+
+from tests import BaseAsyncioTestCase, ClosingAppIter, run_coroutine
+from django_wsgi.handler import DjangoApplication
+
+if (3, 5) <= sys.version_info:
+    import asyncio
+
+    from django_wsgi.asgi import ASGI_APPLICATION
+    from django_wsgi.asgi import DjangoASGIApplication
+
+
+class TestHTTPRequests(BaseAsyncioTestCase):
+
+    def test_get_request(self):
+        handler = _TelltaleHandler()
+        messages = _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(path="/"),
+            [{'type': 'http.request', 'body': b""}],
+            )
+
+        eq_(200, messages[0]['status'])
+        eq_("GET", handler.request.method)
+        eq_("/", handler.request.path_info)
+        eq_(b"", _get_response_body(messages))
+
+    def test_script_name(self):
+        handler = _TelltaleHandler()
+        _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(path="/prefix/", root_path="/prefix"),
+            [{'type': 'http.request', 'body': b""}],
+            )
+
+        eq_("/prefix", handler.request.environ['SCRIPT_NAME'])
+        eq_("/", handler.request.environ['PATH_INFO'])
+
+    def test_headers(self):
+        handler = _TelltaleHandler()
+        _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(
+                headers=[
+                    (b"content-type", b"text/plain"),
+                    (b"x-foo", b"bar"),
+                    (b"x-foo", b"baz"),
+                    ],
+                ),
+            [{'type': 'http.request', 'body': b""}],
+            )
+
+        environ = handler.request.environ
+        eq_("text/plain", environ['CONTENT_TYPE'])
+        eq_("bar,baz", environ['HTTP_X_FOO'])
+        ok_(environ['wsgi.input_terminated'])
+
+    def test_repeated_cookie_headers(self):
+        handler = _TelltaleHandler()
+        _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(headers=[(b"cookie", b"a=1"), (b"cookie", b"b=2")]),
+            [{'type': 'http.request', 'body': b""}],
+            )
+
+        eq_("a=1; b=2", handler.request.environ['HTTP_COOKIE'])
+        eq_({'a': "1", 'b': "2"}, handler.request.COOKIES)
+
+    def test_body_in_chunks(self):
+        """The body is buffered and shared by Django and WebOb."""
+        handler = _BodyReadingHandler()
+        _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(
+                method="POST",
+                headers=[(b"content-type", b"application/octet-stream")],
+                ),
+            [
+                {'type': 'http.request', 'body': b"ab", 'more_body': True},
+                {'type': 'http.request', 'body': b"cd"},
+                ],
+            )
+
+        eq_(b"abcd", handler.webob_body)
+        eq_(b"abcd", handler.django_body)
+        eq_("4", handler.request.environ['CONTENT_LENGTH'])
+
+    @override_settings(WSGI_REQUEST_BODY_MAX_SIZE=3)
+    def test_content_length_too_large(self):
+        handler = _TelltaleHandler()
+        messages = _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(method="POST", headers=[(b"content-length", b"4")]),
+            [],
+            )
+
+        eq_(413, messages[0]['status'])
+        ok_(not hasattr(handler, 'request'))
+
+    @override_settings(WSGI_REQUEST_BODY_MAX_SIZE=3)
+    def test_streamed_body_too_large(self):
+        handler = _TelltaleHandler()
+        messages = _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(method="POST"),
+            [
+                {'type': 'http.request', 'body': b"ab", 'more_body': True},
+                {'type': 'http.request', 'body': b"cd", 'more_body': True},
+                ],
+            )
+
+        eq_(413, messages[0]['status'])
+        ok_(not hasattr(handler, 'request'))
+
+    def test_client_disconnection(self):
+        handler = _TelltaleHandler()
+        messages = _call_application(
+            DjangoASGIApplication(handler),
+            _make_scope(method="POST"),
+            [
+                {'type': 'http.request', 'body': b"ab", 'more_body': True},
+                {'type': 'http.disconnect'},
+                ],
+            )
+
+        eq_([], messages)
+        ok_(not hasattr(handler, 'request'))
+
+    def test_response_body_in_chunks(self):
+        app_iter = ClosingAppIter([b"foo", b"", b"bar"])
+
+        def wsgi_app(environ, start_response):
+            start_response("201 Created", [("X-Foo", "bar")])
+            return app_iter
+
+        messages = _call_application(
+            DjangoASGIApplication(wsgi_app),
+            _make_scope(),
+            [{'type': 'http.request'}],
+            )
+
+        eq_(201, messages[0]['status'])
+        eq_([(b"x-foo", b"bar")], messages[0]['headers'])
+        eq_(b"foobar", _get_response_body(messages))
+        ok_(not messages[-1].get('more_body', False))
+        eq_(1, app_iter.close_count)
+
+    def test_response_started_on_iteration(self):
+        def wsgi_app(environ, start_response):
+            start_response("200 OK", [])
+            yield b"foo"
+
+        messages = _call_application(
+            DjangoASGIApplication(wsgi_app),
+            _make_scope(),
+            [{'type': 'http.request'}],
+            )
+
+        eq_(200, messages[0]['status'])
+        eq_(b"foo", _get_response_body(messages))
+
+    def test_write_callable(self):
+        def wsgi_app(environ, start_response):
+            write = start_response("200 OK", [])
+            write(b"foo")
+            return [b"bar"]
+
+        messages = _call_application(
+            DjangoASGIApplication(wsgi_app),
+            _make_scope(),
+            [{'type': 'http.request'}],
+            )
+
+        eq_(b"foobar", _get_response_body(messages))
+
+    def test_unsupported_scope(self):
+        with assert_raises(ValueError):
+            _call_application(
+                DjangoASGIApplication(),
+                {'type': 'websocket'},
+                [],
+                )
+
+
+class TestLifespan(BaseAsyncioTestCase):
+
+    def test_startup_and_shutdown(self):
+        messages = _call_application(
+            DjangoASGIApplication(),
+            {'type': 'lifespan'},
+            [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}],
+            )
+
+        eq_(
+            [
+                {'type': 'lifespan.startup.complete'},
+                {'type': 'lifespan.shutdown.complete'},
+                ],
+            messages,
+            )
+
+
+class TestApplicationInstance(BaseAsyncioTestCase):
+
+    def test_default_wsgi_application(self):
+        assert_is_instance(ASGI_APPLICATION, DjangoASGIApplication)
+        assert_is_instance(
+            ASGI_APPLICATION.wsgi_application,
+            DjangoApplication,
+            )
+
+
+class _TelltaleHandler(DjangoApplication):
+
+    def get_response(self, request):
+        self.request = request
+        return super(_TelltaleHandler, self).get_response(request)
+
+
+class _BodyReadingHandler(DjangoApplication):
+
+    def get_response(self, request):
+        self.request = request
+        self.webob_body = request.webob.body
+        self.django_body = request.body
+        return HttpResponse()
+
+
+def _make_scope(method="GET", path="/", headers=None, **scope_items):
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b"",
+        'headers': [(b"host", b"example.org")] + (headers or []),
+        'server': ("example.org", 80),
+        }
+    scope.update(scope_items)
+    return scope
+
+
+def _call_application(application, scope, received_messages):
+    """
+    Call the ASGI ``application`` and return the messages it sent.
+
+    """
+    loop = asyncio.get_event_loop()
+    received_messages = list(received_messages)
+    sent_messages = []
+
+    def receive():
+        future = loop.create_future()
+        future.set_result(received_messages.pop(0))
+        return future
+
+    def send(message):
+        sent_messages.append(message)
+        future = loop.create_future()
+        future.set_result(None)
+        return future
+
+    run_coroutine(application(scope, receive, send))
+    return sent_messages
+
+
+def _get_response_body(messages):
+    return b"".join(message.get('body', b"") for message in messages[1:])
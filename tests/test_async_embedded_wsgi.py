@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Tests for the use of WSGI applications within asynchronous Django views.
+
+"""
+import sys
+import threading
+
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from nose.tools import eq_, ok_, assert_is_instance, assert_raises
+
+from django_wsgi.embedded_wsgi import ConcurrencyLimit
+from django_wsgi.exc import ApplicationCallError
+
+from tests import (BaseAsyncioTestCase, ClosingAppIter, MockApp,
+                   complete_environ, run_coroutine)
+from tests.test_embedded_wsgi import _make_request
+
+if (3, 5) <= sys.version_info:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from django_wsgi.async_embedded_wsgi import call_wsgi_app
+    from django_wsgi.async_embedded_wsgi import iterate_response_body
+    from django_wsgi.async_embedded_wsgi import make_wsgi_view
+
+
+class TestCallWSGIApp(BaseAsyncioTestCase):
+
+    def test_application_in_executor(self):
+        app = _MockThreadRecordingApp("200 OK", [("X-Foo", "bar")])
+        executor = ThreadPoolExecutor(1)
+
+        django_response = run_coroutine(
+            call_wsgi_app(
+                app,
+                _make_app_request(),
+                "/foo",
+                executor=executor,
+                ),
+            )
+
+        eq_(200, django_response.status_code)
+        eq_("bar", django_response['X-Foo'])
+        eq_(b"body as iterable", django_response.content)
+        eq_([_get_executor_thread(executor)] * 4, app.threads)
+
+    def test_default_executor(self):
+        app = _MockThreadRecordingApp("200 OK", [])
+
+        run_coroutine(call_wsgi_app(app, _make_app_request(), "/foo"))
+
+        ok_(threading.current_thread() not in app.threads)
+
+    def test_streaming_body_in_executor(self):
+        app = _MockThreadRecordingApp("200 OK", [])
+        executor = ThreadPoolExecutor(1)
+
+        django_response = run_coroutine(
+            call_wsgi_app(
+                app,
+                _make_app_request(),
+                "/foo",
+                executor=executor,
+                streaming=True,
+                ),
+            )
+
+        assert_is_instance(django_response, StreamingHttpResponse)
+        eq_(1, len(app.threads))
+        eq_(
+            b"body as iterable",
+            _collect_body(django_response, executor),
+            )
+        executor_thread = _get_executor_thread(executor)
+        eq_([executor_thread] * 4, app.threads)
+        eq_(executor_thread, app.app_iter.closing_thread)
+
+    def test_event_loop_in_other_thread(self):
+        app = _MockThreadRecordingApp("200 OK", [])
+        results = []
+
+        def run_event_loop():
+            loop = asyncio.new_event_loop()
+            try:
+                django_response = loop.run_until_complete(
+                    call_wsgi_app(app, _make_app_request(), "/foo"),
+                    )
+            finally:
+                loop.close()
+            results.append(django_response)
+
+        thread = threading.Thread(target=run_event_loop)
+        thread.start()
+        thread.join()
+
+        eq_(b"body as iterable", results[0].content)
+
+
+class TestResponseBodyIteration(BaseAsyncioTestCase):
+
+    def test_streamed_body(self):
+        app = _MockThreadRecordingApp("200 OK", [])
+        executor = ThreadPoolExecutor(1)
+        django_response = run_coroutine(
+            call_wsgi_app(app, _make_app_request(), "/foo", streaming=True),
+            )
+
+        body = _collect_body(django_response, executor)
+
+        eq_(b"body as iterable", body)
+        ok_(threading.current_thread() not in app.threads)
+        eq_(_get_executor_thread(executor), app.app_iter.closing_thread)
+
+    def test_body_not_streamed(self):
+        django_response = HttpResponse(b"body")
+
+        body = _collect_body(django_response)
+
+        eq_(b"body", body)
+
+    def test_closed_before_end(self):
+        app = _MockThreadRecordingApp("200 OK", [])
+        executor = ThreadPoolExecutor(1)
+        django_response = run_coroutine(
+            call_wsgi_app(app, _make_app_request(), "/foo", streaming=True),
+            )
+
+        body_iterator = iterate_response_body(django_response, executor)
+        eq_(b"body", run_coroutine(body_iterator.__anext__()))
+        run_coroutine(body_iterator.aclose())
+        run_coroutine(body_iterator.aclose())
+
+        eq_(_get_executor_thread(executor), app.app_iter.closing_thread)
+        eq_(1, app.app_iter.close_count)
+
+    def test_errors_propagated(self):
+        app = MockApp("200 OK", [])
+        with assert_raises(ApplicationCallError):
+            run_coroutine(call_wsgi_app(app, _make_app_request(), "/bar"))
+
+    def test_options(self):
+        app = MockApp("200 OK", [])
+        request = _make_app_request(HTTP_RANGE="bytes=0-1")
+
+        # Positional arguments are the same as in the synchronous API:
+        django_response = run_coroutine(
+            call_wsgi_app(
+                app,
+                request,
+                "/foo",
+                False,
+                False,
+                True,
+                ranges=True,
+                ),
+            )
+
+        eq_(206, django_response.status_code)
+        eq_(b"bo", django_response.content)
+        ok_(django_response.has_header('Server-Timing'))
+
+
+class TestWSGIView(BaseAsyncioTestCase):
+
+    def test_response(self):
+        app = MockApp("206 One step at a time", [])
+        django_view = make_wsgi_view(app)
+
+        django_response = run_coroutine(
+            django_view(_make_app_request(), "/foo"),
+            )
+
+        eq_(206, django_response.status_code)
+        eq_("/foo", app.environ['PATH_INFO'])
+
+    def test_pool_size(self):
+        app = _MockThreadRecordingApp("200 OK", [])
+        django_view = make_wsgi_view(app, max_workers=1)
+
+        for _ in range(3):
+            run_coroutine(django_view(_make_app_request(), "/foo"))
+
+        eq_(3 * 4, len(app.threads))
+        eq_(1, len(set(app.threads)))
+        ok_(threading.current_thread() not in app.threads)
+
+    def test_options(self):
+        concurrency_limit = ConcurrencyLimit(1)
+        django_view = make_wsgi_view(
+            MockApp("200 OK", []),
+            max_workers=1,
+            concurrency_limit=concurrency_limit,
+            ranges=True,
+            )
+
+        django_response = run_coroutine(
+            django_view(_make_app_request(HTTP_RANGE="bytes=0-1"), "/foo"),
+            )
+
+        eq_(206, django_response.status_code)
+        eq_(b"bo", django_response.content)
+        eq_(0, concurrency_limit.in_flight_call_count)
+
+    def test_streaming(self):
+        app = _MockThreadRecordingApp("200 OK", [])
+        django_view = make_wsgi_view(app, max_workers=1, streaming=True)
+
+        django_response = run_coroutine(
+            django_view(_make_app_request(), "/foo"),
+            )
+
+        assert_is_instance(django_response, StreamingHttpResponse)
+        eq_(
+            b"body as iterable",
+            _collect_body(django_response, django_view.executor),
+            )
+        eq_(1, len(set(app.threads)))
+        ok_(threading.current_thread() not in app.threads)
+
+
+class _MockThreadRecordingApp(MockApp):
+    """
+    Mock WSGI application which records the threads where it is called and
+    its body is iterated over.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_MockThreadRecordingApp, self).__init__(*args, **kwargs)
+        self.threads = []
+        self.app_iter = None
+
+    def __call__(self, environ, start_response):
+        self.threads.append(threading.current_thread())
+        start_response(self.status, self.headers)
+        self.app_iter = _ThreadRecordingAppIter(self.threads)
+        return self.app_iter
+
+
+class _ThreadRecordingAppIter(ClosingAppIter):
+
+    def __init__(self, threads):
+        super(_ThreadRecordingAppIter, self).__init__()
+        self._threads = threads
+        self.closing_thread = None
+
+    def __iter__(self):
+        for chunk in (b"body", b" as", b" iterable"):
+            self._threads.append(threading.current_thread())
+            yield chunk
+
+    def close(self):
+        super(_ThreadRecordingAppIter, self).close()
+        self.closing_thread = threading.current_thread()
+
+
+def _make_app_request(**environ):
+    environ = complete_environ(
+        SCRIPT_NAME="/dev",
+        PATH_INFO="/app/foo",
+        **environ
+        )
+    return _make_request(**environ)
+
+
+def _collect_body(django_response, executor=None):
+    body_iterator = iterate_response_body(django_response, executor)
+    chunks = []
+    while True:
+        try:
+            chunks.append(run_coroutine(body_iterator.__anext__()))
+        except StopAsyncIteration:
+            break
+    return b"".join(chunks)
+
+
+def _get_executor_thread(executor):
+    return executor.submit(threading.current_thread).result()
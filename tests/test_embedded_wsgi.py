@@ -17,14 +17,33 @@
 Tests for the use of WSGI applications within Django.
 
 """
-from nose.tools import eq_, ok_, assert_false, assert_raises
+import io
+import zlib
+from threading import Thread
+from threading import Timer
+from time import sleep
 
+from django.http import BadHeaderError
+from django.http import FileResponse
+from django.http import StreamingHttpResponse
+from django.http import UnreadablePostError
+from django.test.utils import override_settings
+from django.utils.functional import SimpleLazyObject
+from six import BytesIO
+from webob import Request
+from nose.tools import (eq_, ok_, assert_false, assert_raises,
+                        assert_is_instance)
+
+from django_wsgi.embedded_wsgi import ConcurrencyLimit
 from django_wsgi.embedded_wsgi import call_wsgi_app, make_wsgi_view
 from django_wsgi.handler import DjangoWSGIRequest
 from django_wsgi.exc import ApplicationCallError
+from django_wsgi.exc import RequestBodyTooLargeError
+from django_wsgi.signals import phase_timed
 
-from tests import (BaseDjangoTestCase, MockApp, MockClosingApp, MockWriteApp,
-                   MockGeneratorApp, complete_environ)
+from tests import (BaseDjangoTestCase, ClosingAppIter, MockApp, MockClosingApp,
+                   MockWriteApp, MockGeneratorApp, PhaseTimingRecorder,
+                   complete_environ)
 
 
 class TestCallWSGIApp(BaseDjangoTestCase):
@@ -51,6 +70,45 @@ class TestCallWSGIApp(BaseDjangoTestCase):
             else:
                 eq_(expected_variable_value, request.environ[variable_name])
 
+    def test_request_body_shared(self):
+        """The WSGI app gets the body of the request without copying it."""
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        app = _MockBodyReadingApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form")
+
+        eq_(_STUB_POST_BODY, app.body)
+        eq_(str(len(_STUB_POST_BODY)), app.environ['CONTENT_LENGTH'])
+        ok_(app.environ['wsgi.input'] is not request.environ['wsgi.input'])
+        # The original request is still readable:
+        eq_(request.POST['foo'], "bar")
+        eq_(request.webob.POST['foo'], "bar")
+
+    def test_request_body_read_by_django_first(self):
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        request.POST
+        app = _MockBodyReadingApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form")
+
+        eq_(_STUB_POST_BODY, app.body)
+
+    def test_request_body_read_by_app_in_chunks(self):
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        app = _MockBodyReadingApp("200 OK", [], chunk_size=3)
+
+        call_wsgi_app(app, request, "/form")
+
+        eq_(_STUB_POST_BODY, app.body)
+
+    def test_request_body_read_by_app_with_webob(self):
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        app = _MockWebobApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form")
+
+        eq_("bar", app.post['foo'])
+
     def test_routing_args_are_removed(self):
         """The ``wsgiorg.routing_args`` environment key must be removed."""
         environ = {
@@ -119,6 +177,53 @@ class TestCallWSGIApp(BaseDjangoTestCase):
         django_response = call_wsgi_app(app, request, "/wiki")
         eq_(expected_headers, django_response._headers)
 
+    def test_repeated_list_headers_are_combined(self):
+        headers = [
+            ("Link", "</a.css>; rel=preload"),
+            ("Vary", "Accept"),
+            ("Link", "</b.js>; rel=preload"),
+            ("vary", "Cookie"),
+            ]
+        django_response = _call_app_with_headers(headers)
+
+        eq_(
+            ("Link", "</a.css>; rel=preload, </b.js>; rel=preload"),
+            django_response._headers['link'],
+            )
+        eq_(("Vary", "Accept, Cookie"), django_response._headers['vary'])
+
+    def test_repeated_headers_are_replaced(self):
+        headers = [
+            ("Content-Type", "text/plain"),
+            ("Content-Type", "text/html"),
+            ]
+        django_response = _call_app_with_headers(headers)
+
+        eq_(
+            ("Content-Type", "text/html"),
+            django_response._headers['content-type'],
+            )
+
+    def test_hop_by_hop_headers_are_removed(self):
+        headers = [
+            ("Connection", "close"),
+            ("Keep-Alive", "timeout=5"),
+            ("Transfer-Encoding", "chunked"),
+            ("X-Foo", "bar"),
+            ]
+        django_response = _call_app_with_headers(headers)
+
+        eq_(("X-Foo", "bar"), django_response._headers['x-foo'])
+        for header in ("connection", "keep-alive", "transfer-encoding"):
+            ok_(header not in django_response._headers)
+
+    def test_invalid_header(self):
+        app = MockApp("200 OK", [("X-Foo", "bar\nX-Bar: foo")])
+        environ = complete_environ(SCRIPT_NAME="/dev", PATH_INFO="/trac/wiki")
+        request = _make_request(**environ)
+
+        assert_raises(BadHeaderError, call_wsgi_app, app, request, "/wiki")
+
     def test_authenticated_user(self):
         environ = complete_environ(SCRIPT_NAME="/dev", PATH_INFO="/trac/wiki")
         request = _make_request(authenticated=True, **environ)
@@ -190,6 +295,51 @@ class TestCallWSGIApp(BaseDjangoTestCase):
                          (attr_key, cookie_set_name, cookie_set[attr_key]),
                 )
 
+    def test_raw_cookies_sent(self):
+        environ = complete_environ(SCRIPT_NAME="/dev", PATH_INFO="/trac/wiki")
+        request = _make_request(**environ)
+        cookie_header_values = [
+            "arg1=val1",
+            "arg2=val2; Path=/wiki; HttpOnly; Secure; SameSite=Strict",
+            u"arg3=val3; Max-Age=3600",
+            ]
+        headers = [("Set-Cookie", v) for v in cookie_header_values]
+        app = MockApp("200 OK", headers)
+
+        django_response = call_wsgi_app(
+            app,
+            request,
+            "/wiki",
+            raw_cookies=True,
+            )
+
+        eq_(3, len(django_response.cookies))
+        eq_("val2", django_response.cookies['arg2'].value)
+        cookie_header_values_sent = [
+            cookie.output(header="").strip()
+            for cookie in django_response.cookies.values()
+            ]
+        eq_(sorted(cookie_header_values), sorted(cookie_header_values_sent))
+
+    def test_raw_cookies_set_again(self):
+        """Raw cookies set again by Django are output as such."""
+        environ = complete_environ(SCRIPT_NAME="/dev", PATH_INFO="/trac/wiki")
+        request = _make_request(**environ)
+        app = MockApp("200 OK", [("Set-Cookie", "arg1=val1; HttpOnly")])
+        django_response = call_wsgi_app(
+            app,
+            request,
+            "/wiki",
+            raw_cookies=True,
+            )
+
+        django_response.set_cookie("arg1", "new-value")
+
+        eq_(
+            "arg1=new-value; Path=/",
+            django_response.cookies['arg1'].output(header="").strip(),
+            )
+
     def test_string_as_response(self):
         app = MockApp("200 It is OK", [("X-HEADER", "Foo")])
         # Running a request:
@@ -233,6 +383,1075 @@ class TestCallWSGIApp(BaseDjangoTestCase):
         ok_(app.app_iter.closed)
 
 
+class TestStreamingCallWSGIApp(BaseDjangoTestCase):
+    """
+    Tests for call_wsgi_app() when the response is streamed.
+    
+    """
+
+    def test_response_class(self):
+        app = MockApp("200 It is OK", [("X-HEADER", "Foo")])
+        django_response = _call_streaming_app(app)
+
+        assert_is_instance(django_response, StreamingHttpResponse)
+        eq_(200, django_response.status_code)
+        eq_(("X-HEADER", "Foo"), django_response._headers['x-header'])
+
+    def test_body_read_lazily(self):
+        app = _MockTelltaleGeneratorApp("200 It is OK", [])
+        django_response = _call_streaming_app(app)
+
+        eq_(0, app.chunks_consumed)
+        body_iterator = iter(django_response)
+        eq_(b"body", next(body_iterator))
+        eq_(1, app.chunks_consumed)
+        eq_(b" as iterable", b"".join(body_iterator))
+
+    def test_generator_function(self):
+        """
+        Applications which only start the response upon the first iteration
+        are streamed too.
+
+        """
+        app = _MockTelltaleGeneratorFunctionApp()
+        django_response = _call_streaming_app(app)
+
+        eq_(1, app.chunks_consumed)
+        eq_(200, django_response.status_code)
+        eq_("Foo", django_response['X-HEADER'])
+        body_iterator = iter(django_response)
+        eq_(b"chunk 0", next(body_iterator))
+        eq_(1, app.chunks_consumed)
+        eq_(b"chunk 1", next(body_iterator))
+        eq_(2, app.chunks_consumed)
+        eq_(b"chunk 2chunk 3chunk 4", b"".join(body_iterator))
+        eq_(5, app.chunks_consumed)
+
+    def test_generator_function_closed(self):
+        app = _MockTelltaleGeneratorFunctionApp()
+        django_response = _call_streaming_app(app)
+
+        django_response.close()
+
+        ok_(app.is_closed)
+        eq_(1, app.chunks_consumed)
+
+    def test_response_not_started(self):
+        app_iter = ClosingAppIter()
+
+        with assert_raises(ApplicationCallError):
+            _call_streaming_app(lambda environ, start_response: app_iter)
+        eq_(1, app_iter.close_count)
+
+    def test_write_response(self):
+        app = MockWriteApp("200 It is OK", [])
+        django_response = _call_streaming_app(app)
+
+        eq_(b"body as iterable", _resolve_response_body(django_response))
+
+    def test_closure_response(self):
+        app = MockClosingApp("200 It is OK", [])
+        django_response = _call_streaming_app(app)
+
+        assert_false(app.app_iter.closed)
+        django_response.close()
+        eq_(1, app.app_iter.close_count)
+
+    def test_closure_response_closed_repeatedly(self):
+        """The app's response is closed once even if Django closes it twice."""
+        app = MockClosingApp("200 It is OK", [])
+        django_response = _call_streaming_app(app)
+
+        django_response.close()
+        django_response.close()
+        eq_(1, app.app_iter.close_count)
+
+
+class TestPhaseTiming(BaseDjangoTestCase):
+    """Tests for the timing of the phases in call_wsgi_app()."""
+
+    def setup(self):
+        super(TestPhaseTiming, self).setup()
+        self.recorder = PhaseTimingRecorder()
+        phase_timed.connect(self.recorder)
+
+    def teardown(self):
+        phase_timed.disconnect(self.recorder)
+        super(TestPhaseTiming, self).teardown()
+
+    def test_phases(self):
+        app = MockApp("200 OK", [])
+        request = _make_request(**complete_environ(PATH_INFO="/app/foo"))
+        del self.recorder.phases[:]
+
+        call_wsgi_app(app, request, "/foo")
+
+        expected_phase_names = [
+            'request_clone',
+            'application_call',
+            'body_collection',
+            'response_conversion',
+            ]
+        eq_(expected_phase_names, self.recorder.get_phase_names())
+        for (sender, _, duration, phase_request) in self.recorder.phases:
+            ok_(sender is app)
+            ok_(phase_request is request)
+            ok_(0 <= duration)
+
+    def test_phases_with_streaming(self):
+        app = MockClosingApp("200 OK", [])
+        request = _make_request(**complete_environ(PATH_INFO="/app/foo"))
+        del self.recorder.phases[:]
+
+        django_response = call_wsgi_app(app, request, "/foo", streaming=True)
+
+        expected_phase_names = [
+            'request_clone',
+            'application_call',
+            'response_conversion',
+            ]
+        eq_(expected_phase_names, self.recorder.get_phase_names())
+
+        eq_(b"body", _resolve_response_body(django_response))
+        django_response.close()
+        eq_(
+            expected_phase_names + ['body_collection'],
+            self.recorder.get_phase_names(),
+            )
+
+    def test_phases_in_wsgi_view(self):
+        app = MockApp("200 OK", [])
+        django_view = make_wsgi_view(app)
+        request = _make_request(**complete_environ(PATH_INFO="/app/foo"))
+        del self.recorder.phases[:]
+
+        django_view(request, "/foo")
+
+        eq_(4, len(self.recorder.phases))
+
+
+class TestServerTiming(BaseDjangoTestCase):
+    """Tests for the Server-Timing header in call_wsgi_app()."""
+
+    def test_header_not_added_by_default(self):
+        django_response = _call_app_with_headers([])
+
+        assert_false(django_response.has_header('Server-Timing'))
+
+    def test_header_added(self):
+        app = MockApp("200 OK", [])
+        request = _make_request(**complete_environ(PATH_INFO="/app/foo"))
+
+        django_response = call_wsgi_app(
+            app,
+            request,
+            "/foo",
+            server_timing=True,
+            )
+
+        metrics = _parse_server_timing(django_response['Server-Timing'])
+        eq_(['prep', 'app', 'conversion'], [name for (name, _) in metrics])
+        for (_, duration) in metrics:
+            ok_(0 <= duration)
+
+    def test_header_from_app_kept(self):
+        app = MockApp("200 OK", [("Server-Timing", "db;dur=53")])
+        request = _make_request(**complete_environ(PATH_INFO="/app/foo"))
+
+        django_response = call_wsgi_app(
+            app,
+            request,
+            "/foo",
+            server_timing=True,
+            )
+
+        metrics = _parse_server_timing(django_response['Server-Timing'])
+        eq_(
+            ['db', 'prep', 'app', 'conversion'],
+            [name for (name, _) in metrics],
+            )
+        eq_(53, metrics[0][1])
+
+    def test_wsgi_view(self):
+        django_view = make_wsgi_view(MockApp("200 OK", []), server_timing=True)
+        request = _make_request(**complete_environ(PATH_INFO="/app/foo"))
+
+        django_response = django_view(request, "/foo")
+
+        ok_(django_response.has_header('Server-Timing'))
+
+
+class TestConditionalResponses(BaseDjangoTestCase):
+
+    def test_matching_etag(self):
+        app = MockClosingApp("200 OK", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(
+            app,
+            HTTP_IF_NONE_MATCH='"foo", "abc"',
+            )
+
+        eq_(304, django_response.status_code)
+        eq_(b"", django_response.content)
+        eq_('"abc"', django_response['ETag'])
+        assert_false(django_response.has_header('Content-Type'))
+        ok_(app.app_iter.closed)
+
+    def test_weak_etags_matching(self):
+        app = MockApp("200 OK", [("ETag", 'W/"abc"')])
+        django_response = _call_conditional_app(
+            app,
+            HTTP_IF_NONE_MATCH='"abc"',
+            )
+
+        eq_(304, django_response.status_code)
+
+    def test_any_etag_matching(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(app, HTTP_IF_NONE_MATCH="*")
+
+        eq_(304, django_response.status_code)
+
+    def test_mismatching_etag(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(
+            app,
+            HTTP_IF_NONE_MATCH='"def"',
+            HTTP_IF_MODIFIED_SINCE="Wed, 21 Oct 2015 07:28:00 GMT",
+            )
+
+        eq_(200, django_response.status_code)
+        eq_(b"body", django_response.content)
+
+    def test_not_modified_since(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(
+            app,
+            HTTP_IF_MODIFIED_SINCE="Wed, 21 Oct 2015 07:28:00 GMT",
+            )
+
+        eq_(304, django_response.status_code)
+
+    def test_modified_since(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(
+            app,
+            HTTP_IF_MODIFIED_SINCE="Tue, 20 Oct 2015 07:28:00 GMT",
+            )
+
+        eq_(200, django_response.status_code)
+
+    def test_unsuccessful_response(self):
+        app = MockApp("404 Not Found", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(
+            app,
+            HTTP_IF_NONE_MATCH='"abc"',
+            )
+
+        eq_(404, django_response.status_code)
+
+    def test_unconditional_request(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(app)
+
+        eq_(200, django_response.status_code)
+        eq_(b"body", django_response.content)
+
+    def test_conditional_requests_disabled(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_IF_NONE_MATCH='"abc"',
+            )
+        django_response = call_wsgi_app(app, _make_request(**environ), "/foo")
+
+        eq_(200, django_response.status_code)
+
+    def test_head_request(self):
+        app = MockClosingApp("200 OK", [("Content-Length", "4")])
+        django_response = _call_conditional_app(app, REQUEST_METHOD="HEAD")
+
+        eq_(200, django_response.status_code)
+        eq_(b"", django_response.content)
+        eq_("4", django_response['Content-Length'])
+        ok_(app.app_iter.closed)
+
+    def test_head_request_with_matching_etag(self):
+        app = MockClosingApp("200 OK", _VALIDATOR_HEADERS)
+        django_response = _call_conditional_app(
+            app,
+            REQUEST_METHOD="HEAD",
+            HTTP_IF_NONE_MATCH='"abc"',
+            )
+
+        eq_(304, django_response.status_code)
+        eq_(b"", django_response.content)
+        ok_(app.app_iter.closed)
+
+    def test_streaming(self):
+        app = _MockTelltaleGeneratorApp("200 OK", _VALIDATOR_HEADERS)
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_IF_NONE_MATCH='"abc"',
+            )
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            streaming=True,
+            conditional=True,
+            )
+
+        eq_(304, django_response.status_code)
+        eq_(b"", _resolve_response_body(django_response))
+        eq_(0, app.chunks_consumed)
+
+    def test_weak_etag_generated(self):
+        app = MockApp("200 OK", [])
+        environ = complete_environ(PATH_INFO="/app/foo")
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            weak_etags=True,
+            )
+
+        eq_('W/"841a2d689ad86bd1611447453c22c6fc"', django_response['ETag'])
+
+    def test_generated_weak_etag_matching(self):
+        app = MockApp("200 OK", [])
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_IF_NONE_MATCH='W/"841a2d689ad86bd1611447453c22c6fc"',
+            )
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            conditional=True,
+            weak_etags=True,
+            )
+
+        eq_(304, django_response.status_code)
+        eq_(b"", django_response.content)
+
+    def test_etag_from_application_kept(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        environ = complete_environ(PATH_INFO="/app/foo")
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            weak_etags=True,
+            )
+
+        eq_('"abc"', django_response['ETag'])
+
+    def test_view(self):
+        app = MockApp("200 OK", _VALIDATOR_HEADERS)
+        django_view = make_wsgi_view(app, conditional=True, weak_etags=True)
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_IF_NONE_MATCH='"abc"',
+            )
+
+        django_response = django_view(_make_request(**environ), "/foo")
+
+        eq_(304, django_response.status_code)
+
+
+class TestFileResponses(BaseDjangoTestCase):
+
+    def test_file_wrapper(self):
+        app = _MockFileApp(use_file_wrapper=True)
+        django_response = _call_file_app(app)
+
+        assert_is_instance(django_response, FileResponse)
+        eq_(app.file, django_response.file_to_stream)
+        eq_(2, django_response.block_size)
+        eq_(b"file contents", _resolve_response_body(django_response))
+        eq_("13", django_response['Content-Length'])
+
+    def test_file_like_app_iter(self):
+        app = _MockFileApp(use_file_wrapper=False)
+        django_response = _call_file_app(app)
+
+        assert_is_instance(django_response, FileResponse)
+        eq_(app.file, django_response.file_to_stream)
+        eq_(b"file contents", _resolve_response_body(django_response))
+
+    def test_file_closed(self):
+        app = _MockFileApp(use_file_wrapper=True)
+        django_response = _call_file_app(app)
+
+        django_response.close()
+
+        ok_(app.file.closed)
+
+    def test_outer_file_wrapper_not_used(self):
+        outer_file_wrapper = lambda filelike, block_size=8192: None
+        app = _MockFileApp(use_file_wrapper=True)
+        _call_file_app(app, **{'wsgi.file_wrapper': outer_file_wrapper})
+
+        ok_(app.environ['wsgi.file_wrapper'] is not outer_file_wrapper)
+
+    def test_head_request(self):
+        app = _MockFileApp(use_file_wrapper=True)
+        environ = complete_environ(PATH_INFO="/app/foo", REQUEST_METHOD="HEAD")
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            conditional=True,
+            )
+
+        assert_false(django_response.streaming)
+        eq_(b"", django_response.content)
+        ok_(app.file.closed)
+
+
+class TestRanges(BaseDjangoTestCase):
+
+    def test_no_range_requested(self):
+        django_response = _call_range_app(MockApp("200 OK", []))
+
+        eq_(200, django_response.status_code)
+        eq_("bytes", django_response['Accept-Ranges'])
+        eq_(b"body", django_response.content)
+
+    def test_single_range(self):
+        django_response = _call_range_app(
+            _MockRangeApp(),
+            HTTP_RANGE="bytes=2-5",
+            )
+
+        eq_(206, django_response.status_code)
+        eq_("partial content", django_response.reason_phrase.lower())
+        eq_("bytes 2-5/26", django_response['Content-Range'])
+        eq_("4", django_response['Content-Length'])
+        eq_("text/plain", django_response['Content-Type'])
+        eq_(b"cdef", django_response.content)
+
+    def test_open_ended_ranges(self):
+        for (range_header, expected_body) in (
+            ("bytes=23-", b"xyz"),
+            ("bytes=-2", b"yz"),
+            ("bytes=24-100", b"yz"),
+            ("bytes=-100", _RANGE_APP_BODY),
+            ):
+            django_response = _call_range_app(
+                _MockRangeApp(),
+                HTTP_RANGE=range_header,
+                )
+            eq_(206, django_response.status_code)
+            eq_(expected_body, django_response.content)
+
+    def test_multiple_ranges(self):
+        django_response = _call_range_app(
+            _MockRangeApp(),
+            HTTP_RANGE="bytes=0-1, 24-",
+            )
+
+        eq_(206, django_response.status_code)
+        content_type = django_response['Content-Type']
+        ok_(content_type.startswith("multipart/byteranges; boundary="))
+        boundary = content_type.split("boundary=")[1]
+        expected_body = (
+            "--%(boundary)s\r\n"
+            "Content-Type: text/plain\r\n"
+            "Content-Range: bytes 0-1/26\r\n\r\n"
+            "ab\r\n"
+            "--%(boundary)s\r\n"
+            "Content-Type: text/plain\r\n"
+            "Content-Range: bytes 24-25/26\r\n\r\n"
+            "yz\r\n"
+            "--%(boundary)s--\r\n"
+            ) % {'boundary': boundary}
+        eq_(expected_body.encode("ascii"), django_response.content)
+        eq_(str(len(expected_body)), django_response['Content-Length'])
+
+    def test_unsatisfiable_range(self):
+        django_response = _call_range_app(
+            _MockRangeApp(),
+            HTTP_RANGE="bytes=26-",
+            )
+
+        eq_(416, django_response.status_code)
+        eq_("bytes */26", django_response['Content-Range'])
+        eq_(b"", django_response.content)
+
+    def test_overlapping_ranges_coalesced(self):
+        for (range_header, expected_content_range) in (
+            ("bytes=0-3, 2-5", "bytes 0-5/26"),
+            ("bytes=2-3, 0-1", "bytes 0-3/26"),
+            ("bytes=5-, -10", "bytes 5-25/26"),
+            ("bytes=" + ", ".join(["0-"] * 50), "bytes 0-25/26"),
+            ):
+            django_response = _call_range_app(
+                _MockRangeApp(),
+                HTTP_RANGE=range_header,
+                )
+            eq_(206, django_response.status_code)
+            eq_(expected_content_range, django_response['Content-Range'])
+
+    def test_coalesced_ranges_kept_in_order(self):
+        django_response = _call_range_app(
+            _MockRangeApp(),
+            HTTP_RANGE="bytes=20-22, 2-3, 23-24",
+            )
+
+        eq_(206, django_response.status_code)
+        body = django_response.content
+        ok_(body.index(b"uvwxy\r\n") < body.index(b"cd\r\n"))
+
+    def test_too_many_ranges(self):
+        range_specs = ["%s-%s" % (index, index) for index in range(0, 202, 2)]
+        django_response = _call_range_app(
+            _MockRangeApp(body=[b"a" * 202]),
+            HTTP_RANGE="bytes=" + ", ".join(range_specs),
+            )
+
+        eq_(200, django_response.status_code)
+        eq_(b"a" * 202, django_response.content)
+
+    def test_invalid_ranges_ignored(self):
+        for range_header in (
+            "bytes=5-2",
+            "items=0-1",
+            "bytes=a-b",
+            "bytes=",
+            "bytes=--5",
+            "bytes=1--5",
+            "bytes=+1-5",
+            "bytes=\xb2-5",
+            "bytes=-\xb2",
+            ):
+            django_response = _call_range_app(
+                _MockRangeApp(),
+                HTTP_RANGE=range_header,
+                )
+            eq_(200, django_response.status_code)
+            eq_(_RANGE_APP_BODY, django_response.content)
+
+    def test_if_range(self):
+        for (if_range, expected_status_code) in (
+            ('"abc"', 206),
+            ('"def"', 200),
+            ('W/"abc"', 200),
+            ("Wed, 21 Oct 2015 07:28:00 GMT", 206),
+            ("Tue, 20 Oct 2015 07:28:00 GMT", 200),
+            ):
+            django_response = _call_range_app(
+                _MockRangeApp(),
+                HTTP_RANGE="bytes=0-1",
+                HTTP_IF_RANGE=if_range,
+                )
+            eq_(expected_status_code, django_response.status_code)
+
+    def test_unsuccessful_response(self):
+        django_response = _call_range_app(
+            MockApp("404 Not Found", []),
+            HTTP_RANGE="bytes=0-1",
+            )
+
+        eq_(404, django_response.status_code)
+        assert_false(django_response.has_header('Accept-Ranges'))
+
+    def test_head_request(self):
+        django_response = _call_range_app(
+            _MockRangeApp(),
+            HTTP_RANGE="bytes=0-1",
+            REQUEST_METHOD="HEAD",
+            )
+
+        eq_(200, django_response.status_code)
+
+    def test_seekable_file(self):
+        app = _MockRangeApp(body=_TelltaleSeekableFile(_RANGE_APP_BODY))
+        django_response = _call_range_app(app, HTTP_RANGE="bytes=20-22, 2-3")
+
+        body = _resolve_response_body(django_response)
+
+        eq_(206, django_response.status_code)
+        ok_(b"uvw\r\n" in body)
+        ok_(b"cd\r\n" in body)
+        eq_(5, app.body.bytes_read)
+        eq_(None, django_response.file_to_stream)
+        django_response.close()
+        ok_(app.body.closed)
+
+    def test_seekable_file_without_content_length(self):
+        body = _TelltaleSeekableFile(b"12345" + _RANGE_APP_BODY)
+        body.read(5)
+        app = _MockRangeApp(body=body, headers=[])
+        django_response = _call_range_app(app, HTTP_RANGE="bytes=-2")
+
+        eq_("bytes 24-25/26", django_response['Content-Range'])
+        eq_(b"yz", _resolve_response_body(django_response))
+
+    def test_streamed_body(self):
+        app = _MockRangeApp(body=[b"abcdefghi", b"jklmnopqr", b"stuvwxyz"])
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_RANGE="bytes=1-2, 8-10, 24-",
+            )
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            streaming=True,
+            ranges=True,
+            )
+
+        body = _resolve_response_body(django_response)
+
+        eq_(206, django_response.status_code)
+        ok_(b"bc\r\n" in body)
+        ok_(b"ijk\r\n" in body)
+        ok_(b"yz\r\n" in body)
+        eq_(str(len(body)), django_response['Content-Length'])
+
+    def test_streamed_body_with_unordered_ranges(self):
+        app = _MockRangeApp(body=[_RANGE_APP_BODY])
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_RANGE="bytes=8-10, 1-2",
+            )
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            streaming=True,
+            ranges=True,
+            )
+
+        eq_(200, django_response.status_code)
+        eq_(_RANGE_APP_BODY, _resolve_response_body(django_response))
+        assert_false(django_response.has_header('Accept-Ranges'))
+
+    def test_streamed_body_without_content_length(self):
+        app = _MockRangeApp(body=[_RANGE_APP_BODY], headers=[])
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_RANGE="bytes=1-2",
+            )
+        django_response = call_wsgi_app(
+            app,
+            _make_request(**environ),
+            "/foo",
+            streaming=True,
+            ranges=True,
+            )
+
+        eq_(200, django_response.status_code)
+        eq_(_RANGE_APP_BODY, _resolve_response_body(django_response))
+        assert_false(django_response.has_header('Accept-Ranges'))
+
+    def test_view(self):
+        django_view = make_wsgi_view(_MockRangeApp(), ranges=True)
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_RANGE="bytes=0-1",
+            )
+
+        django_response = django_view(_make_request(**environ), "/foo")
+
+        eq_(206, django_response.status_code)
+
+
+class TestCompression(BaseDjangoTestCase):
+
+    def test_gzip(self):
+        django_response = _call_compressing_app(
+            _MockCompressibleApp(),
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+            )
+
+        eq_("gzip", django_response['Content-Encoding'])
+        eq_("Accept-Encoding", django_response['Vary'])
+        eq_(
+            str(len(django_response.content)),
+            django_response['Content-Length'],
+            )
+        eq_(_COMPRESSIBLE_BODY, _decompress(django_response.content, "gzip"))
+
+    def test_deflate(self):
+        django_response = _call_compressing_app(
+            _MockCompressibleApp(),
+            HTTP_ACCEPT_ENCODING="gzip;q=0.5, deflate",
+            )
+
+        eq_("deflate", django_response['Content-Encoding'])
+        eq_(
+            _COMPRESSIBLE_BODY,
+            _decompress(django_response.content, "deflate"),
+            )
+
+    def test_unacceptable_encodings(self):
+        for accept_encoding in (None, "", "identity", "br", "gzip;q=0"):
+            environ = {}
+            if accept_encoding is not None:
+                environ['HTTP_ACCEPT_ENCODING'] = accept_encoding
+            django_response = _call_compressing_app(
+                _MockCompressibleApp(),
+                **environ
+                )
+
+            assert_false(django_response.has_header('Content-Encoding'))
+            eq_("Accept-Encoding", django_response['Vary'])
+            eq_(_COMPRESSIBLE_BODY, django_response.content)
+
+    def test_small_body(self):
+        django_response = _call_compressing_app(
+            _MockCompressibleApp(body=[b"small"]),
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        assert_false(django_response.has_header('Content-Encoding'))
+        eq_(b"small", django_response.content)
+
+    def test_compressed_mime_types(self):
+        for content_type in ("image/png", "application/zip", "video/mp4"):
+            django_response = _call_compressing_app(
+                _MockCompressibleApp([("Content-Type", content_type)]),
+                HTTP_ACCEPT_ENCODING="gzip",
+                )
+
+            assert_false(django_response.has_header('Content-Encoding'))
+            assert_false(django_response.has_header('Vary'))
+
+    def test_svg(self):
+        django_response = _call_compressing_app(
+            _MockCompressibleApp([("Content-Type", "image/svg+xml")]),
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        eq_("gzip", django_response['Content-Encoding'])
+
+    def test_already_encoded_body(self):
+        django_response = _call_compressing_app(
+            _MockCompressibleApp([("Content-Encoding", "br")]),
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        eq_("br", django_response['Content-Encoding'])
+        eq_(_COMPRESSIBLE_BODY, django_response.content)
+
+    def test_vary_header_extended(self):
+        django_response = _call_compressing_app(
+            _MockCompressibleApp([("Vary", "Cookie")]),
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        eq_("Cookie, Accept-Encoding", django_response['Vary'])
+
+    def test_strong_etag_weakened(self):
+        django_response = _call_compressing_app(
+            _MockCompressibleApp([("ETag", '"abc"')]),
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        eq_('W/"abc"', django_response['ETag'])
+
+    def test_unsuccessful_response(self):
+        app = _MockCompressibleApp()
+        app.status = "404 Not Found"
+        django_response = _call_compressing_app(
+            app,
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        eq_("gzip", django_response['Content-Encoding'])
+
+    def test_partial_content(self):
+        app = _MockCompressibleApp([
+            ("Content-Range", "bytes 0-999/2000"),
+            ])
+        app.status = "206 Partial Content"
+        django_response = _call_compressing_app(
+            app,
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        assert_false(django_response.has_header('Content-Encoding'))
+
+    def test_streamed_body(self):
+        app_iter = ClosingAppIter(
+            [_COMPRESSIBLE_BODY[:500], b"", _COMPRESSIBLE_BODY[500:]],
+            )
+        app = _MockCompressibleApp(
+            [("Content-Length", str(len(_COMPRESSIBLE_BODY)))],
+            body=app_iter,
+            )
+        django_response = _call_compressing_app(
+            app,
+            streaming=True,
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        assert_false(django_response.has_header('Content-Length'))
+        eq_("gzip", django_response['Content-Encoding'])
+        chunks = list(django_response.streaming_content)
+        # The non-empty chunks are flushed as they come:
+        eq_(3, len(chunks))
+        eq_(_COMPRESSIBLE_BODY, _decompress(b"".join(chunks), "gzip"))
+        django_response.close()
+        eq_(1, app_iter.close_count)
+
+    def test_small_streamed_body(self):
+        app = _MockCompressibleApp(
+            [("Content-Length", "5")],
+            body=[b"small"],
+            )
+        django_response = _call_compressing_app(
+            app,
+            streaming=True,
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        assert_false(django_response.has_header('Content-Encoding'))
+        eq_(b"small", _resolve_response_body(django_response))
+
+    def test_file(self):
+        body = io.BytesIO(_COMPRESSIBLE_BODY)
+        django_response = _call_compressing_app(
+            _MockCompressibleApp(body=body),
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        eq_(None, django_response.file_to_stream)
+        eq_(
+            _COMPRESSIBLE_BODY,
+            _decompress(_resolve_response_body(django_response), "gzip"),
+            )
+        django_response.close()
+        ok_(body.closed)
+
+    def test_head_request_with_omitted_body(self):
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            REQUEST_METHOD="HEAD",
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+        django_response = call_wsgi_app(
+            _MockCompressibleApp(),
+            _make_request(**environ),
+            "/foo",
+            conditional=True,
+            compression=True,
+            )
+
+        assert_false(django_response.has_header('Content-Encoding'))
+
+    def test_view(self):
+        django_view = make_wsgi_view(_MockCompressibleApp(), compression=True)
+        environ = complete_environ(
+            PATH_INFO="/app/foo",
+            HTTP_ACCEPT_ENCODING="gzip",
+            )
+
+        django_response = django_view(_make_request(**environ), "/foo")
+
+        eq_("gzip", django_response['Content-Encoding'])
+
+
+class TestRemoteUser(BaseDjangoTestCase):
+
+    def test_eager(self):
+        (request, user_lookups) = _make_request_with_lazy_user(True)
+        app = MockApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/foo", remote_user="eager")
+
+        eq_(1, len(user_lookups))
+        eq_("foobar", app.environ['REMOTE_USER'])
+
+    def test_off(self):
+        (request, user_lookups) = _make_request_with_lazy_user(True)
+        app = MockApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/foo", remote_user=None)
+
+        eq_(0, len(user_lookups))
+        ok_('REMOTE_USER' not in app.environ)
+
+    def test_webob_application(self):
+        for (remote_user, expected_remote_user) in (
+            ("eager", "foobar"),
+            ("credentials", "foobar"),
+            (None, None),
+            ):
+            (request, _) = _make_request_with_lazy_user(
+                True,
+                HTTP_COOKIE="sessionid=abc",
+                )
+            app = _MockWebobApp("200 OK", [])
+
+            django_response = \
+                call_wsgi_app(app, request, "/foo", remote_user=remote_user)
+
+            eq_(200, django_response.status_code)
+            eq_(expected_remote_user, Request(app.environ).remote_user)
+
+    def test_credentials(self):
+        for (environ, expected_user_lookup_count) in (
+            ({}, 0),
+            ({'HTTP_COOKIE': "foo=bar"}, 0),
+            ({'HTTP_COOKIE': "sessionid=abc"}, 1),
+            ({'HTTP_AUTHORIZATION': "Basic Zm9vOmJhcg=="}, 1),
+            ):
+            (request, user_lookups) = \
+                _make_request_with_lazy_user(True, **environ)
+            app = MockApp("200 OK", [])
+
+            call_wsgi_app(app, request, "/foo", remote_user="credentials")
+
+            eq_(expected_user_lookup_count, len(user_lookups))
+            eq_(
+                bool(expected_user_lookup_count),
+                'REMOTE_USER' in app.environ,
+                )
+
+    def test_unknown_mode(self):
+        (request, _) = _make_request_with_lazy_user(True)
+
+        with assert_raises(ValueError):
+            call_wsgi_app(
+                MockApp("200 OK", []),
+                request,
+                "/foo",
+                remote_user="header",
+                )
+
+    def test_view(self):
+        (request, user_lookups) = _make_request_with_lazy_user(True)
+        django_view = make_wsgi_view(MockApp("200 OK", []), remote_user=None)
+
+        django_view(request, "/foo")
+
+        eq_(0, len(user_lookups))
+
+
+class TestUnbufferedInput(BaseDjangoTestCase):
+
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_original_input_passed_on(self):
+        original_input = BytesIO(_STUB_POST_BODY + b"&extra=data")
+        environ = _make_post_environ(
+            PATH_INFO="/app/form",
+            **{'wsgi.input': original_input}
+            )
+        request = _make_request(**environ)
+        app = _MockBodyReadingApp("200 OK", [], chunk_size=3)
+
+        call_wsgi_app(app, request, "/form", unbuffered_input=True)
+
+        eq_(_STUB_POST_BODY, app.body)
+        ok_(app.environ['wsgi.input'].raw.file is original_input)
+        ok_('webob.is_body_seekable' not in app.environ)
+        eq_(len(_STUB_POST_BODY), original_input.tell())
+        # The body is gone for good:
+        with assert_raises(UnreadablePostError):
+            request.read()
+
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_original_input_read_with_webob(self):
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        app = _MockWebobApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form", unbuffered_input=True)
+
+        eq_("bar", app.post['foo'])
+
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_buffered_input(self):
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        eq_("bar", request.POST['foo'])
+        app = _MockBodyReadingApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form", unbuffered_input=True)
+
+        eq_(_STUB_POST_BODY, app.body)
+        eq_(True, app.environ['webob.is_body_seekable'])
+        eq_("bar", request.webob.POST['foo'])
+
+    def test_eagerly_buffered_input(self):
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        app = _MockBodyReadingApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form", unbuffered_input=True)
+
+        eq_(_STUB_POST_BODY, app.body)
+        eq_("bar", request.POST['foo'])
+
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_view(self):
+        request = _make_request(**_make_post_environ(PATH_INFO="/app/form"))
+        app = _MockBodyReadingApp("200 OK", [])
+        django_view = make_wsgi_view(app, unbuffered_input=True)
+
+        django_view(request, "/form")
+
+        eq_(_STUB_POST_BODY, app.body)
+        ok_('webob.is_body_seekable' not in app.environ)
+
+    @override_settings(
+        WSGI_CHUNKED_REQUEST_BODY=True,
+        WSGI_LAZY_REQUEST_BODY=True,
+        )
+    def test_chunked_input(self):
+        request = _make_request(**_make_chunked_post_environ())
+        app = _MockBodyReadingApp("200 OK", [], chunk_size=3)
+
+        call_wsgi_app(app, request, "/form", unbuffered_input=True)
+
+        eq_(_STUB_POST_BODY, app.body)
+        ok_('CONTENT_LENGTH' not in app.environ)
+
+    @override_settings(
+        WSGI_CHUNKED_REQUEST_BODY=True,
+        WSGI_LAZY_REQUEST_BODY=True,
+        WSGI_REQUEST_BODY_MAX_SIZE=5,
+        )
+    def test_chunked_input_too_large(self):
+        request = _make_request(**_make_chunked_post_environ())
+        app = _MockBodyReadingApp("200 OK", [], chunk_size=3)
+
+        with assert_raises(RequestBodyTooLargeError):
+            call_wsgi_app(app, request, "/form", unbuffered_input=True)
+
+    @override_settings(WSGI_CHUNKED_REQUEST_BODY=True)
+    def test_buffered_chunked_input(self):
+        request = _make_request(**_make_chunked_post_environ())
+        app = _MockWebobApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form", unbuffered_input=True)
+
+        eq_("bar", app.post['foo'])
+        eq_(str(len(_STUB_POST_BODY)), app.environ['CONTENT_LENGTH'])
+
+
+    @override_settings(
+        WSGI_CHUNKED_REQUEST_BODY=True,
+        WSGI_LAZY_REQUEST_BODY=True,
+        )
+    def test_lazily_buffered_chunked_input(self):
+        request = _make_request(**_make_chunked_post_environ())
+        app = _MockBodyReadingApp("200 OK", [])
+
+        call_wsgi_app(app, request, "/form")
+
+        eq_(_STUB_POST_BODY, app.body)
+        eq_(str(len(_STUB_POST_BODY)), app.environ['CONTENT_LENGTH'])
+        eq_(str(len(_STUB_POST_BODY)), request.environ['CONTENT_LENGTH'])
+
+
+def _make_chunked_post_environ():
+    environ = _make_post_environ(PATH_INFO="/app/form")
+    del environ['CONTENT_LENGTH']
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+
 class TestWSGIView(BaseDjangoTestCase):
     """
     Tests for make_wsgi_view().
@@ -276,10 +1495,206 @@ class TestWSGIView(BaseDjangoTestCase):
         # Checking the response. Note "/foo" is NOT the end of PATH_INFO:
         assert_raises(ApplicationCallError, django_view, request, "/foo")
 
+    def test_raw_cookies(self):
+        app = MockApp("200 OK", [("Set-Cookie", "arg1=val1; HttpOnly")])
+        django_view = make_wsgi_view(app, raw_cookies=True)
+        environ = complete_environ(PATH_INFO="/app1/foo")
+        request = _make_request(**environ)
+
+        django_response = django_view(request, "/foo")
+
+        eq_(
+            "arg1=val1; HttpOnly",
+            django_response.cookies['arg1'].output(header="").strip(),
+            )
+
+    def test_streaming(self):
+        app = MockGeneratorApp("200 OK", [])
+        django_view = make_wsgi_view(app, streaming=True)
+        environ = complete_environ(PATH_INFO="/app1/foo")
+        request = _make_request(**environ)
+
+        django_response = django_view(request, "/foo")
+
+        assert_is_instance(django_response, StreamingHttpResponse)
+        eq_(b"body as iterable", _resolve_response_body(django_response))
+
+    def test_concurrency_limit(self):
+        concurrency_limit = ConcurrencyLimit(1)
+        app = MockApp("200 OK", [])
+        django_view = make_wsgi_view(app, concurrency_limit=concurrency_limit)
+        environ = complete_environ(PATH_INFO="/app1/foo")
+
+        django_response = django_view(_make_request(**environ), "/foo")
+
+        eq_(200, django_response.status_code)
+        eq_(0, concurrency_limit.in_flight_call_count)
+
+    def test_request_shed(self):
+        concurrency_limit = ConcurrencyLimit(1)
+        concurrency_limit.acquire()
+        app = MockApp("200 OK", [])
+        django_view = make_wsgi_view(app, concurrency_limit=concurrency_limit)
+        environ = complete_environ(PATH_INFO="/app1/foo")
+
+        django_response = django_view(_make_request(**environ), "/foo")
+
+        eq_(503, django_response.status_code)
+        ok_(not hasattr(app, 'environ'))
+        eq_(1, concurrency_limit.shed_request_count)
+
+    def test_concurrency_limit_released_on_error(self):
+        concurrency_limit = ConcurrencyLimit(1)
+        app = MockApp("200 OK", [])
+        django_view = make_wsgi_view(app, concurrency_limit=concurrency_limit)
+        environ = complete_environ(PATH_INFO="/app1/foo")
+
+        with assert_raises(ApplicationCallError):
+            django_view(_make_request(**environ), "/bar")
+
+        eq_(0, concurrency_limit.in_flight_call_count)
+
+    def test_concurrency_limit_with_streaming(self):
+        """Streamed calls finish when the response is closed."""
+        concurrency_limit = ConcurrencyLimit(1)
+        app = MockGeneratorApp("200 OK", [])
+        django_view = make_wsgi_view(
+            app,
+            streaming=True,
+            concurrency_limit=concurrency_limit,
+            )
+        environ = complete_environ(PATH_INFO="/app1/foo")
+
+        django_response = django_view(_make_request(**environ), "/foo")
+        eq_(1, concurrency_limit.in_flight_call_count)
+
+        django_response.close()
+        django_response.close()
+        eq_(0, concurrency_limit.in_flight_call_count)
+
+
+class TestConcurrencyLimit(object):
+
+    def test_calls_within_limit(self):
+        concurrency_limit = ConcurrencyLimit(2)
+
+        ok_(concurrency_limit.acquire())
+        ok_(concurrency_limit.acquire())
+
+        eq_(2, concurrency_limit.in_flight_call_count)
+        eq_(0, concurrency_limit.queued_request_count)
+        eq_(0, concurrency_limit.shed_request_count)
+
+    def test_release(self):
+        concurrency_limit = ConcurrencyLimit(1)
+        concurrency_limit.acquire()
+
+        concurrency_limit.release()
+
+        eq_(0, concurrency_limit.in_flight_call_count)
+        ok_(concurrency_limit.acquire())
+
+    def test_no_queue(self):
+        concurrency_limit = ConcurrencyLimit(1)
+        concurrency_limit.acquire()
+
+        assert_false(concurrency_limit.acquire())
+
+        eq_(1, concurrency_limit.in_flight_call_count)
+        eq_(0, concurrency_limit.queued_request_count)
+        eq_(1, concurrency_limit.shed_request_count)
+
+    def test_queued_request(self):
+        concurrency_limit = ConcurrencyLimit(1, max_queue_size=1)
+        concurrency_limit.acquire()
+        release_timer = Timer(0.01, concurrency_limit.release)
+        release_timer.start()
+
+        ok_(concurrency_limit.acquire())
+
+        release_timer.join()
+        eq_(1, concurrency_limit.in_flight_call_count)
+        eq_(0, concurrency_limit.waiting_request_count)
+        eq_(1, concurrency_limit.queued_request_count)
+        eq_(0, concurrency_limit.shed_request_count)
+
+    def test_queue_timeout(self):
+        concurrency_limit = ConcurrencyLimit(
+            1,
+            max_queue_size=1,
+            queue_timeout=0.01,
+            )
+        concurrency_limit.acquire()
+
+        assert_false(concurrency_limit.acquire())
+
+        eq_(1, concurrency_limit.in_flight_call_count)
+        eq_(0, concurrency_limit.waiting_request_count)
+        eq_(1, concurrency_limit.queued_request_count)
+        eq_(1, concurrency_limit.shed_request_count)
+
+    def test_queued_request_served_before_new_request(self):
+        concurrency_limit = ConcurrencyLimit(
+            1,
+            max_queue_size=2,
+            queue_timeout=0.2,
+            )
+        concurrency_limit.acquire()
+        queued_request_results = []
+        queued_request_thread = Thread(
+            target=lambda: queued_request_results.append(
+                concurrency_limit.acquire(),
+                ),
+            )
+        queued_request_thread.start()
+        while not concurrency_limit.waiting_request_count:
+            sleep(0.001)
+
+        concurrency_limit.release()
+        is_new_request_accepted = concurrency_limit.acquire()
+
+        queued_request_thread.join()
+        eq_([True], queued_request_results)
+        assert_false(is_new_request_accepted)
+        eq_(1, concurrency_limit.in_flight_call_count)
+        eq_(1, concurrency_limit.shed_request_count)
+
+    def test_full_queue(self):
+        concurrency_limit = ConcurrencyLimit(1, max_queue_size=1)
+        concurrency_limit.acquire()
+        concurrency_limit.waiting_request_count = 1
+
+        assert_false(concurrency_limit.acquire())
+
+        eq_(0, concurrency_limit.queued_request_count)
+        eq_(1, concurrency_limit.shed_request_count)
+
 
 #{ Test utilities
 
 
+def _make_request_with_lazy_user(authenticated, **environ):
+    """
+    Make a Django request whose user is looked up lazily, like Django's
+    authentication middleware does, and return it along with the list of
+    lookups.
+
+    """
+    user_lookups = []
+    request = _make_request(
+        authenticated,
+        **complete_environ(PATH_INFO="/app/foo", **environ)
+        )
+    user = request.user
+
+    def get_user():
+        user_lookups.append(user)
+        return user
+
+    request.user = SimpleLazyObject(get_user)
+    return (request, user_lookups)
+
+
 def _make_request(authenticated=False, **environ):
     """
     Make a Django request from the items in the WSGI ``environ``.
@@ -296,6 +1711,237 @@ def _make_request(authenticated=False, **environ):
     return request
 
 
+def _call_app_with_headers(headers):
+    app = MockApp("200 OK", headers)
+    environ = complete_environ(SCRIPT_NAME="/dev", PATH_INFO="/trac/wiki")
+    request = _make_request(**environ)
+    django_response = call_wsgi_app(app, request, "/wiki")
+    return django_response
+
+
+_VALIDATOR_HEADERS = [
+    ("Content-Type", "text/plain"),
+    ("ETag", '"abc"'),
+    ("Last-Modified", "Wed, 21 Oct 2015 07:28:00 GMT"),
+    ]
+
+
+def _call_conditional_app(app, **environ):
+    environ = complete_environ(PATH_INFO="/app/foo", **environ)
+    request = _make_request(**environ)
+    django_response = call_wsgi_app(app, request, "/foo", conditional=True)
+    return django_response
+
+
+def _parse_server_timing(header_value):
+    metrics = []
+    for metric in header_value.split(","):
+        (name, duration) = metric.strip().split(";dur=")
+        metrics.append((name, float(duration)))
+    return metrics
+
+
+def _call_streaming_app(app):
+    environ = complete_environ(SCRIPT_NAME="/dev", PATH_INFO="/blog/posts")
+    request = _make_request(**environ)
+    django_response = call_wsgi_app(app, request, "/posts", streaming=True)
+    return django_response
+
+
+class _MockTelltaleGeneratorApp(MockApp):
+    """
+    Mock WSGI application that returns an iterator and keeps count of the
+    chunks consumed so far.
+    
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_MockTelltaleGeneratorApp, self).__init__(*args, **kwargs)
+        self.chunks_consumed = 0
+
+    def __call__(self, environ, start_response):
+        self.environ = environ
+        start_response(self.status, self.headers)
+        return self._generate_body()
+
+    def _generate_body(self):
+        for chunk in ("body", " as", " iterable"):
+            self.chunks_consumed += 1
+            yield chunk
+
+
+class _MockTelltaleGeneratorFunctionApp(object):
+    """
+    Mock WSGI application written as a generator function, which keeps count
+    of the chunks consumed so far.
+
+    """
+
+    def __init__(self):
+        super(_MockTelltaleGeneratorFunctionApp, self).__init__()
+        self.chunks_consumed = 0
+        self.is_closed = False
+
+    def __call__(self, environ, start_response):
+        start_response("200 OK", [("X-HEADER", "Foo")])
+        try:
+            for chunk_index in range(5):
+                self.chunks_consumed += 1
+                yield ("chunk %s" % chunk_index).encode("ascii")
+        finally:
+            self.is_closed = True
+
+
+class _MockFileApp(MockApp):
+    """Mock WSGI application which returns a file."""
+
+    def __init__(self, use_file_wrapper):
+        super(_MockFileApp, self).__init__(
+            "200 OK",
+            [("Content-Length", "13")],
+            )
+        self.use_file_wrapper = use_file_wrapper
+        self.file = BytesIO(b"file contents")
+
+    def __call__(self, environ, start_response):
+        self.environ = environ
+        start_response(self.status, self.headers)
+        if self.use_file_wrapper:
+            app_iter = environ['wsgi.file_wrapper'](self.file, 2)
+        else:
+            app_iter = self.file
+        return app_iter
+
+
+def _call_file_app(app, **environ):
+    environ = complete_environ(PATH_INFO="/app/foo", **environ)
+    return call_wsgi_app(app, _make_request(**environ), "/foo")
+
+
+_RANGE_APP_BODY = b"abcdefghijklmnopqrstuvwxyz"
+
+
+class _MockRangeApp(MockApp):
+    """Mock WSGI application which returns the alphabet."""
+
+    def __init__(self, body=None, headers=None):
+        if headers is None:
+            headers = [
+                ("Content-Type", "text/plain"),
+                ("Content-Length", "26"),
+                ("ETag", '"abc"'),
+                ("Last-Modified", "Wed, 21 Oct 2015 07:28:00 GMT"),
+                ]
+        super(_MockRangeApp, self).__init__("200 OK", headers)
+        self.body = [_RANGE_APP_BODY] if body is None else body
+
+    def __call__(self, environ, start_response):
+        self.environ = environ
+        start_response(self.status, self.headers)
+        return self.body
+
+
+class _TelltaleSeekableFile(io.BytesIO):
+
+    def __init__(self, *args, **kwargs):
+        super(_TelltaleSeekableFile, self).__init__(*args, **kwargs)
+        self.bytes_read = 0
+
+    def read(self, *args, **kwargs):
+        chunk = super(_TelltaleSeekableFile, self).read(*args, **kwargs)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def _call_range_app(app, **environ):
+    environ = complete_environ(PATH_INFO="/app/foo", **environ)
+    request = _make_request(**environ)
+    django_response = call_wsgi_app(app, request, "/foo", ranges=True)
+    return django_response
+
+
+_COMPRESSIBLE_BODY = b"<p>Lorem ipsum dolor sit amet.</p>\n" * 40
+
+
+class _MockCompressibleApp(MockApp):
+    """Mock WSGI application which returns a repetitive HTML document."""
+
+    def __init__(self, headers=None, body=None):
+        headers = [("Content-Type", "text/html")] + (headers or [])
+        super(_MockCompressibleApp, self).__init__("200 OK", headers)
+        self.body = [_COMPRESSIBLE_BODY] if body is None else body
+
+    def __call__(self, environ, start_response):
+        self.environ = environ
+        start_response(self.status, self.headers)
+        return self.body
+
+
+def _call_compressing_app(app, streaming=False, **environ):
+    environ = complete_environ(PATH_INFO="/app/foo", **environ)
+    request = _make_request(**environ)
+    django_response = call_wsgi_app(
+        app,
+        request,
+        "/foo",
+        streaming=streaming,
+        compression=True,
+        )
+    return django_response
+
+
+def _decompress(compressed_body, content_coding):
+    if content_coding == "gzip":
+        wbits = 16 + zlib.MAX_WBITS
+    else:
+        wbits = zlib.MAX_WBITS
+    return zlib.decompress(compressed_body, wbits)
+
+
+class _MockBodyReadingApp(MockApp):
+    """Mock WSGI application that reads the body of the request."""
+
+    def __init__(self, status, headers, chunk_size=None):
+        super(_MockBodyReadingApp, self).__init__(status, headers)
+        self.chunk_size = chunk_size
+
+    def __call__(self, environ, start_response):
+        wsgi_input = environ['wsgi.input']
+        if self.chunk_size:
+            chunks = iter(lambda: wsgi_input.read(self.chunk_size), b"")
+            self.body = b"".join(chunks)
+        else:
+            self.body = wsgi_input.read()
+        return super(_MockBodyReadingApp, self).__call__(
+            environ,
+            start_response,
+            )
+
+
+class _MockWebobApp(MockApp):
+    """Mock WSGI application that reads the form data with WebOb."""
+
+    def __call__(self, environ, start_response):
+        self.post = Request(environ).POST
+        return super(_MockWebobApp, self).__call__(environ, start_response)
+
+
+_STUB_POST_BODY = b"foo=bar&bar=foo"
+
+
+def _make_post_environ(**environ):
+    environ = dict(
+        {
+            'REQUEST_METHOD': "POST",
+            'CONTENT_TYPE': "application/x-www-form-urlencoded",
+            'CONTENT_LENGTH': str(len(_STUB_POST_BODY)),
+            'wsgi.input': BytesIO(_STUB_POST_BODY),
+        },
+        **environ
+        )
+    return complete_environ(**environ)
+
+
 def _resolve_response_body(response):
     body_parts = tuple(response)
     body_text = b"".join(body_parts)
@@ -17,15 +17,34 @@
 Tests for the WSGI request handler.
 
 """
-from nose.tools import eq_, ok_, assert_is_instance
+import io
+import sys
+from tempfile import SpooledTemporaryFile
+
+from django.conf.urls import url
+from django.core.signals import request_finished
+from django.core.urlresolvers import reverse
+from django.http import FileResponse
+from django.http import HttpResponse
+from django.test.utils import override_settings
+from nose.tools import (eq_, ok_, assert_false, assert_is_instance,
+                        assert_raises)
 from six import BytesIO
 from six.moves.urllib.parse import urlencode
 from webob import Request
+from webob.compat import cgi_FieldStorage
+from webob.request import DisconnectionError
 
-from tests import BaseDjangoTestCase, complete_environ
+from tests import (BaseDjangoTestCase, MockApp, PhaseTimingRecorder,
+                   complete_environ)
+from django_wsgi.embedded_wsgi import ConcurrencyLimit
+from django_wsgi.embedded_wsgi import make_wsgi_view
+from django_wsgi.exc import RequestBodyTooLargeError
 from django_wsgi.handler import APPLICATION
 from django_wsgi.handler import DjangoApplication
 from django_wsgi.handler import DjangoWSGIRequest
+from django_wsgi.handler import Mount
+from django_wsgi.signals import phase_timed
 
 
 class TestRequest(BaseDjangoTestCase):
@@ -40,6 +59,45 @@ class TestRequest(BaseDjangoTestCase):
         assert_is_instance(request.webob, Request)
         eq_(request.environ, request.webob.environ)
 
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_webob_request_created_lazily():
+        environ = complete_environ()
+        request = DjangoWSGIRequest(environ)
+
+        ok_('webob' not in request.__dict__)
+        webob_request = request.webob
+        ok_(webob_request is request.webob)
+        ok_(request.environ is webob_request.environ)
+
+    @staticmethod
+    def test_webob_request_created_lazily_with_buffered_body():
+        request = _make_stub_post_request()
+
+        ok_('webob' not in request.__dict__)
+        ok_(request.environ['webob.is_body_seekable'])
+        eq_(request.body, request.webob.body)
+        ok_(request.webob.body_file_raw is request.environ['wsgi.input'])
+
+    @staticmethod
+    def test_truncated_body():
+        environ = complete_environ(REQUEST_METHOD="POST", CONTENT_LENGTH="20")
+        environ['wsgi.input'] = BytesIO(b"foo")
+
+        assert_raises(DisconnectionError, DjangoWSGIRequest, environ)
+
+    @staticmethod
+    @override_settings(
+        WSGI_LAZY_REQUEST_BODY=True,
+        WSGI_EAGER_WEBOB_REQUEST=True,
+        )
+    def test_webob_request_created_eagerly():
+        environ = complete_environ()
+        request = DjangoWSGIRequest(environ)
+
+        ok_('webob' in request.__dict__)
+        ok_(request.environ is request.webob.environ)
+
     @staticmethod
     def test_request_body_read_by_django_first():
         """WebOb is able to read the request after Django."""
@@ -68,6 +126,443 @@ class TestRequest(BaseDjangoTestCase):
         eq_(2, len(request.webob.POST))
 
 
+class TestLazilyBufferedRequest(BaseDjangoTestCase):
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_body_not_read_upon_construction():
+        request = _make_stub_post_request(_TelltaleFile)
+
+        wsgi_input = request.environ['wsgi.input']
+        assert_false(isinstance(wsgi_input, _TelltaleFile))
+        eq_(0, _TelltaleFile.instances[-1].read_count)
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_body_not_read_on_get_requests():
+        environ = complete_environ()
+        environ['wsgi.input'] = _TelltaleFile(b"")
+        request = DjangoWSGIRequest(environ)
+
+        eq_(0, len(request.POST))
+        eq_(0, len(request.GET))
+        eq_(0, _TelltaleFile.instances[-1].read_count)
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_request_body_read_by_django_first():
+        request = _make_stub_post_request()
+
+        eq_(2, len(request.POST))
+        eq_(request.POST, request.webob.POST)
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_request_body_read_by_webob_first():
+        request = _make_stub_post_request()
+
+        eq_(2, len(request.webob.POST))
+        eq_(request.webob.POST, request.POST)
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_unseekable_body_read_by_django():
+        request = _make_stub_post_request(_UnseekableFile)
+
+        eq_(2, len(request.POST))
+        eq_(request.POST, request.webob.POST)
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_unseekable_body_read_by_webob():
+        request = _make_stub_post_request(_UnseekableFile)
+
+        eq_(2, len(request.webob.POST))
+        eq_(request.webob.POST, request.POST)
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_buffered_body_replaces_input():
+        request = _make_stub_post_request(_UnseekableFile)
+
+        request.webob.body
+        wsgi_input = request.environ['wsgi.input']
+        ok_(hasattr(wsgi_input, 'seek'))
+        ok_(request.webob.body_file_raw is wsgi_input)
+        eq_(0, wsgi_input.tell())
+
+
+class TestRequestBodyLimits(BaseDjangoTestCase):
+
+    @staticmethod
+    @override_settings(WSGI_REQUEST_BODY_MEMORY_LIMIT=10)
+    def test_body_above_memory_limit():
+        request = _make_stub_post_request()
+
+        assert_false(isinstance(request.environ['wsgi.input'], io.BytesIO))
+        eq_(2, len(request.POST))
+        eq_(request.POST, request.webob.POST)
+
+    @staticmethod
+    @override_settings(WSGI_REQUEST_BODY_MEMORY_LIMIT=1024)
+    def test_body_below_memory_limit():
+        request = _make_stub_post_request()
+
+        assert_is_instance(request.environ['wsgi.input'], io.BytesIO)
+        eq_(2, len(request.POST))
+
+    @staticmethod
+    @override_settings(WSGI_REQUEST_BODY_MAX_SIZE=10)
+    def test_body_above_max_size():
+        assert_raises(
+            RequestBodyTooLargeError,
+            _make_stub_post_request,
+            _TelltaleFile,
+            )
+        eq_(0, _TelltaleFile.instances[-1].read_count)
+
+    @staticmethod
+    @override_settings(WSGI_REQUEST_BODY_MAX_SIZE=1024)
+    def test_body_below_max_size():
+        request = _make_stub_post_request()
+
+        eq_(2, len(request.POST))
+
+    @staticmethod
+    @override_settings(
+        WSGI_LAZY_REQUEST_BODY=True,
+        WSGI_REQUEST_BODY_MAX_SIZE=10,
+        )
+    def test_lazily_buffered_body_above_max_size():
+        request = _make_stub_post_request(_TelltaleFile)
+
+        assert_raises(RequestBodyTooLargeError, lambda: request.webob.body)
+        eq_(0, _TelltaleFile.instances[-1].read_count)
+
+
+class TestPhaseTiming(BaseDjangoTestCase):
+    """Tests for the timing of the phases in the request."""
+
+    def setup(self):
+        super(TestPhaseTiming, self).setup()
+        self.recorder = PhaseTimingRecorder()
+        phase_timed.connect(self.recorder)
+
+    def teardown(self):
+        phase_timed.disconnect(self.recorder)
+        super(TestPhaseTiming, self).teardown()
+
+    def test_eagerly_buffered_body(self):
+        request = _make_stub_post_request()
+
+        eq_(
+            ['body_buffering', 'request_construction'],
+            self.recorder.get_phase_names(),
+            )
+        for (sender, _, duration, phase_request) in self.recorder.phases:
+            ok_(sender is DjangoWSGIRequest)
+            ok_(phase_request is request)
+            ok_(0 <= duration)
+
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_lazily_buffered_body(self):
+        request = _make_stub_post_request()
+        eq_(['request_construction'], self.recorder.get_phase_names())
+
+        request.POST
+
+        eq_(
+            ['request_construction', 'body_buffering'],
+            self.recorder.get_phase_names(),
+            )
+        ok_(self.recorder.phases[-1][3] is request)
+
+
+class TestIncrementalBodyReading(BaseDjangoTestCase):
+
+    @staticmethod
+    def test_read_in_chunks():
+        request = _make_stub_text_request()
+
+        eq_(b"line", request.read(4))
+        eq_(b" 1\n", request.read(3))
+        eq_(b"line 2\n", request.read())
+        eq_(b"", request.read(1))
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_read_lazily_buffered_body_in_chunks():
+        request = _make_stub_text_request(_UnseekableFile)
+
+        eq_(b"line", request.read(4))
+        eq_(b" 1\n", request.read(3))
+        eq_(b"line 2\n", request.read())
+
+    @staticmethod
+    def test_readline():
+        request = _make_stub_text_request()
+
+        eq_(b"li", request.readline(2))
+        eq_(b"ne 1\n", request.readline())
+        eq_(b"line 2\n", request.readline())
+        eq_(b"", request.readline())
+
+    @staticmethod
+    def test_iteration():
+        request = _make_stub_text_request()
+
+        eq_([b"line 1\n", b"line 2\n"], list(request))
+
+    @staticmethod
+    def test_body_length_honoured():
+        request = _make_stub_text_request(content_length=5)
+
+        eq_(b"line", request.read(4))
+        eq_(b" ", request.read())
+
+    @staticmethod
+    def test_webob_reading_in_between():
+        """Django and WebOb don't move each other's position in the body."""
+        request = _make_stub_text_request()
+
+        eq_(b"line", request.read(4))
+        webob_body_file = request.webob.body_file
+        eq_(b"line 1", webob_body_file.read(6))
+        eq_(b" 1\n", request.read(3))
+        eq_(b"\nline", webob_body_file.read(5))
+        eq_(b"line 1\nline 2\n", request.webob.body)
+        eq_(b"line 2\n", request.read())
+
+    @staticmethod
+    def test_multipart_upload():
+        """Django's multipart parser reads the body in chunks."""
+        file_contents = b"a" * 100000
+        body = (
+            b"--boundary\r\n"
+            b'Content-Disposition: form-data; name="file"; '
+            b'filename="a.txt"\r\n'
+            b"Content-Type: text/plain\r\n\r\n" +
+            file_contents +
+            b"\r\n--boundary--\r\n"
+            )
+        environ = complete_environ(
+            REQUEST_METHOD="POST",
+            CONTENT_TYPE="multipart/form-data; boundary=boundary",
+            CONTENT_LENGTH=str(len(body)),
+            )
+        environ['wsgi.input'] = BytesIO(body)
+        request = DjangoWSGIRequest(environ)
+
+        eq_(file_contents, request.FILES['file'].read())
+        eq_(file_contents, request.webob.POST['file'].value)
+
+
+class TestChunkedRequestBody(BaseDjangoTestCase):
+
+    @staticmethod
+    @override_settings(WSGI_CHUNKED_REQUEST_BODY=True)
+    def test_body_buffered():
+        request = _make_stub_chunked_request()
+
+        eq_(b"line 1\nline 2\n", request.body)
+        eq_(b"line 1\nline 2\n", request.webob.body)
+        eq_("14", request.environ['CONTENT_LENGTH'])
+
+    @staticmethod
+    @override_settings(
+        WSGI_CHUNKED_REQUEST_BODY=True,
+        WSGI_LAZY_REQUEST_BODY=True,
+        )
+    def test_body_buffered_lazily():
+        request = _make_stub_chunked_request(_TelltaleFile)
+        eq_(0, _TelltaleFile.instances[-1].read_count)
+
+        eq_(b"line 1\n", request.readline())
+        eq_(b"line 2\n", request.read())
+        eq_("14", request.environ['CONTENT_LENGTH'])
+
+    @staticmethod
+    @override_settings(
+        WSGI_CHUNKED_REQUEST_BODY=True,
+        WSGI_LAZY_REQUEST_BODY=True,
+        )
+    def test_lazily_buffered_multipart_body():
+        request = _make_stub_multipart_request(chunked=True)
+
+        eq_(["bar", "baz"], request.POST.getlist('foo'))
+        eq_(b"file contents", request.FILES['file'].read())
+
+    @staticmethod
+    @override_settings(WSGI_CHUNKED_REQUEST_BODY=True)
+    def test_body_above_memory_limit():
+        request = _make_stub_chunked_request()
+
+        assert_is_instance(request.environ['wsgi.input'], SpooledTemporaryFile)
+
+    @staticmethod
+    @override_settings(
+        WSGI_CHUNKED_REQUEST_BODY=True,
+        WSGI_REQUEST_BODY_MAX_SIZE=10,
+        )
+    def test_body_above_max_size():
+        with assert_raises(RequestBodyTooLargeError):
+            _make_stub_chunked_request(_TelltaleFile, b"a" * 200000)
+
+        # The body was not read beyond the first chunk above the limit:
+        eq_(1, _TelltaleFile.instances[-1].read_count)
+
+
+    @staticmethod
+    def test_opt_in_and_input_termination_required():
+        body = b"line 1\nline 2\n"
+        for is_lazy in (False, True):
+            for is_opted_in in (False, True):
+                for input_terminated in (False, True):
+                    settings_override = override_settings(
+                        WSGI_CHUNKED_REQUEST_BODY=is_opted_in,
+                        WSGI_LAZY_REQUEST_BODY=is_lazy,
+                        )
+                    with settings_override:
+                        request = _make_stub_chunked_request(
+                            body=body,
+                            input_terminated=input_terminated,
+                            )
+                        expected_body = \
+                            body if is_opted_in and input_terminated else b""
+
+                        eq_(expected_body, request.body)
+                        eq_(expected_body, request.webob.body)
+
+
+def _make_stub_chunked_request(
+    wsgi_input_class=BytesIO,
+    body=b"line 1\nline 2\n",
+    input_terminated=True,
+    ):
+    environ = complete_environ(
+        REQUEST_METHOD="POST",
+        CONTENT_TYPE="text/plain",
+        HTTP_TRANSFER_ENCODING="chunked",
+        )
+    environ['wsgi.input'] = wsgi_input_class(body)
+    environ['wsgi.input_terminated'] = input_terminated
+    request = DjangoWSGIRequest(environ)
+    return request
+
+
+class TestFormSharing(BaseDjangoTestCase):
+
+    @staticmethod
+    def test_form_parsed_by_django_first():
+        request = _make_stub_multipart_request()
+
+        post = request.POST
+        files = request.FILES
+        webob_post = request.webob.POST
+
+        eq_(["bar", "baz"], post.getlist('foo'))
+        eq_(["bar", "baz"], webob_post.getall('foo'))
+        webob_file_field = webob_post['file']
+        assert_is_instance(webob_file_field, cgi_FieldStorage)
+        ok_(webob_file_field.file is files['file'].file)
+        eq_("a.txt", webob_file_field.filename)
+        eq_("text/plain", webob_file_field.type)
+        eq_(b"file contents", webob_file_field.value)
+
+    @staticmethod
+    def test_form_parsed_by_webob_first():
+        request = _make_stub_multipart_request()
+
+        webob_post = request.webob.POST
+        post = request.POST
+        files = request.FILES
+
+        eq_(["bar", "baz"], post.getlist('foo'))
+        assert_false(post._mutable)
+        uploaded_file = files['file']
+        ok_(uploaded_file.file is webob_post['file'].file)
+        eq_("a.txt", uploaded_file.name)
+        eq_("text/plain", uploaded_file.content_type)
+        eq_(13, uploaded_file.size)
+        eq_(b"file contents", uploaded_file.read())
+
+    @staticmethod
+    @override_settings(WSGI_LAZY_REQUEST_BODY=True)
+    def test_lazily_buffered_form():
+        request = _make_stub_multipart_request()
+
+        files = request.FILES
+
+        ok_(request.webob.POST['file'].file is files['file'].file)
+
+    @staticmethod
+    def test_url_encoded_form():
+        request = _make_stub_post_request()
+
+        post = request.POST
+
+        webob_post = request.webob.POST
+        ok_(webob_post is request.environ['webob._parsed_post_vars'][0])
+        eq_(post, webob_post)
+
+    @staticmethod
+    @override_settings(DEFAULT_CHARSET="latin-1")
+    def test_non_utf8_form():
+        request = _make_stub_post_request()
+
+        eq_(2, len(request.POST))
+        ok_('webob._parsed_post_vars' not in request.environ)
+
+    @staticmethod
+    def test_non_form_body():
+        request = _make_stub_text_request()
+
+        eq_(0, len(request.POST))
+        ok_('webob._parsed_post_vars' not in request.environ)
+
+
+def _make_stub_multipart_request(chunked=False):
+    body = (
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="foo"\r\n\r\n'
+        b"bar\r\n"
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="foo"\r\n\r\n'
+        b"baz\r\n"
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="file"; '
+        b'filename="a.txt"\r\n'
+        b"Content-Type: text/plain\r\n\r\n"
+        b"file contents\r\n"
+        b"--boundary--\r\n"
+        )
+    environ = complete_environ(
+        REQUEST_METHOD="POST",
+        CONTENT_TYPE="multipart/form-data; boundary=boundary",
+        )
+    if chunked:
+        environ['wsgi.input_terminated'] = True
+    else:
+        environ['CONTENT_LENGTH'] = str(len(body))
+    environ['wsgi.input'] = BytesIO(body)
+    request = DjangoWSGIRequest(environ)
+    return request
+
+
+def _make_stub_text_request(wsgi_input_class=BytesIO, content_length=None):
+    input_ = b"line 1\nline 2\n"
+    if content_length is None:
+        content_length = len(input_)
+    environ = complete_environ(
+        REQUEST_METHOD="POST",
+        CONTENT_TYPE="text/plain",
+        CONTENT_LENGTH=str(content_length),
+        )
+    environ['wsgi.input'] = wsgi_input_class(input_)
+    request = DjangoWSGIRequest(environ)
+    return request
+
+
 def _make_stub_post_request(wsgi_input_class=BytesIO):
     input_ = urlencode({'foo': "bar", 'bar': "foo"}).encode()
     input_length = str(len(input_))
@@ -100,6 +595,283 @@ class TestWSGIHandler(BaseDjangoTestCase):
 
         ok_(isinstance(self.handler.request, DjangoWSGIRequest))
 
+    @override_settings(
+        WSGI_CHUNKED_REQUEST_BODY=True,
+        WSGI_REQUEST_BODY_MAX_SIZE=10,
+        )
+    def test_chunked_request_body_too_large(self):
+        environ = complete_environ(REQUEST_METHOD="POST", PATH_INFO="/")
+        environ['wsgi.input'] = BytesIO(b"a" * 11)
+        environ['wsgi.input_terminated'] = True
+        start_response_args = []
+
+        def start_response(status, response_headers):
+            start_response_args.append(status)
+
+        self.handler(environ, start_response)
+
+        eq_(["413 Request Entity Too Large"], start_response_args)
+
+    @override_settings(WSGI_REQUEST_BODY_MAX_SIZE=10)
+    def test_request_body_too_large_in_view(self):
+        request = DjangoWSGIRequest(complete_environ())
+        try:
+            raise RequestBodyTooLargeError()
+        except RequestBodyTooLargeError:
+            exc_info = sys.exc_info()
+
+        response = self.handler.handle_uncaught_exception(
+            request,
+            None,
+            exc_info,
+            )
+
+        eq_(413, response.status_code)
+
+    @override_settings(WSGI_REQUEST_BODY_MAX_SIZE=10)
+    def test_request_body_too_large(self):
+        environ = complete_environ(
+            REQUEST_METHOD="POST",
+            PATH_INFO="/",
+            CONTENT_LENGTH="11",
+            )
+        environ['wsgi.input'] = _TelltaleFile(b"a" * 11)
+
+        start_response_args = []
+
+        def start_response(status, response_headers):
+            start_response_args.append(status)
+
+        self.handler(environ, start_response)
+
+        eq_(["413 Request Entity Too Large"], start_response_args)
+        ok_(not hasattr(self.handler, 'request'))
+        eq_(0, _TelltaleFile.instances[-1].read_count)
+
+
+_MOCK_AUTHENTICATION_MIDDLEWARE = \
+    "tests.test_handler._MockAuthenticationMiddleware"
+
+
+class TestMounts(BaseDjangoTestCase):
+
+    def test_request_routed_to_mount(self):
+        app = MockApp("200 OK", [])
+        handler = _TelltaleHandler({"/static": app})
+        environ = complete_environ(SCRIPT_NAME="/site", PATH_INFO="/static/a")
+
+        handler(environ, lambda status, headers: None)
+
+        ok_(not hasattr(handler, 'request'))
+        eq_("/site/static", app.environ['SCRIPT_NAME'])
+        eq_("/a", app.environ['PATH_INFO'])
+
+    def test_mount_prefix(self):
+        app = MockApp("200 OK", [])
+        handler = DjangoApplication({"/static/": app})
+        for (path_info, expected_path_info) in (
+            ("/static", ""),
+            ("/static/", "/"),
+            ):
+            handler(
+                complete_environ(PATH_INFO=path_info),
+                lambda status, headers: None,
+                )
+            eq_("/static", app.environ['SCRIPT_NAME'])
+            eq_(expected_path_info, app.environ['PATH_INFO'])
+
+    def test_longest_prefix(self):
+        static_app = MockApp("200 OK", [])
+        images_app = MockApp("200 OK", [])
+        handler = DjangoApplication({
+            "/static": static_app,
+            "/static/images": images_app,
+            })
+
+        handler(
+            complete_environ(PATH_INFO="/static/images/logo.png"),
+            lambda status, headers: None,
+            )
+
+        eq_("/static/images", images_app.environ['SCRIPT_NAME'])
+        eq_("/logo.png", images_app.environ['PATH_INFO'])
+        ok_(not hasattr(static_app, 'environ'))
+
+    def test_whole_segments_matched(self):
+        app = MockApp("200 OK", [])
+        handler = _StubResponseHandler({"/static": app})
+
+        handler(
+            complete_environ(PATH_INFO="/staticfiles/a"),
+            lambda status, headers: None,
+            )
+
+        ok_(not hasattr(app, 'environ'))
+        eq_("/staticfiles/a", handler.request.path_info)
+
+    def test_unmounted_path(self):
+        handler = _TelltaleHandler({"/static": MockApp("200 OK", [])})
+        environ = complete_environ(PATH_INFO="/")
+
+        handler(environ, lambda status, headers: None)
+
+        eq_("/", handler.request.path_info)
+
+    @override_settings(WSGI_REQUEST_BODY_MAX_SIZE=10)
+    def test_request_body_too_large(self):
+        app = MockApp("200 OK", [])
+        handler = DjangoApplication({"/static": app})
+        environ = complete_environ(
+            REQUEST_METHOD="POST",
+            PATH_INFO="/static/a",
+            CONTENT_LENGTH="11",
+            )
+        start_response_args = []
+
+        def start_response(status, response_headers):
+            start_response_args.append(status)
+
+        handler(environ, start_response)
+
+        eq_(["413 Request Entity Too Large"], start_response_args)
+        ok_(not hasattr(app, 'environ'))
+
+    @override_settings(MIDDLEWARE_CLASSES=[_MOCK_AUTHENTICATION_MIDDLEWARE])
+    def test_auth_propagation(self):
+        app = MockApp("200 OK", [])
+        handler = _TelltaleHandler(
+            {"/private": Mount(app, propagate_auth=True)},
+            )
+        environ = complete_environ(SCRIPT_NAME="/site", PATH_INFO="/private/a")
+
+        handler(environ, lambda status, headers: None)
+
+        eq_("/private/a", handler.request.path_info)
+        eq_("foobar", app.environ['REMOTE_USER'])
+        eq_("/site/private", app.environ['SCRIPT_NAME'])
+        eq_("/a", app.environ['PATH_INFO'])
+
+    @override_settings(MIDDLEWARE_CLASSES=[_MOCK_AUTHENTICATION_MIDDLEWARE])
+    def test_auth_propagation_to_mount_prefix(self):
+        app = MockApp("200 OK", [])
+        handler = DjangoApplication(
+            {"/private": Mount(app, propagate_auth=True)},
+            )
+
+        handler(
+            complete_environ(PATH_INFO="/private"),
+            lambda status, headers: None,
+            )
+
+        eq_("/private", app.environ['SCRIPT_NAME'])
+        eq_("", app.environ['PATH_INFO'])
+
+    @override_settings(MIDDLEWARE_CLASSES=[_MOCK_AUTHENTICATION_MIDDLEWARE])
+    def test_auth_propagation_to_root_mount(self):
+        for propagate_auth in (False, True):
+            app = MockApp("200 OK", [])
+            handler = DjangoApplication(
+                {"/": Mount(app, propagate_auth=propagate_auth)},
+                )
+            for path_info in ("/", "/a", "/a/b/"):
+                start_response_args = []
+
+                def start_response(status, response_headers):
+                    start_response_args.append(status)
+
+                handler(
+                    complete_environ(SCRIPT_NAME="/site", PATH_INFO=path_info),
+                    start_response,
+                    )
+
+                eq_(["200 OK"], start_response_args)
+                eq_("/site", app.environ['SCRIPT_NAME'])
+                eq_(path_info, app.environ['PATH_INFO'])
+                eq_(propagate_auth, 'REMOTE_USER' in app.environ)
+
+    @override_settings(MIDDLEWARE_CLASSES=[_MOCK_AUTHENTICATION_MIDDLEWARE])
+    def test_urls_reversed_with_auth_propagation(self):
+        reversed_urls = []
+
+        def wsgi_app(environ, start_response):
+            reversed_urls.append(reverse("home"))
+            start_response("200 OK", [])
+            return []
+
+        handler = DjangoApplication(
+            {"/private": Mount(wsgi_app, propagate_auth=True)},
+            )
+
+        handler(
+            complete_environ(PATH_INFO="/private/a"),
+            lambda status, headers: None,
+            )
+
+        eq_(["/"], reversed_urls)
+
+
+class TestFileResponses(BaseDjangoTestCase):
+
+    def test_file_passed_to_server(self):
+        handler = _FileResponseHandler()
+        environ = complete_environ(REQUEST_METHOD="GET", PATH_INFO="/")
+        environ['wsgi.file_wrapper'] = _MockServerFileWrapper
+
+        response = handler(environ, lambda status, headers: None)
+
+        assert_is_instance(response, _MockServerFileWrapper)
+        eq_(b"file contents", response.filelike.read())
+
+    def test_response_closed_with_file(self):
+        handler = _FileResponseHandler()
+        environ = complete_environ(REQUEST_METHOD="GET", PATH_INFO="/")
+        environ['wsgi.file_wrapper'] = _MockServerFileWrapper
+        finished_requests = []
+
+        def receive_request_finished(sender, **kwargs):
+            finished_requests.append(sender)
+
+        request_finished.connect(receive_request_finished)
+        try:
+            response = handler(environ, lambda status, headers: None)
+            response.close()
+        finally:
+            request_finished.disconnect(receive_request_finished)
+
+        ok_(handler.file.closed)
+        eq_(1, len(finished_requests))
+
+    def test_concurrency_limit_released(self):
+        concurrency_limit = ConcurrencyLimit(1)
+        django_view = make_wsgi_view(
+            _serve_file_app,
+            concurrency_limit=concurrency_limit,
+            remote_user=None,
+            )
+        handler = _URLConfHandler([url(r"^app(/.*)$", django_view)])
+        statuses = []
+
+        def start_response(status, headers):
+            statuses.append(status)
+
+        for _ in range(2):
+            environ = complete_environ(PATH_INFO="/app/foo")
+            environ['wsgi.file_wrapper'] = _MockServerFileWrapper
+            response = handler(environ, start_response)
+            eq_(b"file contents", response.filelike.read())
+            response.close()
+
+        eq_(["200 OK", "200 OK"], statuses)
+        eq_(0, concurrency_limit.in_flight_call_count)
+
+    def test_no_server_file_wrapper(self):
+        handler = _FileResponseHandler()
+        environ = complete_environ(REQUEST_METHOD="GET", PATH_INFO="/")
+
+        response = handler(environ, lambda status, headers: None)
+
+        eq_(b"file contents", b"".join(response))
+
 
 def test_handler_instance():
     assert_is_instance(APPLICATION, DjangoApplication)
@@ -115,6 +887,89 @@ class _UnseekableFile(object):
         return self._text.read(*args, **kwargs)
 
 
+class _TelltaleFile(_UnseekableFile):
+
+    instances = []
+
+    def __init__(self, text):
+        super(_TelltaleFile, self).__init__(text)
+        self.read_count = 0
+        self.instances.append(self)
+
+    def read(self, *args, **kwargs):
+        self.read_count += 1
+        return super(_TelltaleFile, self).read(*args, **kwargs)
+
+
+class _MockAuthenticationMiddleware(object):
+
+    def process_request(self, request):
+        request.user = _MockUser()
+
+
+class _MockUser(object):
+
+    username = "foobar"
+
+    def is_authenticated(self):
+        return True
+
+
+class _URLConfHandler(DjangoApplication):
+    """Django handler which resolves the URLs with ``urlpatterns``."""
+
+    def __init__(self, urlpatterns):
+        super(_URLConfHandler, self).__init__()
+        self.urlconf = _URLConf(urlpatterns)
+
+    def get_response(self, request):
+        request.urlconf = self.urlconf
+        return super(_URLConfHandler, self).get_response(request)
+
+
+class _URLConf(object):
+
+    def __init__(self, urlpatterns):
+        super(_URLConf, self).__init__()
+        self.urlpatterns = urlpatterns
+
+
+class _FileResponseHandler(_URLConfHandler):
+
+    def __init__(self):
+        super(_FileResponseHandler, self).__init__([url(r"^$", self._serve)])
+        self.file = None
+
+    def _serve(self, request):
+        self.file = io.BytesIO(b"file contents")
+        response = FileResponse(self.file)
+        if not hasattr(response, 'file_to_stream'):
+            # Django < 1.8
+            response.file_to_stream = self.file
+        return response
+
+
+def _serve_file_app(environ, start_response):
+    start_response("200 OK", [("Content-Length", "13")])
+    return io.BytesIO(b"file contents")
+
+
+class _MockServerFileWrapper(object):
+
+    def __init__(self, filelike, block_size=8192):
+        self.filelike = filelike
+
+    def close(self):
+        self.filelike.close()
+
+
+class _StubResponseHandler(DjangoApplication):
+
+    def get_response(self, request):
+        self.request = request
+        return HttpResponse()
+
+
 class _TelltaleHandler(DjangoApplication):
 
     def get_response(self, request):
@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2016, 2degrees Limited.
+# All Rights Reserved.
+#
+# This file is part of django-wsgi <https://github.com/2degrees/django-wsgi/>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Tests for the caching of responses from embedded WSGI applications.
+
+"""
+from threading import Event
+from threading import Thread
+from time import sleep
+
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from nose.tools import eq_, ok_, assert_false, assert_is_none
+from six import BytesIO
+
+from django_wsgi.embedded_wsgi import make_wsgi_view
+from django_wsgi.response_cache import DjangoCacheBackend
+from django_wsgi.response_cache import LRUCacheBackend
+from django_wsgi.response_cache import ResponseCache
+from django_wsgi.response_cache import SingleFlight
+
+from tests import BaseDjangoTestCase, MockApp, complete_environ
+from tests.test_embedded_wsgi import _make_request
+
+
+class TestResponseCache(BaseDjangoTestCase):
+
+    def setup(self):
+        super(TestResponseCache, self).setup()
+        self.backend = LRUCacheBackend()
+        self.response_cache = ResponseCache(self.backend, default_ttl=60)
+
+    def test_cache_miss(self):
+        assert_is_none(
+            self.response_cache.get_response(_make_app_request(), "/foo"),
+            )
+
+    def test_cache_hit(self):
+        django_response = HttpResponse(b"body", content_type="text/plain")
+        django_response['X-Foo'] = "bar"
+        self.response_cache.store_response(
+            _make_app_request(),
+            "/foo",
+            django_response,
+            )
+
+        cached_response = \
+            self.response_cache.get_response(_make_app_request(), "/foo")
+
+        eq_(200, cached_response.status_code)
+        eq_(b"body", cached_response.content)
+        eq_("text/plain", cached_response['Content-Type'])
+        eq_("bar", cached_response['X-Foo'])
+
+    def test_cache_key(self):
+        self._store_response(_make_app_request(), HttpResponse())
+
+        requests = (
+            _make_app_request(SCRIPT_NAME="/dev"),
+            _make_app_request(PATH_INFO="/app/bar"),
+            _make_app_request(QUERY_STRING="foo=bar"),
+            _make_app_request(REQUEST_METHOD="HEAD"),
+            )
+        for request in requests:
+            assert_is_none(self.response_cache.get_response(request, "/foo"))
+
+    def test_vary(self):
+        django_response = HttpResponse()
+        django_response['Vary'] = "Accept-Language, Accept-Encoding"
+        self._store_response(
+            _make_app_request(HTTP_ACCEPT_LANGUAGE="en"),
+            django_response,
+            )
+
+        ok_(self._get_response(_make_app_request(HTTP_ACCEPT_LANGUAGE="en")))
+        assert_is_none(
+            self._get_response(_make_app_request(HTTP_ACCEPT_LANGUAGE="es")),
+            )
+        assert_is_none(
+            self._get_response(
+                _make_app_request(
+                    HTTP_ACCEPT_LANGUAGE="en",
+                    HTTP_ACCEPT_ENCODING="gzip",
+                    ),
+                ),
+            )
+
+    def test_vary_on_anything(self):
+        django_response = HttpResponse()
+        django_response['Vary'] = "*"
+        self._store_response(_make_app_request(), django_response)
+
+        eq_(0, len(self.backend))
+
+    def test_authenticated_user(self):
+        self._store_response(_make_app_request(), HttpResponse())
+
+        request = _make_app_request(authenticated=True)
+        assert_is_none(self.response_cache.get_response(request, "/foo"))
+        self._store_response(
+            _make_app_request(authenticated=True, QUERY_STRING="a=b"),
+            HttpResponse(),
+            )
+        eq_(2, len(self.backend))
+
+    def test_unsafe_method(self):
+        request = _make_app_request(
+            REQUEST_METHOD="POST",
+            **{'wsgi.input': BytesIO()}
+            )
+        self._store_response(request, HttpResponse())
+
+        eq_(0, len(self.backend))
+
+    def test_uncacheable_responses(self):
+        uncacheable_responses = [
+            HttpResponse(status=404),
+            StreamingHttpResponse([b"body"]),
+            ]
+        for cache_control in ("no-cache", "no-store", "private", "max-age=0"):
+            django_response = HttpResponse()
+            django_response['Cache-Control'] = cache_control
+            uncacheable_responses.append(django_response)
+        django_response = HttpResponse()
+        django_response.set_cookie("foo", "bar")
+        uncacheable_responses.append(django_response)
+
+        for django_response in uncacheable_responses:
+            self._store_response(_make_app_request(), django_response)
+
+        eq_(0, len(self.backend))
+
+    def test_ttl_from_cache_control(self):
+        backend = _RecordingCacheBackend()
+        response_cache = ResponseCache(backend, default_ttl=300)
+        for (cache_control, expected_ttl) in (
+            ("public", 300),
+            ("max-age=10", 10),
+            ("max-age=10, s-maxage=20", 20),
+            ):
+            django_response = HttpResponse()
+            django_response['Cache-Control'] = cache_control
+            response_cache.store_response(
+                _make_app_request(),
+                "/foo",
+                django_response,
+                )
+            eq_(expected_ttl, backend.ttls[-1])
+
+    def test_no_default_ttl(self):
+        backend = _RecordingCacheBackend()
+        response_cache = ResponseCache(backend)
+        for cache_control in (None, "public"):
+            django_response = HttpResponse()
+            if cache_control:
+                django_response['Cache-Control'] = cache_control
+            response_cache.store_response(
+                _make_app_request(),
+                "/foo",
+                django_response,
+                )
+
+        eq_([], backend.ttls)
+
+    def test_authorization_without_shared_cache_directives(self):
+        authorization = "Basic Zm9vOmJhcg=="
+        for cache_control in (None, "max-age=60"):
+            django_response = HttpResponse()
+            if cache_control:
+                django_response['Cache-Control'] = cache_control
+            self._store_response(
+                _make_app_request(HTTP_AUTHORIZATION=authorization),
+                django_response,
+                )
+        eq_(0, len(self.backend))
+
+        self._store_response(_make_app_request(), HttpResponse())
+        assert_is_none(
+            self._get_response(
+                _make_app_request(HTTP_AUTHORIZATION=authorization),
+                ),
+            )
+
+    def test_authorization_with_shared_cache_directives(self):
+        authorization = "Basic Zm9vOmJhcg=="
+        for cache_control in ("public", "s-maxage=60"):
+            self.backend = LRUCacheBackend()
+            self.response_cache = ResponseCache(self.backend, default_ttl=60)
+            django_response = HttpResponse()
+            django_response['Cache-Control'] = cache_control
+
+            self._store_response(
+                _make_app_request(HTTP_AUTHORIZATION=authorization),
+                django_response,
+                )
+
+            ok_(self._get_response(_make_app_request()))
+            ok_(
+                self._get_response(
+                    _make_app_request(HTTP_AUTHORIZATION=authorization),
+                    ),
+                )
+
+    def _store_response(self, request, django_response):
+        self.response_cache.store_response(request, "/foo", django_response)
+
+    def _get_response(self, request):
+        return self.response_cache.get_response(request, "/foo")
+
+
+class TestLRUCacheBackend(object):
+
+    def test_get(self):
+        backend = LRUCacheBackend()
+        backend.set("foo", "bar", 60)
+
+        eq_("bar", backend.get("foo"))
+        assert_is_none(backend.get("bar"))
+
+    def test_expiry(self):
+        backend = LRUCacheBackend()
+        backend.set("foo", "bar", 0)
+
+        assert_is_none(backend.get("foo"))
+        eq_(0, len(backend))
+
+    def test_max_ttl(self):
+        backend = LRUCacheBackend(max_ttl=0)
+        backend.set("foo", "bar", 60)
+
+        assert_is_none(backend.get("foo"))
+
+    def test_least_recently_used_evicted(self):
+        backend = LRUCacheBackend(max_entries=2)
+        backend.set("foo", 1, 60)
+        backend.set("bar", 2, 60)
+        backend.get("foo")
+
+        backend.set("baz", 3, 60)
+
+        eq_(2, len(backend))
+        eq_(1, backend.get("foo"))
+        assert_is_none(backend.get("bar"))
+        eq_(3, backend.get("baz"))
+
+
+class TestDjangoCacheBackend(BaseDjangoTestCase):
+
+    def test_get_and_set(self):
+        backend = DjangoCacheBackend()
+        backend.set("django_wsgi.tests.foo", "bar", 60)
+
+        eq_("bar", backend.get("django_wsgi.tests.foo"))
+        assert_is_none(backend.get("django_wsgi.tests.bar"))
+
+
+class TestCachingWSGIView(BaseDjangoTestCase):
+
+    def test_cache_hit_skips_application(self):
+        response_cache = ResponseCache(LRUCacheBackend(), default_ttl=60)
+        app = _MockCountingApp("200 OK", [("Content-Type", "text/plain")])
+        django_view = make_wsgi_view(app, response_cache=response_cache)
+
+        first_response = django_view(_make_app_request(), "/foo")
+        second_response = django_view(_make_app_request(), "/foo")
+
+        eq_(1, app.call_count)
+        eq_(b"body", first_response.content)
+        eq_(b"body", second_response.content)
+        eq_("text/plain", second_response['Content-Type'])
+
+    def test_server_timing_not_cached(self):
+        response_cache = ResponseCache(LRUCacheBackend(), default_ttl=60)
+        app = _MockCountingApp("200 OK", [])
+        django_view = make_wsgi_view(
+            app,
+            server_timing=True,
+            response_cache=response_cache,
+            )
+
+        first_response = django_view(_make_app_request(), "/foo")
+        second_response = django_view(_make_app_request(), "/foo")
+
+        eq_(1, app.call_count)
+        ok_(first_response.has_header('Server-Timing'))
+        assert_false(second_response.has_header('Server-Timing'))
+
+    def test_uncacheable_response(self):
+        response_cache = ResponseCache(LRUCacheBackend())
+        app = _MockCountingApp("200 OK", [("Cache-Control", "no-store")])
+        django_view = make_wsgi_view(app, response_cache=response_cache)
+
+        django_view(_make_app_request(), "/foo")
+        django_view(_make_app_request(), "/foo")
+
+        eq_(2, app.call_count)
+
+
+class TestSingleFlight(BaseDjangoTestCase):
+
+    def setup(self):
+        super(TestSingleFlight, self).setup()
+        self.single_flight = SingleFlight()
+
+    def test_single_request(self):
+        django_response = HttpResponse(b"body")
+
+        response = self.single_flight.get_response(
+            _make_app_request(),
+            "/foo",
+            lambda: django_response,
+            )
+
+        eq_(django_response, response)
+        eq_(0, self.single_flight.coalesced_request_count)
+
+    def test_identical_requests_coalesced(self):
+        app = _MockBlockingApp("200 OK", [("X-Foo", "bar")])
+        responses = self._get_concurrent_responses(
+            app,
+            _make_app_request(),
+            _make_app_request(),
+            )
+
+        eq_(1, app.call_count)
+        eq_(1, self.single_flight.coalesced_request_count)
+        for django_response in responses:
+            eq_(b"body", django_response.content)
+            eq_("bar", django_response['X-Foo'])
+        ok_(responses[0] is not responses[1])
+
+    def test_server_timing_not_shared(self):
+        app = _MockBlockingApp("200 OK", [])
+        (leader_response, follower_response) = self._get_concurrent_responses(
+            app,
+            _make_app_request(),
+            _make_app_request(),
+            server_timing=True,
+            )
+
+        eq_(1, app.call_count)
+        ok_(leader_response.has_header('Server-Timing'))
+        assert_false(follower_response.has_header('Server-Timing'))
+
+    def test_response_with_cookies_not_shared(self):
+        app = _MockBlockingApp("200 OK", [("Set-Cookie", "foo=bar")])
+        responses = self._get_concurrent_responses(
+            app,
+            _make_app_request(),
+            _make_app_request(),
+            )
+
+        eq_(2, app.call_count)
+        eq_(1, self.single_flight.coalesced_request_count)
+        for django_response in responses:
+            eq_("bar", django_response.cookies['foo'].value)
+
+    def test_not_modified_response_not_shared(self):
+        app = _MockBlockingApp("304 Not Modified", [])
+        self._get_concurrent_responses(
+            app,
+            _make_app_request(),
+            _make_app_request(),
+            )
+
+        eq_(2, app.call_count)
+
+    def test_partial_content_response_not_shared(self):
+        app = _MockBlockingApp("206 Partial Content", [])
+        self._get_concurrent_responses(
+            app,
+            _make_app_request(),
+            _make_app_request(),
+            )
+
+        eq_(2, app.call_count)
+
+    def test_different_requests(self):
+        requests = (
+            _make_app_request(QUERY_STRING="foo=bar"),
+            _make_app_request(HTTP_ACCEPT_LANGUAGE="es"),
+            _make_app_request(HTTP_COOKIE="sessionid=abc"),
+            )
+        for request in requests:
+            app = _MockBlockingApp("200 OK", [])
+            self._get_concurrent_responses(app, _make_app_request(), request)
+
+            eq_(2, app.call_count)
+        eq_(0, self.single_flight.coalesced_request_count)
+
+    def test_authenticated_user(self):
+        flight_leader_app = _MockBlockingApp("200 OK", [])
+        flight_leader_thread = Thread(
+            target=self._call_app,
+            args=(flight_leader_app, _make_app_request()),
+            )
+        flight_leader_thread.start()
+        flight_leader_app.call_event.wait(1)
+        app = _MockCountingApp("200 OK", [])
+
+        self._call_app(app, _make_app_request(authenticated=True))
+
+        flight_leader_app.release_event.set()
+        flight_leader_thread.join()
+        eq_(1, app.call_count)
+        eq_(0, self.single_flight.coalesced_request_count)
+
+    def test_streaming(self):
+        app = _MockCountingApp("200 OK", [])
+        django_view = make_wsgi_view(
+            app,
+            streaming=True,
+            single_flight=self.single_flight,
+            )
+
+        django_response = django_view(_make_app_request(), "/foo")
+
+        ok_(django_response.streaming)
+
+    def _get_concurrent_responses(
+        self,
+        app,
+        request1,
+        request2,
+        **view_kwargs
+        ):
+        responses = [None, None]
+
+        def call_app(request, response_index):
+            responses[response_index] = \
+                self._call_app(app, request, **view_kwargs)
+
+        flight_leader_thread = Thread(target=call_app, args=(request1, 0))
+        flight_leader_thread.start()
+        app.call_event.wait(1)
+        follower_thread = Thread(target=call_app, args=(request2, 1))
+        follower_thread.start()
+        # Waiting for the second request to either call the application or
+        # wait for the first one:
+        for _ in range(100):
+            if self.single_flight.coalesced_request_count or \
+                    1 < app.call_count:
+                break
+            sleep(0.01)
+        app.release_event.set()
+        flight_leader_thread.join()
+        follower_thread.join()
+        return responses
+
+    def _call_app(self, app, request, **view_kwargs):
+        django_view = make_wsgi_view(
+            app,
+            single_flight=self.single_flight,
+            **view_kwargs
+            )
+        return django_view(request, "/foo")
+
+
+class _MockCountingApp(MockApp):
+
+    def __init__(self, *args, **kwargs):
+        super(_MockCountingApp, self).__init__(*args, **kwargs)
+        self.call_count = 0
+
+    def __call__(self, environ, start_response):
+        self.call_count += 1
+        return super(_MockCountingApp, self).__call__(environ, start_response)
+
+
+class _MockBlockingApp(_MockCountingApp):
+    """Mock WSGI application which returns once it's released."""
+
+    def __init__(self, *args, **kwargs):
+        super(_MockBlockingApp, self).__init__(*args, **kwargs)
+        self.call_event = Event()
+        self.release_event = Event()
+
+    def __call__(self, environ, start_response):
+        self.call_count += 1
+        self.call_event.set()
+        self.release_event.wait(1)
+        return MockApp.__call__(self, environ, start_response)
+
+
+class _RecordingCacheBackend(object):
+
+    def __init__(self):
+        self.ttls = []
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        self.ttls.append(ttl)
+
+
+def _make_app_request(authenticated=False, **environ):
+    environ = dict({'PATH_INFO': "/app/foo"}, **environ)
+    return _make_request(authenticated, **complete_environ(**environ))